@@ -0,0 +1 @@
+# Offline benchmarks for the scraper. See benchmarks/README.md.
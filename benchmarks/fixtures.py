@@ -0,0 +1,175 @@
+"""
+Synthetic IMDb pages with the markup the extractors read, for running
+the benchmark without recorded pages. Pages are written in the layout
+the stand-in server expects: ``<root>/<url path>/index.html``.
+"""
+import json
+import os
+import random
+
+CHART_PATH = "chart/top"
+# Title pages reference a poster and a web font like IMDb's do, so the
+# cost of loading subresources in the browser shows in the benchmark
+POSTER_BYTES = 64 * 1024
+FONT_PATH = "static/fonts/roboto.woff2"
+FONT_BYTES = 32 * 1024
+
+
+def title_id(position: int) -> str:
+    return f"tt{position:07d}"
+
+
+def person_id(index: int) -> str:
+    return f"nm{index:07d}"
+
+
+def chart_page(movies, next_path=None) -> str:
+    items = [
+        {
+            "@type": "ListItem",
+            "item": {
+                "@type": "Movie",
+                "url": f"https://www.imdb.com/title/{movie['id']}/",
+                "name": movie["title"],
+                "aggregateRating": {"ratingValue": movie["rating"]},
+            },
+        }
+        for movie in movies
+    ]
+    rows = "".join(
+        f'<li><a class="ipc-title-link-wrapper" '
+        f'href="/title/{movie["id"]}/?ref_=chttp_t_{movie["position"]}">'
+        f'<h3>{movie["position"]}. {movie["title"]}</h3></a></li>'
+        for movie in movies
+    )
+    json_ld = json.dumps({"@type": "ItemList", "itemListElement": items})
+    next_link = f'<link rel="next" href="/{next_path}/">' if next_path else ""
+    return (
+        "<html><head>"
+        f'<script type="application/ld+json">{json_ld}</script>'
+        f"{next_link}"
+        "</head><body>"
+        f'<ul class="ipc-metadata-list">{rows}</ul>'
+        "</body></html>"
+    )
+
+
+def title_page(movie) -> str:
+    return (
+        "<html><head>"
+        f'<style>@font-face {{ font-family: "Roboto"; '
+        f'src: url("/{FONT_PATH}") format("woff2"); }} '
+        f'body {{ font-family: "Roboto"; }}</style>'
+        "</head><body>"
+        f'<img class="ipc-image" src="/media/{movie["id"]}.jpg" '
+        f'alt="{movie["title"]}">'
+        f'<div class="sc-15ed0f38-1"><a href="/chart/top/">'
+        f'Top rated movie #{movie["position"]}</a></div>'
+        f'<h1 class="sc-ec65ba05-0" data-testid="hero__pageTitle">'
+        f'<span class="hero__primary-text">{movie["title"]}</span></h1>'
+        f'<div class="sc-ec65ba05-1">Original title: '
+        f'{movie["original_title"]}</div>'
+        f'<ul class="sc-ec65ba05-2"><li><a class="ipc-link">'
+        f'{movie["year"]}</a></li><li><a class="ipc-link">R</a></li></ul>'
+        f'<div><span class="sc-eb51e184-1">{movie["rating"]}</span></div>'
+        f'<ul class="sc-4cf2da2d-0"><li><a href="/title/{movie["id"]}/'
+        f'fullcredits/?ref_=tt_cl_sm">Cast &amp; crew</a></li></ul>'
+        "</body></html>"
+    )
+
+
+def credits_page(movie) -> str:
+    directors = "".join(
+        f'<tr><td class="name"><a href="/name/{nm}/">{name}</a></td></tr>'
+        for nm, name in movie["directors"]
+    )
+    cast = "".join(
+        f'<tr><td class="primary_photo"></td><td>'
+        f'<a href="/name/{nm}/"> {name}</a></td>'
+        f'<td class="ellipsis">...</td><td class="character">Role</td></tr>'
+        for nm, name in movie["cast"]
+    )
+    return (
+        "<html><body>"
+        f'<h4 id="director" class="dataHeaderWithBorder">Directed by</h4>'
+        f'<table class="simpleTable simpleCreditsTable">{directors}</table>'
+        '<table class="cast_list">'
+        '<tr><td colspan="4" class="castlist_label">'
+        'Cast (in credits order)</td></tr>'
+        f"{cast}"
+        '<tr><td colspan="4" class="castlist_label">'
+        'Rest of cast listed alphabetically:</td></tr>'
+        '<tr><td></td><td><a href="/name/nm9999999/">Uncredited</a></td>'
+        "</tr></table></body></html>"
+    )
+
+
+def generate_movies(count: int, seed: int = 0) -> list:
+    """
+    Returns ``count`` random movies drawing cast members from a shared
+    pool, so the actor analysis has actors appearing in several movies.
+    """
+    rng = random.Random(seed)
+    people = [(person_id(index), f"Person {index}") for index in range(
+        max(count * 4, 20)
+    )]
+    movies = []
+    for position in range(1, count + 1):
+        movies.append({
+            "position": position,
+            "id": title_id(position),
+            "title": f"Movie {position}",
+            "original_title": f"Original Movie {position}",
+            "year": rng.randint(1920, 2024),
+            "rating": round(rng.uniform(7.5, 9.3), 1),
+            "directors": rng.sample(people, rng.randint(1, 2)),
+            "cast": rng.sample(people, rng.randint(5, 15)),
+        })
+    return movies
+
+
+def write_page(root: str, path: str, html: str) -> None:
+    directory = os.path.join(root, path)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "index.html"), "w",
+              encoding="utf-8") as f:
+        f.write(html)
+
+
+def write_file(root: str, path: str, content: bytes) -> None:
+    path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def chart_page_path(page: int) -> str:
+    return CHART_PATH if page == 1 else f"{CHART_PATH}/page/{page}"
+
+
+def write_site(root: str, count: int = 250, seed: int = 0,
+               per_page: int = None) -> list:
+    """
+    Writes the chart, title and full credits pages of ``count`` synthetic
+    movies, with their posters, under root and returns the movies. With
+    per_page the chart is split into pages linked with rel="next".
+    """
+    movies = generate_movies(count, seed)
+    rng = random.Random(seed)
+    write_file(root, FONT_PATH, rng.randbytes(FONT_BYTES))
+    per_page = per_page or max(count, 1)
+    pages = max((count + per_page - 1) // per_page, 1)
+    for page in range(1, pages + 1):
+        write_page(root, chart_page_path(page), chart_page(
+            movies[(page - 1) * per_page:page * per_page],
+            chart_page_path(page + 1) if page < pages else None,
+        ))
+    for movie in movies:
+        write_page(root, f"title/{movie['id']}", title_page(movie))
+        write_file(
+            root, f"media/{movie['id']}.jpg", rng.randbytes(POSTER_BYTES)
+        )
+        write_page(
+            root, f"title/{movie['id']}/fullcredits", credits_page(movie)
+        )
+    return movies
@@ -0,0 +1,121 @@
+"""
+Measures what a per-page log line costs the spider callback that emits
+it, with the former synchronous file handler and with the queue-backed
+handler of logger.setup_logger:
+
+    python -m benchmarks.log_overhead --lines 20000
+    python -m benchmarks.log_overhead --lines 2000 --write-delay 0.001
+
+--write-delay adds a sleep to every file write, like a slow or busy
+disk; the synchronous handler makes the callback wait for it. Lines
+beyond SPIDER_LOG_SAMPLE_RATE a second are sampled by the queued one.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.run import percentile
+
+
+def synchronous_logger(path: str) -> logging.Logger:
+    """
+    The handler setup_logger used to add: formatted and written to the
+    file on the calling thread.
+    """
+    logger = logging.getLogger("benchmark-sync")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    ))
+    logger.addHandler(handler)
+    return logger
+
+
+def queued_logger(path: str) -> logging.Logger:
+    from logger import setup_logger
+
+    logger = setup_logger("benchmark-queued", path)
+    logger.propagate = False
+    return logger
+
+
+def slow_down_writes(delay: float) -> None:
+    emit = logging.FileHandler.emit
+
+    def slow_emit(self, record):
+        time.sleep(delay)
+        emit(self, record)
+
+    logging.FileHandler.emit = slow_emit
+
+
+def measure(logger, lines: int, pace: float) -> list:
+    """
+    Logs like parse_movie_info does, a line every ``pace`` seconds, and
+    returns the time each call took.
+    """
+    durations = []
+    for position in range(1, lines + 1):
+        started = time.perf_counter()
+        logger.info(
+            "Processing movie: %s - %s", position, "The Shawshank Redemption",
+            extra={"position": position, "stage": "parse/title",
+                   "url": f"https://www.imdb.com/title/tt{position:07d}/"},
+        )
+        durations.append(time.perf_counter() - started)
+        if pace:
+            time.sleep(pace)
+    return durations
+
+
+def report(name: str, durations: list, path: str) -> str:
+    total = sum(durations)
+    with open(path, "rb") as f:
+        written = sum(1 for _ in f)
+    return (
+        f"{name:<12}{total / len(durations) * 1e6:>9.1f} us/line, "
+        f"p50 {percentile(durations, 0.50) * 1e6:.1f} us, "
+        f"p99 {percentile(durations, 0.99) * 1e6:.1f} us, "
+        f"{total:.3f} s in callbacks, "
+        f"{written} lines written, {os.path.getsize(path) / 1024:.0f} KB"
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure the callback overhead of the spider logging"
+    )
+    parser.add_argument("--lines", type=int, default=20000,
+                        help="log lines emitted per handler")
+    parser.add_argument("--pace", type=float, default=0.0,
+                        help="seconds between lines")
+    parser.add_argument("--write-delay", type=float, default=0.0,
+                        help="seconds every file write takes in addition")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.write_delay:
+        slow_down_writes(args.write_delay)
+    from logger import shutdown_loggers
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = []
+        for name, factory in (("sync", synchronous_logger),
+                              ("queued", queued_logger)):
+            path = os.path.join(directory, f"{name}.log")
+            durations = measure(factory(path), args.lines, args.pace)
+            shutdown_loggers()  # Waits for the queued lines to be written
+            results.append(report(name, durations, path))
+        print("\n".join(results))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
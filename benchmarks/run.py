@@ -0,0 +1,291 @@
+"""
+Runs Top250Spider end to end against the local stand-in server and
+reports throughput, per-page latency, peak memory and browser CPU time.
+
+    python -m benchmarks.run --movies 250 --latency 0.05 --json result.json
+    python -m benchmarks.run --pages recorded/ --baseline result.json
+    python -m benchmarks.run --latency 0.1 --capacity 8 --no-render-titles
+
+Without --pages a synthetic site is generated. Output files, the spider
+log included, go to a temporary directory and the Google Sheets export
+is disabled.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from benchmarks.fixtures import CHART_PATH, write_site
+from benchmarks.server import StandInServer
+
+
+def percentile(values, share):
+    """
+    Nearest-rank percentile of a list of numbers, None when empty.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    index = max(int(round(share * len(values) + 0.5)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def configure_environment(output_dir):
+    """
+    Points the output files at output_dir. Must run before the movies
+    modules are imported, as they read their configuration on import.
+    """
+    os.environ["MOVIES_JSON_PATH"] = os.path.join(output_dir, "movies.json")
+    os.environ["MOVIES_JSONL_PATH"] = os.path.join(
+        output_dir, "movies.jsonl"
+    )
+    os.environ["PEOPLE_JSONL_PATH"] = os.path.join(
+        output_dir, "people.jsonl"
+    )
+    os.environ["ACTORS_JSON_PATH"] = os.path.join(output_dir, "actors.json")
+    os.environ["SPIDER_LOG_PATH"] = os.path.join(output_dir, "top250.log")
+    os.environ.setdefault("CHROME_DRIVER_PATH", "chromedriver")
+    os.environ.setdefault("GOOGLE_SHEET_ID", "benchmark")
+    os.environ.setdefault("CREDENTIALS_FILE_PATH", "benchmark")
+    os.environ.setdefault("SCRAPY_SETTINGS_MODULE", "movies.settings")
+
+
+def run_crawl(server, output_dir, args, extra_settings=None) -> dict:
+    """
+    Crawls the stand-in server once and returns the measurements.
+    """
+    from scrapy import signals
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    from movies.instrumentation import timings
+    from movies.spiders.chart import ChartSpider
+    from movies.spiders.top250 import Top250Spider
+
+    settings = get_project_settings()
+    settings.setdict({
+        "TOP250_START_URLS": [server.url(f"/{CHART_PATH}/")],
+        "TOP250_ALLOWED_DOMAINS": [server.host],
+        "DOWNLOAD_DELAY": args.download_delay,
+        "BROWSER_POOL_SIZE": args.pool_size,
+        "RENDER_TITLE_PAGES": args.render_titles,
+        "SHEETS_EXPORT_ENABLED": False,
+        "HTTPCACHE_ENABLED": False,
+        "METRICS_ENABLED": True,
+        "CHECKPOINT_PATH": os.path.join(output_dir, "checkpoint.sqlite"),
+        "TITLE_CACHE_PATH": os.path.join(output_dir, "title_cache.sqlite"),
+        "PAGE_ARCHIVE_DIR": os.path.join(output_dir, "archive"),
+        "QUERY_INDEX_PATH": os.path.join(output_dir, "movies.idx"),
+        "LOG_LEVEL": args.log_level,
+        **dict(setting.split("=", 1) for setting in args.set),
+        **(extra_settings or {}),
+    }, priority="cmdline")
+
+    latencies = {}
+    max_pending = [0]  # Requests waiting in the scheduler, at most
+
+    def response_received(response, request, spider):
+        max_pending[0] = max(
+            max_pending[0], len(crawler.engine.slot.scheduler)
+        )
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            page_type = request.meta.get("page_type", "other")
+            latencies.setdefault(page_type, []).append(latency)
+
+    process = CrawlerProcess(settings)
+    if args.spider == "chart":
+        crawler = process.create_crawler(ChartSpider)
+        spider_kwargs = {"url": server.url(f"/{CHART_PATH}/")}
+    else:
+        crawler = process.create_crawler(Top250Spider)
+        spider_kwargs = {}
+    crawler.signals.connect(
+        response_received, signal=signals.response_received
+    )
+
+    started = time.monotonic()
+    process.crawl(crawler, **spider_kwargs)
+    process.start()
+    elapsed = time.monotonic() - started
+
+    stats = crawler.stats.get_stats()
+    all_latencies = [value for values in latencies.values()
+                     for value in values]
+    pages = len(all_latencies)
+    counters = timings.snapshot()["counters"]
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    # Browsers and their drivers are child processes, reaped at shutdown
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    return {
+        "pages": pages,
+        "items": stats.get("item_scraped_count", 0),
+        "retries": stats.get("retry/count", 0),
+        "title_cache_hits": stats.get("title_cache/hits", 0),
+        "elapsed_s": elapsed,
+        "pages_per_s": pages / elapsed if elapsed else 0.0,
+        "latency_p50_s": percentile(all_latencies, 0.50),
+        "latency_p95_s": percentile(all_latencies, 0.95),
+        "latency_by_page_type": {
+            page_type: {
+                "count": len(values),
+                "p50_s": percentile(values, 0.50),
+                "p95_s": percentile(values, 0.95),
+            }
+            for page_type, values in sorted(latencies.items())
+        },
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        "peak_rss_mb": own.ru_maxrss / (
+            1024 * 1024 if sys.platform == "darwin" else 1024
+        ),
+        "browser_cpu_s": children.ru_utime + children.ru_stime,
+        "scheduler_max_pending": max_pending[0],
+        # Everything the stand-in sent, browser subresources included
+        "served_requests": server.served.requests,
+        "served_mb": server.served.bytes / (1024 * 1024),
+        # Requests the stand-in answered with 429, over its capacity
+        "served_rejected": server.served.rejected,
+        # WebDriver commands sent to the browsers
+        "browser_round_trips": counters.get("browser/round_trips", 0),
+        "stages": timings.snapshot()["stages"],
+        # Concurrency and delay each page type's throttle ended with
+        "throttle": {
+            key[len("throttle/"):]: value
+            for key, value in sorted(stats.items())
+            if key.startswith("throttle/")
+        },
+    }
+
+
+def format_report(result) -> str:
+    def seconds(value):
+        return "-" if value is None else f"{value:.3f} s"
+
+    lines = [
+        f"{'pages':<20}{result['pages']}",
+        f"{'movies scraped':<20}{result['items']}",
+        f"{'retries':<20}{result['retries']}",
+        f"{'title cache hits':<20}{result['title_cache_hits']}",
+        f"{'elapsed':<20}{result['elapsed_s']:.2f} s",
+        f"{'pages/sec':<20}{result['pages_per_s']:.2f}",
+        f"{'latency p50':<20}{seconds(result['latency_p50_s'])}",
+        f"{'latency p95':<20}{seconds(result['latency_p95_s'])}",
+        f"{'peak RSS':<20}{result['peak_rss_mb']:.1f} MB",
+        f"{'browser CPU':<20}{result['browser_cpu_s']:.2f} s",
+        f"{'browser round trips':<20}{result['browser_round_trips']}",
+        f"{'scheduler peak':<20}{result['scheduler_max_pending']} requests",
+        f"{'served':<20}{result['served_requests']} requests, "
+        f"{result['served_mb']:.1f} MB",
+        f"{'rejected (429)':<20}{result['served_rejected']} requests",
+    ]
+    for page_type, values in result["latency_by_page_type"].items():
+        lines.append(
+            f"  {page_type:<18}{values['count']:>5} pages, "
+            f"p50 {seconds(values['p50_s'])}, p95 {seconds(values['p95_s'])}"
+        )
+    throttles = {}
+    for key, value in result.get("throttle", {}).items():
+        name, _, metric = key.rpartition("/")
+        throttles.setdefault(name, {})[metric] = value
+    for name, values in throttles.items():
+        lines.append(
+            f"  throttle {name:<22}concurrency {values['concurrency']} "
+            f"(peak {values['peak']}), delay {values['delay']:.2f} s, "
+            f"{values['backoffs']} backoffs"
+        )
+    return "\n".join(lines)
+
+
+def regressions(result, baseline, tolerance) -> list:
+    """
+    Compares a result with a baseline result and describes every metric
+    that got worse by more than the tolerance.
+    """
+    found = []
+    if result["pages_per_s"] < baseline["pages_per_s"] * (1 - tolerance):
+        found.append(
+            f"pages/sec {result['pages_per_s']:.2f} < baseline "
+            f"{baseline['pages_per_s']:.2f}"
+        )
+    for key in ("latency_p95_s", "peak_rss_mb", "browser_cpu_s", "served_mb"):
+        if result[key] is not None and baseline.get(key) is not None and \
+                result[key] > baseline[key] * (1 + tolerance):
+            found.append(f"{key} {result[key]:.3f} > baseline "
+                         f"{baseline[key]:.3f}")
+    return found
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Offline benchmark of the top250 spider"
+    )
+    parser.add_argument("--pages", help="recorded pages directory; "
+                        "a synthetic site is generated when omitted")
+    parser.add_argument("--movies", type=int, default=250,
+                        help="movies in the synthetic site")
+    parser.add_argument("--spider", choices=("top250", "chart"),
+                        default="top250")
+    parser.add_argument("--per-page", type=int,
+                        help="movies per chart page (default: one page)")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--capacity", type=int, default=0,
+                        help="requests the stand-in serves at once, more "
+                        "get 429 (default: no limit)")
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--download-delay", type=float, default=0.0)
+    parser.add_argument(
+        "--render-titles", action=argparse.BooleanOptionalAction,
+        default=True, help="render title pages in Chrome (needs "
+        "CHROME_DRIVER_PATH)",
+    )
+    parser.add_argument(
+        "--set", action="append", default=[], metavar="NAME=VALUE",
+        help="override a Scrapy setting, e.g. --set BROWSER_HEADLESS=False",
+    )
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", help="write the result to this file")
+    parser.add_argument("--baseline", help="result file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative regression (default 0.2)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="top250-bench-") as work_dir:
+        configure_environment(work_dir)
+        root = args.pages
+        if root is None:
+            root = os.path.join(work_dir, "site")
+            write_site(root, args.movies, per_page=args.per_page)
+
+        with StandInServer(root, latency=args.latency, jitter=args.jitter,
+                           fail_rate=args.fail_rate,
+                           capacity=args.capacity) as server:
+            result = run_crawl(server, work_dir, args)
+        # The log file is in work_dir: write it out before it is removed
+        from logger import shutdown_loggers
+        shutdown_loggers()
+
+    print(format_report(result))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            found = regressions(result, json.load(f), args.tolerance)
+        for regression in found:
+            print(f"REGRESSION: {regression}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
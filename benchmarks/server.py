@@ -0,0 +1,195 @@
+"""
+Local stand-in for www.imdb.com serving recorded pages.
+
+A request for ``/title/tt0111161/?ref_=x`` is answered with
+``<root>/title/tt0111161/index.html``; the query string is ignored.
+Other files under the root, such as images, are served as they are.
+Latency and failures can be injected, and the concurrent requests
+capped, to see how the crawler copes.
+
+    python -m benchmarks.server --root pages --port 8250 --latency 0.1
+"""
+import argparse
+import mimetypes
+import os
+import random
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves ``index.html`` files from the page root, after the configured
+    latency, failing a share of requests with 503. Requests beyond the
+    capacity, the ``slots`` semaphore, are answered at once with 429,
+    like a rate-limiting site.
+    """
+
+    def __init__(self, *args, root, latency=0.0, jitter=0.0, fail_rate=0.0,
+                 counters=None, slots=None, **kwargs):
+        self.root = root
+        self.counters = counters
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.slots = slots
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        if self.slots is None:
+            self.serve()
+        elif not self.slots.acquire(blocking=False):
+            if self.counters is not None:
+                self.counters.reject()
+            self.send_error(429, "Over capacity")
+        else:
+            try:
+                self.serve()
+            finally:
+                self.slots.release()
+
+    def serve(self):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+
+        if random.random() < self.fail_rate:
+            self.send_error(503, "Injected failure")
+            return
+
+        path = os.path.normpath(
+            os.path.join(self.root, urlsplit(self.path).path.strip("/"))
+        )
+        file_path = path
+        if os.path.isdir(path):
+            file_path = os.path.join(path, "index.html")
+        if not file_path.startswith(os.path.abspath(self.root)) or \
+                not os.path.isfile(file_path):
+            self.send_error(404)
+            return
+
+        with open(file_path, "rb") as f:
+            body = f.read()
+        content_type = (
+            mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        )
+        if content_type == "text/html":
+            content_type += "; charset=utf-8"
+        if self.counters is not None:
+            self.counters.add(body)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ServedCounters:
+    """
+    Requests answered, body bytes sent and requests rejected over
+    capacity, shared by the handler threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes = 0
+        self.rejected = 0
+
+    def add(self, body: bytes) -> None:
+        with self.lock:
+            self.requests += 1
+            self.bytes += len(body)
+
+    def reject(self) -> None:
+        with self.lock:
+            self.rejected += 1
+
+
+class StandInServer:
+    """
+    Runs the stand-in in a background thread:
+
+        with StandInServer("pages", latency=0.05) as server:
+            crawl(server.url("/chart/top/"))
+    """
+
+    def __init__(self, root, host="127.0.0.1", port=0, latency=0.0,
+                 jitter=0.0, fail_rate=0.0, capacity=0):
+        self.served = ServedCounters()
+        handler = partial(
+            StandInHandler,
+            root=os.path.abspath(root),
+            latency=latency,
+            jitter=jitter,
+            fail_rate=fail_rate,
+            counters=self.served,
+            slots=threading.BoundedSemaphore(capacity) if capacity else None,
+        )
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, name="stand-in", daemon=True
+        )
+
+    @property
+    def host(self) -> str:
+        return self.httpd.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def url(self, path: str) -> str:
+        return f"http://{self.host}:{self.port}{path}"
+
+    def start(self) -> "StandInServer":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "StandInServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--root", required=True, help="recorded pages")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8250)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="random extra latency, up to this many seconds")
+    parser.add_argument("--fail-rate", type=float, default=0.0,
+                        help="share of requests answered with 503")
+    parser.add_argument("--capacity", type=int, default=0,
+                        help="requests served at once, more get 429 "
+                        "(default: no limit)")
+    args = parser.parse_args()
+
+    server = StandInServer(
+        args.root, args.host, args.port, args.latency, args.jitter,
+        args.fail_rate, args.capacity,
+    )
+    print(f"Serving {args.root} on {server.url('/')}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
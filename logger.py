@@ -1,26 +1,172 @@
+"""
+Logging of the spiders to a JSON lines file, written off the reactor
+thread: loggers put their records on a queue, and a listener thread per
+log file formats them and writes them, rotating the file by size.
+"""
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from decouple import config
+
+LOG_MAX_BYTES = config("SPIDER_LOG_MAX_BYTES", default=10 * 1024 * 1024,
+                       cast=int)
+LOG_BACKUP_COUNT = config("SPIDER_LOG_BACKUP_COUNT", default=5, cast=int)
+# Per-page lines logged in full a second, and one in how many beyond that
+LOG_SAMPLE_RATE = config("SPIDER_LOG_SAMPLE_RATE", default=100, cast=int)
+LOG_SAMPLE_EVERY = config("SPIDER_LOG_SAMPLE_EVERY", default=10, cast=int)
+
+# Record attributes written to the JSON lines when a call passes them in
+# ``extra``; per-page lines pass a ``stage``
+FIELDS = ("position", "url", "stage", "sampled")
+
+listeners = {}  # Listener writing each log file, by absolute path
+listeners_lock = threading.Lock()
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Formats a record as a JSON object on one line.
+    """
+
+    def format(self, record) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class PageSampler(logging.Filter):
+    """
+    Keeps the per-page info lines, those with a ``stage``, in full up to
+    ``rate`` a second and one in ``every`` beyond that, marked with the
+    number of lines each stands for. Other records are always kept.
+    """
+
+    def __init__(self, rate: int, every: int):
+        super().__init__()
+        self.rate = rate
+        self.every = max(1, every)
+        self.second = None
+        self.count = 0
+
+    def filter(self, record) -> bool:
+        if record.levelno > logging.INFO or \
+                getattr(record, "stage", None) is None:
+            return True
+        second = int(time.monotonic())
+        if second != self.second:
+            self.second, self.count = second, 0
+        self.count += 1
+        over = self.count - self.rate
+        if over <= 0:
+            return True
+        if over % self.every:
+            return False
+        record.sampled = self.every
+        return True
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on the queue of a log file's listener, with their
+    message and traceback already formatted, as the arguments they refer
+    to may change before the listener writes them.
+    """
+
+    def __init__(self, log_queue, path: str):
+        super().__init__(log_queue)
+        self.path = path
+        self.exception_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        record = copy.copy(record)  # Other handlers may see the record
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.exception_formatter.formatException(
+                record.exc_info
+            )
+            record.exc_info = None
+        return record
+
+
+def log_listener(path: str) -> logging.handlers.QueueListener:
+    """
+    Returns the listener writing a log file, started on first use.
+    """
+    with listeners_lock:
+        listener = listeners.get(path)
+        if listener is None:
+            file_handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                encoding="utf-8", delay=True,
+            )
+            file_handler.setFormatter(JsonLinesFormatter())
+            listener = logging.handlers.QueueListener(
+                queue.SimpleQueue(), file_handler
+            )
+            listener.start()
+            listeners[path] = listener
+        return listener
 
 
 def setup_logger(
         name: str, log_file: str, level=logging.INFO
 ) -> logging.Logger:
-    """Function to setup logger with specified name, log file, and level."""
-
-    # Create logger object
+    """
+    Returns the named logger, writing to log_file through its listener.
+    Calling it again, e.g. for every spider instance, adds no handler.
+    """
     logger = logging.getLogger(name)
     logger.setLevel(level)
+    path = os.path.abspath(log_file)
+    listener = log_listener(path)
+    for handler in list(logger.handlers):
+        if isinstance(handler, LogQueueHandler) and handler.path == path:
+            if handler.queue is listener.queue:
+                handler.setLevel(level)
+                return logger
+            # Left from a listener since shut down
+            logger.removeHandler(handler)
 
-    # Create file handler to log to a file
-    file_handler = logging.FileHandler(log_file)
-    file_handler.setLevel(level)
+    handler = LogQueueHandler(listener.queue, path)
+    handler.setLevel(level)
+    handler.addFilter(PageSampler(LOG_SAMPLE_RATE, LOG_SAMPLE_EVERY))
+    logger.addHandler(handler)
+    return logger
 
-    # Format the log messages
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    file_handler.setFormatter(formatter)
 
-    # Add the file handler to the logger
-    logger.addHandler(file_handler)
+def shutdown_loggers() -> None:
+    """
+    Writes the queued records and closes the log files. Runs at exit.
+    """
+    with listeners_lock:
+        for listener in listeners.values():
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+        listeners.clear()
 
-    return logger
+
+atexit.register(shutdown_loggers)
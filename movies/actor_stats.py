@@ -0,0 +1,111 @@
+from array import array
+
+
+class ActorAggregate:
+    """
+    Running totals for one actor. Movies are kept as positions in an
+    integer array rather than as title strings.
+    """
+    __slots__ = ("count", "rating_sum", "first_seen", "positions", "sorted")
+
+    def __init__(self, first_seen):
+        self.count = 0
+        self.rating_sum = 0
+        self.first_seen = first_seen
+        self.positions = array("I")
+        self.sorted = True
+
+
+class ActorStats:
+    """
+    Actor analysis maintained incrementally as movies arrive, in any
+    order. ``snapshot`` can be called at any time; the result is the
+    same as running the analysis over all movies sorted by position.
+
+    Actors are aggregated by person key, so namesakes are kept apart,
+    and named from the PersonTable passed to ``snapshot``.
+    """
+
+    def __init__(self, min_movies=2):
+        self.min_movies = min_movies
+        self.actors = {}
+        self.titles = {}  # position -> original title
+        self.ratings = {}  # position -> rating
+
+    def add(self, position, original_title, rating, cast) -> None:
+        """
+        Adds one movie and its billed cast to the aggregates.
+        """
+        rating = rating or 0
+        self.titles[position] = original_title
+        self.ratings[position] = rating
+        for index, actor in enumerate(cast):
+            aggregate = self.actors.get(actor)
+            if aggregate is None:
+                aggregate = self.actors[actor] = ActorAggregate(
+                    (position, index)
+                )
+            elif (position, index) < aggregate.first_seen:
+                aggregate.first_seen = (position, index)
+            if aggregate.positions and position < aggregate.positions[-1]:
+                aggregate.sorted = False
+            aggregate.count += 1
+            aggregate.rating_sum += rating
+            aggregate.positions.append(position)
+
+    def add_item(self, item) -> None:
+        """
+        Adds a MoviesItem.
+        """
+        self.add(
+            item["position"], item["original_title"], item["rating"],
+            item.get("cast") or [],
+        )
+
+    def add_record(self, record) -> None:
+        """
+        Adds a movie record as written to the movies JSON lines file.
+        """
+        self.add(
+            record["Position in rating"], record["Original title"],
+            record.get("Rating"), record.get("Cast") or [],
+        )
+
+    def snapshot(self, people=None) -> list:
+        """
+        Returns the actor analysis for the movies added so far: actors
+        appearing in at least ``min_movies`` movies, in order of first
+        appearance, with their movies count, average rating and movies.
+        """
+        actors = sorted(
+            (
+                (aggregate.first_seen, actor, aggregate)
+                for actor, aggregate in self.actors.items()
+                if aggregate.count >= self.min_movies
+            ),
+            key=lambda entry: entry[0],
+        )
+
+        actors_analysis = []
+        for _, actor, aggregate in actors:
+            if aggregate.sorted:
+                positions = aggregate.positions
+                total_rating = aggregate.rating_sum
+            else:
+                # Re-summed in position order so the rounded average is
+                # the same float as for movies added in order
+                positions = sorted(aggregate.positions)
+                total_rating = sum(self.ratings[p] for p in positions)
+            actors_analysis.append({
+                "Actor": people.name(actor) if people is not None else actor,
+                "Movies Count": aggregate.count,
+                "Average Rating": round(total_rating / aggregate.count, 2),
+                "Movies": [self.titles[position] for position in positions],
+            })
+        return actors_analysis
+
+    def finalize(self, people=None) -> list:
+        """
+        Returns the final actor analysis.
+        """
+        return self.snapshot(people)
@@ -0,0 +1,52 @@
+from collections import deque
+
+
+class AdaptiveTimeouts:
+    """
+    Learns how long to wait for each page type's selectors from how long
+    the waits took so far.
+
+    Until ``min_samples`` waits of a page type have been observed, the
+    default timeout given by the caller is used. After that the timeout
+    is the chosen percentile of the last ``window`` waits times
+    ``margin``, kept between ``min_timeout`` and ``max_timeout``. A slow
+    site thus gets longer timeouts instead of dropped movies, and a
+    broken page fails fast instead of waiting the full default.
+    """
+
+    def __init__(self, min_timeout=1.0, max_timeout=30.0, percentile=0.95,
+                 margin=2.0, min_samples=20, window=200):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.percentile = percentile
+        self.margin = margin
+        self.min_samples = min_samples
+        self.window = window
+        self.samples = {}  # page type -> deque of wait durations
+
+    def observe(self, page_type: str, seconds: float) -> None:
+        """
+        Records how long a successful wait on a page type took.
+        """
+        samples = self.samples.get(page_type)
+        if samples is None:
+            samples = self.samples[page_type] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def timeout(self, page_type: str, default: float) -> float:
+        """
+        Returns the timeout for the next wait on a page type.
+        """
+        samples = self.samples.get(page_type)
+        if samples is None or len(samples) < self.min_samples:
+            return default
+        ordered = sorted(samples)
+        index = min(int(self.percentile * len(ordered)), len(ordered) - 1)
+        learned = ordered[index] * self.margin
+        return min(max(learned, self.min_timeout), self.max_timeout)
+
+    def escalate(self, timeout: float) -> float:
+        """
+        Returns the timeout for retrying a wait that timed out.
+        """
+        return min(max(timeout * 2, self.min_timeout), self.max_timeout)
@@ -0,0 +1,301 @@
+"""
+Vectorized analysis of the scraped movies with pandas and NumPy:
+
+    python -m movies.analysis --output analysis.json
+    python -m movies.analysis --columnar export/ --min-movies 3
+
+Reads the movies and people JSON lines files, or the tables written by
+ColumnarExporter, and computes the actor analysis (the same records as
+actors.json), director stats, decade and rating distributions and the
+actors most often cast together. Needs pandas (and pyarrow for the
+columnar files), which are optional:
+``pip install -r requirements-analysis.txt``.
+"""
+import argparse
+import json
+import os
+import sys
+
+from decouple import config
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError as e:
+    raise ImportError(
+        "movies.analysis needs pandas and NumPy, which the crawl does not "
+        "install: pip install -r requirements-analysis.txt"
+    ) from e
+
+from movies.columnar import FORMATS, MOVIE_COLUMNS, ROLES
+from movies.pipelines import read_jsonl
+
+MOVIES_JSONL_PATH = config("MOVIES_JSONL_PATH", default="movies.jsonl")
+PEOPLE_JSONL_PATH = config("PEOPLE_JSONL_PATH", default="people.jsonl")
+
+
+def load_jsonl(movies_path=MOVIES_JSONL_PATH,
+               people_path=PEOPLE_JSONL_PATH) -> dict:
+    """
+    Loads the JSON lines files as the movies, credits and people tables
+    of movies.columnar. A later line for the same position wins, as in
+    movies.json.
+    """
+    records = pd.DataFrame.from_records(list(read_jsonl(movies_path)))
+    records = records.drop_duplicates("Position in rating", keep="last")
+    records = records.sort_values("Position in rating")
+
+    movies = pd.DataFrame({
+        column: records[key] for column, key in MOVIE_COLUMNS.items()
+    }).reset_index(drop=True)
+
+    credits = []
+    for role, key in ROLES.items():
+        edges = records[["Position in rating", key]].explode(key).dropna()
+        credits.append(pd.DataFrame({
+            "position": edges["Position in rating"].to_numpy(np.int64),
+            "person": edges[key].to_numpy(np.int64),
+            "role": role,
+            # explode keeps the index of the movie, numbering its people
+            "billing": edges.groupby(level=0).cumcount().to_numpy(),
+        }))
+
+    people = pd.DataFrame(
+        list(read_jsonl(people_path)), columns=["person", "name"]
+    ).drop_duplicates("person", keep="last")
+    return {
+        "movies": movies,
+        "credits": pd.concat(credits, ignore_index=True),
+        "people": people,
+    }
+
+
+def load_columnar(directory: str) -> dict:
+    """
+    Loads the tables written by ColumnarExporter to a directory.
+    """
+    tables = {}
+    for name in ("movies", "credits", "people"):
+        for file_format, extension in FORMATS.items():
+            path = os.path.join(directory, name + extension)
+            if os.path.exists(path):
+                tables[name] = (
+                    pd.read_parquet(path) if file_format == "parquet"
+                    else pd.read_feather(path)
+                )
+                break
+        else:
+            raise FileNotFoundError(f"No {name} table in {directory}")
+    tables["credits"]["role"] = tables["credits"]["role"].astype(str)
+    return tables
+
+
+def group_starts(keys: np.ndarray) -> np.ndarray:
+    """
+    Returns the index of the first row of every run of equal keys.
+    """
+    if not len(keys):
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+
+def sequential_sums(groups, values, starts) -> np.ndarray:
+    """
+    Sums the values of each group of consecutive rows in row order, one
+    addition at a time. NumPy and pandas reductions sum pairwise, which
+    can differ in the last bit and so in a rounded average; adding the
+    n-th value of every group at once keeps the order of Python's sum.
+    """
+    sums = np.zeros(len(starts))
+    if not len(groups):
+        return sums
+    ranks = np.arange(len(groups)) - starts[groups]
+    order = np.lexsort((groups, ranks))
+    bounds = np.searchsorted(ranks[order], np.arange(ranks.max() + 2))
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        rows = order[first:last]
+        sums[groups[rows]] += values[rows]
+    return sums
+
+
+def person_stats(tables, role="cast", label="Actor",
+                 min_movies=2) -> list:
+    """
+    Returns, for the people credited in a role in at least ``min_movies``
+    movies, in order of first credit, their movies count, average rating
+    and movies (original titles by position). For the cast this is the
+    actor analysis of ActorStats, value for value.
+    """
+    movies = tables["movies"].set_index("position")
+    credits = tables["credits"]
+    edges = credits.loc[
+        credits["role"] == role, ["person", "position", "billing"]
+    ]
+    counts = edges["person"].map(edges["person"].value_counts())
+    edges = edges[counts >= min_movies].sort_values(
+        ["person", "position", "billing"], kind="stable"
+    )
+
+    persons = edges["person"].to_numpy()
+    positions = edges["position"].to_numpy()
+    billings = edges["billing"].to_numpy()
+    starts = group_starts(persons)
+    sizes = np.diff(np.r_[starts, len(persons)])
+    groups = np.repeat(np.arange(len(starts)), sizes)
+    ratings = (
+        edges["position"].map(movies["rating"]).fillna(0)
+        .to_numpy(np.float64)
+    )
+    sums = sequential_sums(groups, ratings, starts)
+    titles = edges["position"].map(movies["original_title"]).to_numpy(object)
+    names = tables["people"].set_index("person")["name"]
+
+    stats = []
+    # By first credit: the earliest position, then the billing there
+    for group in np.lexsort((billings[starts], positions[starts])):
+        start, size = starts[group], int(sizes[group])
+        stats.append({
+            label: names[persons[start]],
+            "Movies Count": size,
+            "Average Rating": round(float(sums[group]) / size, 2),
+            "Movies": titles[start:start + size].tolist(),
+        })
+    return stats
+
+
+def actor_stats(tables, min_movies=2) -> list:
+    return person_stats(tables, "cast", "Actor", min_movies)
+
+
+def director_stats(tables, min_movies=2) -> list:
+    return person_stats(tables, "director", "Director", min_movies)
+
+
+def decade_distribution(tables) -> list:
+    """
+    Returns the movies count and average rating of every decade.
+    """
+    movies = tables["movies"].dropna(subset=["year"])
+    decades = movies.groupby(
+        (movies["year"].astype(np.int64) // 10) * 10
+    )["rating"].agg(["size", "mean"])
+    return [
+        {
+            "Decade": int(decade),
+            "Movies Count": int(row["size"]),
+            "Average Rating": (
+                None if pd.isna(row["mean"])
+                else round(float(row["mean"]), 2)
+            ),
+        }
+        for decade, row in decades.iterrows()
+    ]
+
+
+def rating_distribution(tables) -> list:
+    """
+    Returns the movies count of every rating, highest first.
+    """
+    counts = tables["movies"]["rating"].value_counts().sort_index(
+        ascending=False
+    )
+    return [
+        {"Rating": float(rating), "Movies Count": int(count)}
+        for rating, count in counts.items()
+    ]
+
+
+def co_appearances(tables, min_movies=2, limit=100) -> list:
+    """
+    Returns the pairs of actors cast together in at least ``min_movies``
+    movies, most frequent first, at most ``limit`` of them.
+    """
+    credits = tables["credits"]
+    cast = credits.loc[
+        credits["role"] == "cast", ["position", "person"]
+    ].drop_duplicates()
+    # Only actors with enough movies can form a frequent enough pair
+    counts = cast["person"].map(cast["person"].value_counts())
+    cast = cast[counts >= min_movies]
+    codes, persons = pd.factorize(cast["person"])
+    order = np.lexsort((codes, cast["position"].to_numpy()))
+    codes = codes[order].astype(np.int64)
+    positions = cast["position"].to_numpy()[order]
+
+    # Rows k apart within a movie form every pair (a, b) with a < b
+    pairs = []
+    for distance in range(1, len(codes)):
+        same = positions[distance:] == positions[:-distance]
+        if not same.any():
+            break
+        pairs.append(
+            codes[:-distance][same] * len(persons) + codes[distance:][same]
+        )
+    if not pairs:
+        return []
+    pair_codes, counts = np.unique(np.concatenate(pairs), return_counts=True)
+    frequent = counts >= min_movies
+    pair_codes, counts = pair_codes[frequent], counts[frequent]
+    top = np.lexsort((pair_codes, -counts))[:limit]
+
+    names = tables["people"].set_index("person")["name"]
+    return [
+        {
+            "Actors": [
+                names[persons[pair_codes[index] // len(persons)]],
+                names[persons[pair_codes[index] % len(persons)]],
+            ],
+            "Movies Count": int(counts[index]),
+        }
+        for index in top
+    ]
+
+
+def analyze(tables, min_movies=2, pairs=100) -> dict:
+    return {
+        "actors": actor_stats(tables, min_movies),
+        "directors": director_stats(tables, min_movies),
+        "decades": decade_distribution(tables),
+        "ratings": rating_distribution(tables),
+        "co_appearances": co_appearances(tables, min_movies, pairs),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Analysis of the scraped movies"
+    )
+    parser.add_argument("--columnar", metavar="DIR",
+                        help="read the tables written by ColumnarExporter "
+                        "instead of the JSON lines files")
+    parser.add_argument("--movies", default=MOVIES_JSONL_PATH,
+                        help="movies JSON lines file")
+    parser.add_argument("--people", default=PEOPLE_JSONL_PATH,
+                        help="people JSON lines file")
+    parser.add_argument("--min-movies", type=int, default=2)
+    parser.add_argument("--pairs", type=int, default=100,
+                        help="most frequent co-appearances to report")
+    parser.add_argument("--output", help="write the analysis to this "
+                        "file instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.columnar:
+        tables = load_columnar(args.columnar)
+    else:
+        tables = load_jsonl(args.movies, args.people)
+    result = analyze(tables, args.min_movies, args.pairs)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=4)
+    else:
+        json.dump(result, sys.stdout, ensure_ascii=False, indent=4)
+        sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""
+Append-only archive of the fetched pages, so they can be parsed again
+offline (see movies.reparse) when IMDb changes its markup.
+
+An archive directory holds ``pages.gz``, a sequence of gzip members, one
+per page, each holding a JSON header line and the page body, and
+``index.sqlite``, mapping every requested URL to the file, offset and
+length of its members. A URL archived more than once is read back from
+its latest member. The workers of a sharded crawl append to pages files
+of their own, ``pages-<worker id>.gz``, indexed in the same database.
+"""
+import gzip
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse
+from twisted.internet import threads
+
+from movies.instrumentation import timings
+
+logger = logging.getLogger(__name__)
+
+PAGES_FILE = "pages.gz"
+INDEX_FILE = "index.sqlite"
+
+# Request meta kept in the headers, as chart spiders number movies by it
+ARCHIVED_META = ("page_type", "page", "offset", "position", "movie_url")
+
+
+class PageArchive:
+    """
+    Index of an archive directory, appending to one of its pages files.
+    """
+
+    def __init__(self, directory: str, compresslevel: int = 6,
+                 pages_file: str = PAGES_FILE):
+        self.directory = directory
+        self.compresslevel = compresslevel
+        os.makedirs(directory, exist_ok=True)
+        self.pages_file = pages_file
+        self.pages_path = os.path.join(directory, pages_file)
+        # Workers share the index, waiting on each other's commits
+        self.connection = sqlite3.connect(
+            os.path.join(directory, INDEX_FILE), timeout=30,
+            check_same_thread=False,
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " id INTEGER PRIMARY KEY,"
+            " url TEXT,"
+            " page_type TEXT,"
+            " spider TEXT,"
+            " run REAL,"
+            " offset INTEGER,"
+            " length INTEGER,"
+            " file TEXT"
+            ")"
+        )
+        columns = {
+            row[1] for row in
+            self.connection.execute("PRAGMA table_info(pages)")
+        }
+        if "file" not in columns:
+            # Indexes from before the pages files of workers
+            self.connection.execute("ALTER TABLE pages ADD COLUMN file TEXT")
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS pages_url ON pages (url)"
+        )
+        self.connection.commit()
+        self.file = None
+        self.rows = []  # Index rows of the pages not flushed yet
+
+    def __contains__(self, url) -> bool:
+        if any(row[0] == url for row in self.rows):
+            return True
+        return self.connection.execute(
+            "SELECT 1 FROM pages WHERE url = ? LIMIT 1", (url,)
+        ).fetchone() is not None
+
+    def append(self, header: dict, body: bytes) -> None:
+        """
+        Compresses a page into a new member at the end of the pages file
+        and indexes it by its ``request_url``. Indexed by ``flush``.
+        """
+        if self.file is None:
+            self.file = open(self.pages_path, "ab")
+        member = gzip.compress(
+            json.dumps(header, ensure_ascii=False).encode("utf-8") +
+            b"\n" + body,
+            compresslevel=self.compresslevel,
+        )
+        offset = self.file.tell()
+        self.file.write(member)
+        self.rows.append(
+            (header["request_url"], header["meta"].get("page_type"),
+             header["spider"], header["run"], offset, len(member),
+             self.pages_file)
+        )
+
+    def flush(self) -> None:
+        """
+        Forces the appended pages to disk, then commits their index rows,
+        so the index never points past the end of the pages file. The
+        rows are inserted at once, holding the write lock of the index,
+        shared with the workers of a sharded crawl, only briefly.
+        """
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        if self.rows:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT INTO pages"
+                    " (url, page_type, spider, run, offset, length, file)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    self.rows,
+                )
+            self.rows = []
+
+    def latest(self, urls=None, page_type=None) -> dict:
+        """
+        Returns ``{url: (pages file, offset, length)}`` of the latest
+        member of every archived URL, optionally only of the given URLs or
+        page type.
+        """
+        query = (
+            "SELECT url, IFNULL(file, ?), offset, length FROM pages"
+            " WHERE id IN ("
+            " SELECT MAX(id) FROM pages"
+            + (" WHERE page_type = ?" if page_type else "")
+            + " GROUP BY url)"
+        )
+        params = (PAGES_FILE, page_type) if page_type else (PAGES_FILE,)
+        rows = self.connection.execute(query, params).fetchall()
+        if urls is not None:
+            urls = set(urls)
+            rows = [row for row in rows if row[0] in urls]
+        return {url: tuple(member) for url, *member in rows}
+
+    def last_run(self, spider: str, page_type: str) -> dict:
+        """
+        Returns ``{url: (pages file, offset, length)}`` of the pages of a
+        type archived by the last run of a spider that archived any.
+        """
+        (run,) = self.connection.execute(
+            "SELECT MAX(run) FROM pages WHERE spider = ? AND page_type = ?",
+            (spider, page_type),
+        ).fetchone()
+        if run is None:
+            return {}
+        rows = self.connection.execute(
+            "SELECT url, IFNULL(file, ?), offset, length FROM pages"
+            " WHERE id IN ("
+            " SELECT MAX(id) FROM pages"
+            " WHERE spider = ? AND page_type = ? AND run = ?"
+            " GROUP BY url)",
+            (PAGES_FILE, spider, page_type, run),
+        ).fetchall()
+        return {url: tuple(member) for url, *member in rows}
+
+    def close(self) -> None:
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.connection.close()
+
+
+def read_member(f, offset: int, length: int) -> tuple:
+    """
+    Reads the header and body of the member at an offset of an open
+    pages file.
+    """
+    f.seek(offset)
+    header, body = gzip.decompress(f.read(length)).split(b"\n", 1)
+    return json.loads(header), body
+
+
+def read_page(f, offset: int, length: int) -> HtmlResponse:
+    """
+    Reads the archived page at an offset of an open pages file back as
+    the response it was parsed from.
+    """
+    header, body = read_member(f, offset, length)
+    return HtmlResponse(
+        url=header["url"],
+        status=header["status"],
+        body=body,
+        encoding=header["encoding"],
+        flags=header["flags"],
+    )
+
+
+class PageArchiver:
+    """
+    Scrapy extension appending every page with a page type to the
+    archive in PAGE_ARCHIVE_DIR, static and rendered alike. Pages are
+    compressed and written by a background thread, synced every
+    PAGE_ARCHIVE_FLUSH_EVERY pages and when the spider closes. Pages
+    served from the HTTP cache are archived only if their URL is not
+    archived yet. Disabled when PAGE_ARCHIVE_DIR is empty.
+    """
+
+    def __init__(self, directory, compresslevel=6, flush_every=100):
+        self.directory = directory
+        self.compresslevel = compresslevel
+        self.flush_every = flush_every
+        self.tasks = queue.Queue()
+        self.thread = None
+        self.run_started = None
+        self.archived = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        directory = crawler.settings.get("PAGE_ARCHIVE_DIR")
+        if not directory:
+            raise NotConfigured
+        ext = cls(
+            directory,
+            compresslevel=crawler.settings.getint(
+                "PAGE_ARCHIVE_COMPRESSLEVEL", 6
+            ),
+            flush_every=crawler.settings.getint(
+                "PAGE_ARCHIVE_FLUSH_EVERY", 100
+            ),
+        )
+        crawler.signals.connect(
+            ext.spider_opened, signal=signals.spider_opened
+        )
+        crawler.signals.connect(
+            ext.response_received, signal=signals.response_received
+        )
+        crawler.signals.connect(
+            ext.spider_closed, signal=signals.spider_closed
+        )
+        return ext
+
+    def spider_opened(self, spider):
+        self.run_started = time.time()
+        pages_file = PAGES_FILE
+        if getattr(spider, "role", None) == "worker":
+            worker = re.sub(r"[^\w.-]", "_", spider.worker_id)
+            pages_file = f"pages-{worker}.gz"
+        archive = PageArchive(self.directory, self.compresslevel, pages_file)
+        self.thread = threading.Thread(
+            target=self.run, args=(archive,), name="page-archive",
+            daemon=True,
+        )
+        self.thread.start()
+
+    def response_received(self, response, request, spider):
+        if (
+                self.thread is None or response.status != 200 or
+                "page_type" not in request.meta
+        ):
+            return
+        header = {
+            "url": response.url,
+            "request_url": request.url,
+            "status": response.status,
+            "encoding": getattr(response, "encoding", "utf-8"),
+            "flags": list(response.flags),
+            "spider": spider.name,
+            "run": self.run_started,
+            "fetched_at": time.time(),
+            "meta": {
+                key: request.meta[key]
+                for key in ARCHIVED_META if key in request.meta
+            },
+        }
+        self.tasks.put((header, response.body))
+
+    def spider_closed(self, spider):
+        """
+        Queues the end of the archive and returns a Deferred firing once
+        the worker has written and synced every page.
+        """
+        if self.thread is None:
+            return None
+        self.tasks.put(None)
+        deferred = threads.deferToThread(self.thread.join)
+        deferred.addCallback(self.joined)
+        return deferred
+
+    def joined(self, _):
+        logger.info("Archived %d pages in %s", self.archived, self.directory)
+
+    def run(self, archive) -> None:
+        """
+        Worker loop appending the queued pages to the archive.
+        """
+        unflushed = 0
+        try:
+            while True:
+                task = self.tasks.get()
+                if task is None:
+                    break
+                header, body = task
+                if "cached" in header["flags"] and \
+                        header["request_url"] in archive:
+                    continue
+                with timings.stage("archive/write"):
+                    archive.append(header, body)
+                self.archived += 1
+                unflushed += 1
+                if unflushed >= self.flush_every:
+                    archive.flush()
+                    unflushed = 0
+        except Exception:
+            logger.exception("Error archiving pages")
+        finally:
+            archive.close()
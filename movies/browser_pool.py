@@ -0,0 +1,266 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+from selenium.common import TimeoutException, WebDriverException
+from twisted.internet import threads
+from twisted.python.threadpool import ThreadPool
+
+from movies.chrome_driver import ChromeDriver
+from movies.instrumentation import timings
+
+logger = logging.getLogger(__name__)
+
+# Waits in the page until every selector in arguments[0] (one selector, a
+# list of them, or none for the parsed document) is present, then returns
+# the URL and DOM, so a render takes a single WebDriver round trip after
+# driver.get instead of one per wait poll, current_url and page_source.
+CAPTURE_SCRIPT = """
+const selectors = [].concat(arguments[0] || []);
+const done = arguments[arguments.length - 1];
+const ready = () => document.readyState !== "loading" &&
+    selectors.every((selector) => document.querySelector(selector));
+const capture = () => done(
+    [window.location.href, document.documentElement.outerHTML]
+);
+if (ready()) {
+    capture();
+} else {
+    const observer = new MutationObserver(() => {
+        if (ready()) {
+            observer.disconnect();
+            capture();
+        }
+    });
+    observer.observe(document, {childList: true, subtree: true});
+    document.addEventListener("DOMContentLoaded", () => {
+        if (ready()) {
+            observer.disconnect();
+            capture();
+        }
+    });
+}
+"""
+
+
+def process_tree_rss(pid: int):
+    """
+    Returns the resident memory, in bytes, of a process and all of its
+    descendants, read from /proc. Returns None where /proc is missing.
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name in parentheses may contain spaces
+        parent = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(parent, []).append(int(entry))
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/statm", "r") as f:
+                total += int(f.read().split()[1]) * page_size
+        except OSError:
+            pass
+        pending.extend(children.get(current, []))
+    return total
+
+
+class BrowserPool:
+    """
+    Pool of browser workers that load pages off the reactor thread.
+    Drivers are started lazily, at most one per worker thread, and are
+    reused for every following page.
+
+    Drivers are created by ``driver_factory``, a ChromeDriver holding the
+    browser profile. With the "eager" page load strategy, driver.get
+    returns once the document is parsed and readiness is decided by the
+    request's wait_for selectors rather than by every image and script
+    having loaded.
+
+    Drivers are recycled, i.e. quit and replaced by a fresh browser on
+    the next render, after ``max_pages`` pages or once the browser's
+    process tree uses more than ``max_rss_mb`` (checked every
+    ``rss_check_every`` pages). A driver whose process has exited, or
+    that fails with a WebDriverException other than a timeout, is
+    discarded the same way, so one crash does not fail every later page.
+    """
+
+    def __init__(self, size: int, driver_factory: ChromeDriver = None,
+                 max_pages: int = 0, max_rss_mb: float = 0,
+                 rss_check_every: int = 10):
+        self.size = size
+        self.driver_factory = driver_factory or ChromeDriver(
+            page_load_strategy="eager"
+        )
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.rss_check_every = rss_check_every
+        self.pages = {}  # driver session id -> pages rendered
+        self.threadpool = ThreadPool(
+            minthreads=1, maxthreads=size, name="browser-pool"
+        )
+        self.idle_drivers = queue.Queue()
+        self.drivers = []
+        self.script_timeouts = {}  # driver session id -> seconds
+        self.lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Starts the worker threads.
+        """
+        self.threadpool.start()
+
+    def stop(self) -> None:
+        """
+        Waits for the running renders and quits every started driver.
+        """
+        self.threadpool.stop()
+        with self.lock:
+            drivers, self.drivers = self.drivers, []
+            self.script_timeouts = {}
+            self.pages = {}
+        for driver in drivers:
+            self._quit(driver)
+
+    def render(self, url: str, wait_for=None, timeout: float = 10):
+        """
+        Loads the url in a free browser and returns a Deferred firing
+        with a ``(current_url, page_source, wait_seconds)`` tuple, where
+        wait_seconds is the time spent waiting for the wait_for selector
+        (or list of selectors) after driver.get returned.
+        """
+        from twisted.internet import reactor
+
+        return threads.deferToThreadPool(
+            reactor, self.threadpool, self._render, url, wait_for, timeout
+        )
+
+    def _render(self, url: str, wait_for, timeout: float) -> tuple:
+        """
+        Runs in a worker thread: borrows a driver, loads the page, waits
+        in the browser until the wait_for selector is present and takes
+        the DOM. Raises selenium's TimeoutException if the selector does
+        not show up within the timeout, or the WebDriverException of a
+        browser that crashed, after discarding it.
+        """
+        with timings.stage("browser/acquire"):
+            driver = self._acquire()
+        healthy = True
+        try:
+            with self.lock:
+                current_timeout = self.script_timeouts.get(driver.session_id)
+            if current_timeout != timeout:
+                driver.set_script_timeout(timeout)
+                with self.lock:
+                    self.script_timeouts[driver.session_id] = timeout
+                timings.incr("browser/round_trips")
+            with timings.stage("browser/get"):
+                driver.get(url)
+            started = time.perf_counter()
+            with timings.stage("browser/capture"):
+                current_url, page_source = driver.execute_async_script(
+                    CAPTURE_SCRIPT, wait_for
+                )
+            timings.incr("browser/round_trips", 2)
+            return current_url, page_source, time.perf_counter() - started
+        except TimeoutException:
+            raise
+        except WebDriverException:
+            healthy = False
+            raise
+        finally:
+            self._release(driver, healthy)
+
+    def _acquire(self):
+        """
+        Returns an idle, live driver, starting a new one if all started
+        drivers are busy.
+        """
+        while True:
+            try:
+                driver = self.idle_drivers.get_nowait()
+            except queue.Empty:
+                break
+            if self.is_alive(driver):
+                return driver
+            self._retire(driver, "exited")
+
+        driver = self.driver_factory.create()
+        with self.lock:
+            self.drivers.append(driver)
+            self.pages[driver.session_id] = 0
+        return driver
+
+    def _release(self, driver, healthy: bool) -> None:
+        """
+        Returns a driver to the idle ones, or retires it if it crashed or
+        is due for recycling.
+        """
+        with self.lock:
+            pages = self.pages.get(driver.session_id, 0) + 1
+            self.pages[driver.session_id] = pages
+
+        if not healthy:
+            self._retire(driver, "crashed")
+        elif self.max_pages and pages >= self.max_pages:
+            self._retire(driver, "max_pages")
+        elif (
+                self.max_rss_mb and pages % self.rss_check_every == 0 and
+                (self.rss(driver) or 0) > self.max_rss_mb * 1024 * 1024
+        ):
+            self._retire(driver, "max_rss")
+        else:
+            self.idle_drivers.put(driver)
+
+    def _retire(self, driver, reason: str) -> None:
+        with self.lock:
+            if driver in self.drivers:
+                self.drivers.remove(driver)
+            pages = self.pages.pop(driver.session_id, 0)
+            self.script_timeouts.pop(driver.session_id, None)
+        logger.info(
+            "Recycling browser after %d pages (%s)", pages, reason
+        )
+        timings.incr(f"browser/recycled/{reason}")
+        self._quit(driver)
+
+    @staticmethod
+    def _quit(driver) -> None:
+        try:
+            driver.quit()
+        except Exception:
+            # A crashed browser may not answer; its process is gone or
+            # is killed along with the driver service
+            logger.debug("Error quitting browser", exc_info=True)
+
+    @staticmethod
+    def is_alive(driver) -> bool:
+        """
+        Health check without a WebDriver round trip: the driver service
+        process must still be running.
+        """
+        process = getattr(driver.service, "process", None)
+        return process is None or process.poll() is None
+
+    @staticmethod
+    def rss(driver):
+        """
+        Resident memory of the driver service and its browser, in bytes.
+        """
+        process = getattr(driver.service, "process", None)
+        if process is None:
+            return None
+        return process_tree_rss(process.pid)
@@ -0,0 +1,66 @@
+import sqlite3
+import time
+
+
+class CheckpointStore:
+    """
+    Persistent record of the movies whose data has been written to disk,
+    so an interrupted crawl can resume where it stopped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS completed ("
+            " url TEXT PRIMARY KEY,"
+            " position INTEGER,"
+            " completed_at REAL"
+            ")"
+        )
+        self.connection.commit()
+
+    def __len__(self) -> int:
+        (count,) = self.connection.execute(
+            "SELECT COUNT(*) FROM completed"
+        ).fetchone()
+        return count
+
+    def completed_urls(self) -> set:
+        """
+        Returns the URLs of all completed movies.
+        """
+        return {
+            url for (url,) in
+            self.connection.execute("SELECT url FROM completed")
+        }
+
+    def completed_positions(self) -> set:
+        """
+        Returns the chart positions of all completed movies.
+        """
+        return {
+            position for (position,) in
+            self.connection.execute("SELECT position FROM completed")
+        }
+
+    def mark_done(self, entries) -> None:
+        """
+        Records ``(url, position)`` pairs as completed in one transaction.
+        """
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO completed VALUES (?, ?, ?)",
+                [(url, position, now) for url, position in entries],
+            )
+
+    def clear(self) -> None:
+        """
+        Forgets all completed movies, so the next crawl starts over.
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM completed")
+
+    def close(self) -> None:
+        self.connection.close()
@@ -1,30 +1,92 @@
 from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from decouple import config
 
+# Requests the scraper never reads: images, media, fonts, ads and trackers
+DEFAULT_BLOCKED_URLS = [
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.mp4", "*.webm", "*.m3u8", "*.ts",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*google-analytics.com*", "*googletagmanager.com*",
+    "*googlesyndication.com*", "*doubleclick.net*",
+    "*amazon-adsystem.com*", "*adsrvr.org*", "*scorecardresearch.com*",
+    "*fls-na.amazon.com*", "*unagi.amazon.com*", "*cookielaw.org*",
+]
+
 
 class ChromeDriver:
     """
-    Singleton class to manage Chrome WebDriver instance.
-    Ensures only one instance of the WebDriver is created.
+    Factory for Chrome WebDriver instances.
+    Every call to ``create`` starts a new browser, so several of them can
+    run side by side in the browser pool.
+
+    By default the browser runs a lightweight profile: headless, small
+    window, no images, extensions or GPU, and requests to the URL
+    patterns in ``blocked_urls`` are dropped through the DevTools
+    protocol before they leave the browser.
     """
-    _instance = None
     chrome_driver_path = config("CHROME_DRIVER_PATH")
-    service = Service(chrome_driver_path)
 
-    def __new__(cls) -> webdriver:
+    def __init__(self, page_load_strategy: str = "normal",
+                 headless: bool = True, block_images: bool = True,
+                 blocked_urls=None, window_size: str = "1280,800"):
+        self.page_load_strategy = page_load_strategy
+        self.headless = headless
+        self.block_images = block_images
+        self.blocked_urls = [
+            pattern for pattern in (
+                DEFAULT_BLOCKED_URLS if blocked_urls is None else blocked_urls
+            ) if pattern
+        ]
+        self.window_size = window_size
+        self.driver = None
+
+    def options(self) -> Options:
+        """
+        Returns the Chrome options of the browser profile.
+        """
+        options = Options()
+        options.page_load_strategy = self.page_load_strategy
+        if self.headless:
+            options.add_argument("--headless=new")
+        if self.window_size:
+            options.add_argument(f"--window-size={self.window_size}")
+        for argument in (
+                "--disable-extensions",
+                "--disable-gpu",
+                "--disable-dev-shm-usage",
+                "--mute-audio",
+                "--no-first-run",
+                "--disable-background-networking",
+        ):
+            options.add_argument(argument)
+        if self.block_images:
+            options.add_argument("--blink-settings=imagesEnabled=false")
+            options.add_experimental_option("prefs", {
+                "profile.managed_default_content_settings.images": 2,
+            })
+        return options
+
+    def create(self) -> webdriver.Chrome:
         """
-        Creates and returns a single instance of the Chrome WebDriver.
+        Starts and returns a new Chrome WebDriver instance.
         """
-        if cls._instance is None:
-            cls._instance = super(ChromeDriver, cls).__new__(cls)
-            cls._instance.driver = webdriver.Chrome(service=cls.service)
-        return cls._instance.driver
+        service = Service(self.chrome_driver_path)
+        driver = webdriver.Chrome(service=service, options=self.options())
+        if self.blocked_urls:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd(
+                "Network.setBlockedURLs", {"urls": list(self.blocked_urls)}
+            )
+        return driver
 
-    def __enter__(self) -> webdriver:
+    def __enter__(self) -> webdriver.Chrome:
         """
-        Context manager entry method. Returns the WebDriver instance.
+        Context manager entry method. Starts and returns a WebDriver
+        instance.
         """
+        self.driver = self.create()
         return self.driver
 
     def __exit__(self, exc_type, exc_val, exc_tb) -> None:
@@ -0,0 +1,150 @@
+"""
+Columnar export of the crawl for analytics, as Parquet or Arrow IPC
+files:
+
+    movies.parquet   position, title, original_title, year, rating
+    credits.parquet  position, person, role ("director" or "cast"),
+                     billing (order within the role)
+    people.parquet   person, name
+
+``credits`` is the movie-person edge table; people are referred to by
+their key (the number of their IMDb ID). Needs pyarrow, which is
+optional: ``pip install pyarrow``.
+"""
+import logging
+import os
+
+from scrapy.exceptions import NotConfigured
+
+from movies import signals as movies_signals
+from movies.instrumentation import timings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# Record keys of the movie columns
+MOVIE_COLUMNS = {
+    "position": "Position in rating",
+    "title": "Title",
+    "original_title": "Original title",
+    "year": "Year",
+    "rating": "Rating",
+}
+
+# Record keys of the credit roles
+ROLES = {"director": "Director(s)", "cast": "Cast"}
+
+
+def movie_tables(records, people) -> dict:
+    """
+    Builds the movies, credits and people tables from movie records with
+    people given by key, read in a single pass.
+    """
+    movies = {column: [] for column in MOVIE_COLUMNS}
+    credits = {"position": [], "person": [], "role": [], "billing": []}
+    for record in records:
+        for column, key in MOVIE_COLUMNS.items():
+            movies[column].append(record.get(key))
+        for role, key in ROLES.items():
+            for billing, person in enumerate(record.get(key) or []):
+                credits["position"].append(record["Position in rating"])
+                credits["person"].append(person)
+                credits["role"].append(role)
+                credits["billing"].append(billing)
+
+    persons = sorted(set(credits["person"]))
+    return {
+        "movies": pyarrow.table({
+            "position": pyarrow.array(movies["position"], pyarrow.int32()),
+            "title": pyarrow.array(movies["title"], pyarrow.string()),
+            "original_title": pyarrow.array(
+                movies["original_title"], pyarrow.string()
+            ),
+            "year": pyarrow.array(movies["year"], pyarrow.int16()),
+            "rating": pyarrow.array(movies["rating"], pyarrow.float64()),
+        }),
+        "credits": pyarrow.table({
+            "position": pyarrow.array(credits["position"], pyarrow.int32()),
+            "person": pyarrow.array(credits["person"], pyarrow.int64()),
+            "role": pyarrow.array(
+                credits["role"], pyarrow.string()
+            ).dictionary_encode(),
+            "billing": pyarrow.array(credits["billing"], pyarrow.int16()),
+        }),
+        "people": pyarrow.table({
+            "person": pyarrow.array(persons, pyarrow.int64()),
+            "name": pyarrow.array(
+                people.names_of(persons), pyarrow.string()
+            ),
+        }),
+    }
+
+
+def write_tables(tables: dict, directory: str, file_format="parquet"):
+    """
+    Writes each table to ``<directory>/<name>.<format>`` and returns the
+    paths.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name, table in tables.items():
+        path = os.path.join(directory, name + FORMATS[file_format])
+        if file_format == "parquet":
+            pyarrow.parquet.write_table(table, path, compression="zstd")
+        else:
+            pyarrow.feather.write_feather(table, path, compression="zstd")
+        paths.append(path)
+    return paths
+
+
+class ColumnarExporter:
+    """
+    Scrapy extension writing the finalized movies, credits and people to
+    COLUMNAR_EXPORT_DIR in COLUMNAR_EXPORT_FORMAT ("parquet" or "arrow")
+    when the crawl ends. Disabled when the directory is not set.
+    """
+
+    def __init__(self, directory, file_format="parquet"):
+        self.directory = directory
+        self.file_format = file_format
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        directory = crawler.settings.get("COLUMNAR_EXPORT_DIR")
+        if not directory:
+            raise NotConfigured
+        if pyarrow is None:
+            logger.warning(
+                "COLUMNAR_EXPORT_DIR is set but pyarrow is not installed, "
+                "skipping the columnar export"
+            )
+            raise NotConfigured
+        file_format = crawler.settings.get("COLUMNAR_EXPORT_FORMAT", "parquet")
+        if file_format not in FORMATS:
+            raise ValueError(
+                f"Unknown COLUMNAR_EXPORT_FORMAT {file_format!r}, expected "
+                f"one of {tuple(FORMATS)}"
+            )
+        ext = cls(directory, file_format)
+        crawler.signals.connect(
+            ext.movies_finalized, signal=movies_signals.movies_finalized
+        )
+        return ext
+
+    def movies_finalized(self, records, spider):
+        with timings.stage("columnar/write"):
+            tables = movie_tables(records(named=False), spider.people)
+            paths = write_tables(tables, self.directory, self.file_format)
+        logger.info(
+            "Wrote %d movies and %d credits to %s",
+            tables["movies"].num_rows, tables["credits"].num_rows,
+            ", ".join(paths),
+        )
@@ -0,0 +1,112 @@
+import os
+from array import array
+from bisect import bisect_left
+from heapq import merge
+
+from scrapy.dupefilters import RFPDupeFilter
+
+from movies.extractors import title_id
+
+# Page types deduplicated by title ID instead of request fingerprint
+TITLE_PAGE_TYPES = ("title", "fullcredits")
+
+
+class CompactIdSet:
+    """
+    Exact set of non-negative integers below 2**32, stored as a sorted
+    array of 4 bytes per value. Recent additions are kept in a small set
+    and merged into the array in batches of ``merge_every``.
+    """
+
+    def __init__(self, values=(), merge_every=4096):
+        self.values = array("I", sorted(set(values)))
+        self.recent = set()
+        self.merge_every = merge_every
+
+    def __contains__(self, value) -> bool:
+        if value in self.recent:
+            return True
+        index = bisect_left(self.values, value)
+        return index < len(self.values) and self.values[index] == value
+
+    def __len__(self) -> int:
+        return len(self.values) + len(self.recent)
+
+    def add(self, value) -> bool:
+        """
+        Adds the value and tells whether it was already in the set.
+        """
+        if value in self:
+            return True
+        self.recent.add(value)
+        if len(self.recent) >= self.merge_every:
+            self.merge()
+        return False
+
+    def merge(self) -> None:
+        self.values = array("I", merge(self.values, sorted(self.recent)))
+        self.recent = set()
+
+    def tobytes(self) -> bytes:
+        self.merge()
+        return self.values.tobytes()
+
+    @classmethod
+    def frombytes(cls, data: bytes, **kwargs) -> "CompactIdSet":
+        id_set = cls(**kwargs)
+        id_set.values.frombytes(data)
+        return id_set
+
+
+class TitleDupeFilter(RFPDupeFilter):
+    """
+    Duplicate filter keeping the movie and cast pages it has seen as
+    numeric title IDs (``tt0111161`` -> 111161) in a CompactIdSet per
+    page type, about 4 bytes per title instead of a 40-character request
+    fingerprint. Other requests, such as chart pages, are filtered by
+    fingerprint as usual, and so are redirects: RedirectMiddleware
+    schedules them again for the title ID already seen.
+
+    With a JOBDIR the seen IDs are saved next to Scrapy's
+    ``requests.seen`` when the crawl stops and loaded when it resumes.
+    """
+
+    def __init__(self, path=None, debug=False, *, fingerprinter=None):
+        super().__init__(path, debug, fingerprinter=fingerprinter)
+        self.titles_dir = path
+        self.titles = {
+            page_type: self.load_titles(page_type)
+            for page_type in TITLE_PAGE_TYPES
+        }
+
+    def titles_path(self, page_type: str):
+        if not self.titles_dir:
+            return None
+        return os.path.join(self.titles_dir, f"titles-{page_type}.seen")
+
+    def load_titles(self, page_type: str) -> CompactIdSet:
+        path = self.titles_path(page_type)
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                return CompactIdSet.frombytes(f.read())
+        return CompactIdSet()
+
+    def request_seen(self, request) -> bool:
+        page_type = request.meta.get("page_type")
+        imdb_id = (
+            title_id(request.url)
+            if page_type in self.titles and
+            not request.meta.get("redirect_urls")
+            else None
+        )
+        if imdb_id is None:
+            return super().request_seen(request)
+        return self.titles[page_type].add(int(imdb_id[2:]))
+
+    def close(self, reason: str) -> None:
+        for page_type, titles in self.titles.items():
+            path = self.titles_path(page_type)
+            if path:
+                with open(path, "wb") as f:
+                    f.write(titles.tobytes())
+        super().close(reason)
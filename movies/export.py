@@ -0,0 +1,196 @@
+import logging
+import queue
+import threading
+import time
+
+from decouple import config
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import threads
+
+from movies import signals as movies_signals
+from movies.google_sheets import (
+    MAX_PAYLOAD_BYTES,
+    MOVIES_HEADERS,
+    MOVIES_WORKSHEET,
+    GoogleSheetsHandler,
+    movie_row,
+)
+from movies.instrumentation import timings
+from movies.items import MoviesItem
+from movies.pipelines import is_worker
+
+logger = logging.getLogger(__name__)
+
+
+class SheetsExporter:
+    """
+    Scrapy extension exporting the crawl to Google Sheets off the crawl's
+    critical path.
+
+    A background worker authenticates and opens the spreadsheet as soon
+    as the spider opens, then writes scraped movies to their rows in
+    batches while the crawl is still running. When the spider closes,
+    the worker runs the final sync (movies and actor analysis) and the
+    shutdown waits for it at most SHEETS_EXPORT_JOIN_TIMEOUT seconds.
+    """
+
+    def __init__(self, settings, sheets_handler_factory=None):
+        self.sync_mode = settings.get("GOOGLE_SHEETS_SYNC_MODE", "diff")
+        self.max_payload_bytes = settings.getint(
+            "GOOGLE_SHEETS_MAX_PAYLOAD_BYTES", MAX_PAYLOAD_BYTES
+        )
+        self.batch_size = settings.getint("SHEETS_EXPORT_BATCH_SIZE", 50)
+        self.flush_interval = settings.getfloat(
+            "SHEETS_EXPORT_FLUSH_INTERVAL", 30
+        )
+        self.join_timeout = settings.getfloat(
+            "SHEETS_EXPORT_JOIN_TIMEOUT", 300
+        )
+        self.sheets_handler_factory = (
+            sheets_handler_factory or self.create_sheets_handler
+        )
+        self.tasks = queue.Queue()
+        self.thread = None
+        self.connected = None  # False once connecting has failed
+        self.movie_records = None
+        self.actor_records = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("SHEETS_EXPORT_ENABLED", True):
+            raise NotConfigured
+        ext = cls(crawler.settings)
+        crawler.signals.connect(
+            ext.spider_opened, signal=signals.spider_opened
+        )
+        crawler.signals.connect(ext.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(
+            ext.movies_finalized, signal=movies_signals.movies_finalized
+        )
+        crawler.signals.connect(
+            ext.actors_finalized, signal=movies_signals.actors_finalized
+        )
+        crawler.signals.connect(
+            ext.spider_closed, signal=signals.spider_closed
+        )
+        return ext
+
+    def create_sheets_handler(self) -> GoogleSheetsHandler:
+        return GoogleSheetsHandler(
+            config("CREDENTIALS_FILE_PATH"),
+            config("GOOGLE_SHEET_ID"),
+            sync_mode=self.sync_mode,
+            max_payload_bytes=self.max_payload_bytes,
+        )
+
+    def spider_opened(self, spider):
+        if is_worker(spider):
+            return  # The coordinator of the sharded crawl exports
+        self.thread = threading.Thread(
+            target=self.run, name="sheets-exporter", daemon=True
+        )
+        self.thread.start()
+
+    def item_scraped(self, item, spider):
+        if (
+                self.sync_mode == "diff" and self.thread is not None and
+                self.connected is not False and isinstance(item, MoviesItem)
+        ):
+            record = item.to_record(spider.people)
+            # Row 1 holds the headers
+            self.tasks.put((record["Position in rating"] + 1,
+                            movie_row(record)))
+
+    def movies_finalized(self, records):
+        self.movie_records = records
+
+    def actors_finalized(self, actors):
+        self.actor_records = actors
+
+    def spider_closed(self, spider):
+        """
+        Queues the final sync and returns a Deferred firing once the
+        worker is done or the join timeout has passed.
+        """
+        if self.thread is None:
+            return None
+        self.tasks.put(None)
+        deferred = threads.deferToThread(self.thread.join, self.join_timeout)
+        deferred.addCallback(self.joined)
+        return deferred
+
+    def joined(self, _):
+        if self.thread.is_alive():
+            logger.warning(
+                "Google Sheets export still running after %s seconds, "
+                "giving up on it", self.join_timeout
+            )
+
+    def run(self) -> None:
+        """
+        Worker loop: connects, writes movie rows in batches, and runs the
+        final sync once the spider has closed.
+        """
+        try:
+            started = time.monotonic()
+            with timings.stage("sheets/connect"):
+                sheets_handler = self.sheets_handler_factory()
+            self.connected = True
+            logger.info(
+                "Connected to Google Sheets in %.2f s",
+                time.monotonic() - started
+            )
+        except Exception:
+            logger.exception("Could not connect to Google Sheets")
+            self.connected = False
+            return
+
+        rows, last_flush = [], time.monotonic()
+        while True:
+            try:
+                task = self.tasks.get(timeout=self.flush_interval)
+            except queue.Empty:
+                task = ()
+            if task is None:
+                # Rows still pending are written by the final sync
+                break
+            if task:
+                rows.append(task)
+            if rows and (
+                    len(rows) >= self.batch_size or
+                    time.monotonic() - last_flush >= self.flush_interval
+            ):
+                self.flush(sheets_handler, rows)
+                rows, last_flush = [], time.monotonic()
+
+        self.final_sync(sheets_handler)
+
+    @timings.timed("sheets/batch")
+    def flush(self, sheets_handler, rows) -> None:
+        try:
+            sheets_handler.update_rows(
+                MOVIES_WORKSHEET, rows, len(MOVIES_HEADERS)
+            )
+        except Exception:
+            # The final sync writes whatever is missing
+            logger.exception("Error writing movies batch to Google Sheets")
+
+    @timings.timed("sheets/final_sync")
+    def final_sync(self, sheets_handler) -> None:
+        if self.movie_records is None or self.actor_records is None:
+            logger.warning("No finalized data, skipping the final sync")
+            return
+        try:
+            logger.info("Uploading data to Google Sheets")
+            report = sheets_handler.save_data(
+                self.movie_records(), self.actor_records
+            )
+            logger.info(
+                "Data uploaded successfully: %d API calls, %d cells written "
+                "in the final sync, %d API calls in total",
+                report["api_calls"], report["cells_written"],
+                sheets_handler.api_calls,
+            )
+        except Exception:
+            logger.exception("Error uploading data to Google Sheets")
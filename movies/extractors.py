@@ -0,0 +1,230 @@
+"""
+Extraction of movie data from IMDb pages.
+
+The functions work on any Scrapy response or parsel selector, so the
+same code parses static HTML downloaded over plain HTTP and the DOM
+returned by the browser pool.
+"""
+import html
+import json
+import re
+
+TITLE_ID_RE = re.compile(r"tt\d+")
+NAME_ID_RE = re.compile(r"nm\d+")
+# "1. The Shawshank Redemption" in the rendered chart list
+RANK_PREFIX_RE = re.compile(r"^\d+\.\s*")
+REST_OF_CAST_LABEL = "Rest of cast listed alphabetically:"
+NEXT_PAGE_SELECTORS = (
+    'link[rel="next"]::attr(href)',
+    'a[rel="next"]::attr(href)',
+    "a.lister-page-next::attr(href)",
+    "a.next-page::attr(href)",
+)
+
+
+def text_of(selection) -> str:
+    """
+    Returns the whitespace-normalized text of the selected elements, the
+    way a browser renders it.
+    """
+    return " ".join(
+        " ".join(selector.xpath("string()").get().split())
+        for selector in selection
+    ).strip()
+
+
+def title_id(url: str):
+    """
+    Returns the IMDb title ID (``tt...``) contained in the url, or None.
+    """
+    match = TITLE_ID_RE.search(url or "")
+    return match.group(0) if match else None
+
+
+def name_id(url: str):
+    """
+    Returns the IMDb person ID (``nm...``) contained in the url, or None.
+    """
+    match = NAME_ID_RE.search(url or "")
+    return match.group(0) if match else None
+
+
+def person(link) -> tuple:
+    """
+    Returns ``(IMDb ID or None, name)`` of a link to a person's page.
+    """
+    return name_id(link.attrib.get("href")), text_of([link])
+
+
+def extract_chart(response) -> list:
+    """
+    Extracts the chart entries from a chart page as a list of dicts with
+    "position", "id", "url", "title" and "rating" (None when unknown)
+    keys.
+    Tries the embedded JSON-LD, then the Next.js page data, then the
+    rendered list. Returns an empty list when nothing is found.
+    """
+    for extract in (_chart_from_json_ld, _chart_from_next_data,
+                    _chart_from_list):
+        entries = extract(response)
+        if entries:
+            return entries
+    return []
+
+
+def _chart_entry(response, position, imdb_id, title, rating) -> dict:
+    return {
+        "position": position,
+        "id": imdb_id,
+        "url": response.urljoin(f"/title/{imdb_id}/"),
+        "title": title,
+        "rating": float(rating) if rating is not None else None,
+    }
+
+
+def _chart_from_json_ld(response) -> list:
+    for script in response.css(
+        'script[type="application/ld+json"]::text'
+    ).getall():
+        try:
+            data = json.loads(script)
+        except ValueError:
+            continue
+        if not isinstance(data, dict) or data.get("@type") != "ItemList":
+            continue
+
+        entries = []
+        for index, element in enumerate(data.get("itemListElement", [])):
+            item = element.get("item", element)
+            imdb_id = title_id(item.get("url"))
+            if not imdb_id:
+                continue
+            rating = (item.get("aggregateRating") or {}).get("ratingValue")
+            position = element.get("position") or index + 1
+            # IMDb escapes apostrophes in the names as HTML entities
+            title = html.unescape(item.get("name") or "")
+            entries.append(_chart_entry(
+                response, int(position), imdb_id, title, rating
+            ))
+        if entries:
+            return entries
+    return []
+
+
+def _chart_from_next_data(response) -> list:
+    script = response.css("script#__NEXT_DATA__::text").get()
+    if not script:
+        return []
+    try:
+        data = json.loads(script)
+    except ValueError:
+        return []
+
+    page_props = data.get("props", {}).get("pageProps", {})
+    page_data = page_props.get("pageData") or {}
+    edges = (page_data.get("chartTitles") or {}).get("edges", [])
+    entries = []
+    for index, edge in enumerate(edges):
+        node = edge.get("node") or {}
+        imdb_id = node.get("id")
+        if not imdb_id:
+            continue
+        rating = (node.get("ratingsSummary") or {}).get("aggregateRating")
+        position = edge.get("currentRank") or index + 1
+        title = (node.get("titleText") or {}).get("text", "")
+        entries.append(_chart_entry(
+            response, int(position), imdb_id, title, rating
+        ))
+    return entries
+
+
+def _chart_from_list(response) -> list:
+    entries = []
+    for index, movie in enumerate(response.css(".ipc-metadata-list li")):
+        imdb_id = title_id(
+            movie.css(".ipc-title-link-wrapper::attr(href)").get()
+        )
+        if not imdb_id:
+            continue
+        title = RANK_PREFIX_RE.sub(
+            "", text_of(movie.css(".ipc-title-link-wrapper h3"))
+        )
+        rating = text_of(movie.css(".ipc-rating-star--rating")) or None
+        entries.append(
+            _chart_entry(response, index + 1, imdb_id, title, rating)
+        )
+    return entries
+
+
+def extract_next_page(response):
+    """
+    Returns the absolute URL of the next page of a paginated chart or
+    list, or None on the last page.
+    """
+    for selector in NEXT_PAGE_SELECTORS:
+        href = response.css(selector).get()
+        if href:
+            return response.urljoin(href)
+    return None
+
+
+def extract_movie(response) -> dict:
+    """
+    Extracts the header of a movie page: position in the rating, title,
+    original title, rating, year and the URL of the full cast list.
+    When the page shows no original title, the title is used instead and
+    "orig_title_missing" is set. The position is None for movies outside
+    the Top 250.
+    """
+    rank = text_of(response.css(".sc-15ed0f38-1 > a"))
+    position = rank.split('#')[1].strip() if '#' in rank else None
+
+    title = text_of(
+        response.css('[data-testid="hero__pageTitle"] > .hero__primary-text')
+    )
+
+    orig_title = text_of(
+        response.css(".sc-ec65ba05-1")
+    ).replace("Original title: ", "")
+
+    rating = response.css(".sc-eb51e184-1::text").get()
+
+    year = text_of(response.css(".sc-ec65ba05-2 > li >.ipc-link")[:1])
+
+    cast_list_url = response.urljoin(
+        response.css(".sc-4cf2da2d-0 > li > a::attr(href)").get()
+    )
+
+    return {
+        "position": int(position) if position else None,
+        "title": title,
+        "orig_title": orig_title or title,
+        "orig_title_missing": not orig_title,
+        "rating": float(rating),
+        "year": int(year),
+        "cast_url": cast_list_url,
+    }
+
+
+def extract_cast(response) -> tuple:
+    """
+    Extracts the billed actors (up to the "Rest of cast" marker) and the
+    directors from a full credits page, as lists of ``(IMDb ID, name)``
+    tuples; the ID is None for a person without a profile link. The
+    selectors do not depend on the tbody elements browsers insert, so
+    static and rendered HTML give the same result.
+    """
+    actors = []
+    for row in response.css("table.cast_list tr"):
+        label = row.css("td.castlist_label")
+        if label and REST_OF_CAST_LABEL in text_of(label[:1]):
+            break
+        actor_name = row.css("td:nth-child(2) a")
+        if actor_name:
+            actors.append(person(actor_name[0]))
+
+    directors = [
+        person(link)
+        for link in response.css("#director + table tr > td.name > a")
+    ]
+    return actors, directors
@@ -0,0 +1,158 @@
+"""
+In-memory stand-in for the parts of the gspread client used by
+GoogleSheetsHandler, for running exports and benchmarks without a
+Google account. Every API method call is recorded in ``calls``.
+"""
+import re
+
+from gspread.utils import rowcol_to_a1
+
+RANGE_RE = re.compile(r"^'?(?P<title>.*?)'?(?:!(?P<cells>[A-Z0-9:]+))?$")
+
+
+class FakeWorksheet:
+    """
+    A worksheet holding its values as a list of rows.
+    """
+
+    def __init__(self, spreadsheet, sheet_id, title, row_count=1000,
+                 col_count=26):
+        self.spreadsheet = spreadsheet
+        self.id = sheet_id
+        self.title = title
+        self.row_count = row_count
+        self.col_count = col_count
+        self.rows = []
+
+    def clear(self):
+        self.spreadsheet.calls.append("clear")
+        self.rows = []
+
+    def append_row(self, values):
+        self.spreadsheet.calls.append("append_row")
+        self.rows.append(list(values))
+
+    def append_rows(self, values):
+        self.spreadsheet.calls.append("append_rows")
+        self.rows.extend(list(row) for row in values)
+        self.row_count = max(self.row_count, len(self.rows))
+
+    def set_cell(self, row, col, value):
+        if row > self.row_count:
+            raise ValueError(
+                f"Range exceeds grid limits. Max rows: {self.row_count}"
+            )
+        while len(self.rows) < row:
+            self.rows.append([])
+        cells = self.rows[row - 1]
+        while len(cells) < col:
+            cells.append("")
+        cells[col - 1] = value
+
+    def values(self) -> list:
+        """
+        Returns the values the way the API does: without trailing empty
+        cells and rows.
+        """
+        values = []
+        for row in self.rows:
+            row = list(row)
+            while row and row[-1] == "":
+                row.pop()
+            values.append(row)
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+
+class FakeSpreadsheet:
+    """
+    A spreadsheet with the "Movies Data" and "Actor Analysis" worksheets.
+    """
+
+    def __init__(self, key, titles=("Movies Data", "Actor Analysis")):
+        self.id = key
+        self.calls = []
+        self.worksheets = {
+            title: FakeWorksheet(self, sheet_id, title)
+            for sheet_id, title in enumerate(titles)
+        }
+
+    def worksheet(self, title):
+        self.calls.append("worksheet")
+        return self.worksheets[title]
+
+    def fetch_sheet_metadata(self, params=None):
+        self.calls.append("fetch_sheet_metadata")
+        return {
+            "sheets": [
+                {
+                    "properties": {
+                        "sheetId": worksheet.id,
+                        "title": worksheet.title,
+                        "gridProperties": {"rowCount": worksheet.row_count},
+                    }
+                }
+                for worksheet in self.worksheets.values()
+            ]
+        }
+
+    def values_batch_get(self, ranges, params=None):
+        self.calls.append("values_batch_get")
+        value_ranges = []
+        for range_name in ranges:
+            worksheet, _ = self._parse_range(range_name)
+            # Like the API, the range of a whole worksheet spans its grid
+            last_cell = rowcol_to_a1(worksheet.row_count, worksheet.col_count)
+            value_range = {"range": f"'{worksheet.title}'!A1:{last_cell}"}
+            values = worksheet.values()
+            if values:
+                value_range["values"] = values
+            value_ranges.append(value_range)
+        return {"valueRanges": value_ranges}
+
+    def batch_update(self, body):
+        self.calls.append("batch_update")
+        for request in body["requests"]:
+            if "appendDimension" in request:
+                dimension = request["appendDimension"]
+                self._worksheet(dimension["sheetId"]).row_count += \
+                    dimension["length"]
+                continue
+            update = request["updateCells"]
+            worksheet = self._worksheet(update["start"]["sheetId"])
+            first_row = update["start"]["rowIndex"] + 1
+            first_col = update["start"]["columnIndex"] + 1
+            for row_offset, row in enumerate(update["rows"]):
+                for col_offset, cell in enumerate(row["values"]):
+                    value = next(
+                        iter(cell.get("userEnteredValue", {}).values()), ""
+                    )
+                    worksheet.set_cell(
+                        first_row + row_offset, first_col + col_offset, value
+                    )
+        return {}
+
+    def _worksheet(self, sheet_id):
+        for worksheet in self.worksheets.values():
+            if worksheet.id == sheet_id:
+                return worksheet
+        raise KeyError(sheet_id)
+
+    def _parse_range(self, range_name):
+        match = RANGE_RE.match(range_name)
+        return self.worksheets[match["title"]], match["cells"]
+
+
+class FakeClient:
+    """
+    Client whose open_by_key returns the same FakeSpreadsheet for a key.
+    """
+
+    def __init__(self):
+        self.spreadsheets = {}
+
+    def open_by_key(self, key):
+        if key not in self.spreadsheets:
+            self.spreadsheets[key] = FakeSpreadsheet(key)
+        return self.spreadsheets[key]
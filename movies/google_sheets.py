@@ -1,30 +1,185 @@
+import itertools
+import os
+
 import gspread
+from gspread.utils import absolute_range_name, a1_range_to_grid_range
 from oauth2client.service_account import ServiceAccountCredentials
 import json
 
+MOVIES_WORKSHEET = "Movies Data"
+MOVIES_HEADERS = [
+    "Position in rating",
+    "Title",
+    "Original title",
+    "Year",
+    "Rating",
+    "Director(s)",
+    "Cast",
+]
+ACTORS_WORKSHEET = "Actor Analysis"
+ACTORS_HEADERS = ["Actor", "Movies Count", "Average Rating", "Movies"]
+
+# Google recommends keeping request payloads under 2 MB
+MAX_PAYLOAD_BYTES = 2_000_000
+
+
+def load_records(source):
+    """
+    Returns the records of a JSON file when given its path, or the
+    records iterable itself.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return source
+
+
+def movie_row(movie) -> list:
+    """
+    Converts a movie record to a row of the movies worksheet.
+    """
+    return [
+        movie.get("Position in rating", ""),
+        movie.get("Title", ""),
+        movie.get("Original title", ""),
+        movie.get("Year", ""),
+        movie.get("Rating", ""),
+        ", ".join(movie.get("Director(s)", [])),
+        ", ".join(movie.get("Cast", [])),
+    ]
+
+
+def actor_row(actor_data) -> list:
+    """
+    Converts an actor analysis record to a row of the actors worksheet.
+    """
+    return [
+        actor_data.get("Actor", ""),
+        actor_data.get("Movies Count", ""),
+        actor_data.get("Average Rating", ""),
+        ", ".join(actor_data.get("Movies", [])),
+    ]
+
+
+def payload_size(row) -> int:
+    """
+    Approximate size of a row in a JSON request payload.
+    """
+    return len(json.dumps(row, ensure_ascii=False)) + 1
+
+
+def cell_data(value) -> dict:
+    """
+    Converts a value to the cell data of a batch update; an empty value
+    clears the cell.
+    """
+    if value is None or value == "":
+        return {}
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, (int, float)):
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+
+def row_data(row) -> dict:
+    """
+    Converts a row of values to the row data of a batch update.
+    """
+    return {"values": [cell_data(value) for value in row]}
+
+
+def update_cells(sheet_id, first_row, rows) -> dict:
+    """
+    Batch update request writing rows of row data from ``first_row``,
+    row numbers starting at 1, in the first column onwards.
+    """
+    return {
+        "updateCells": {
+            "start": {
+                "sheetId": sheet_id,
+                "rowIndex": first_row - 1,
+                "columnIndex": 0,
+            },
+            "rows": rows,
+            "fields": "userEnteredValue",
+        }
+    }
+
+
+def grid_rows(range_name) -> int:
+    """
+    Returns the last row of an A1 range such as "'Movies Data'!A1:Z1000".
+    """
+    cells = range_name.rsplit("!", 1)[-1]
+    return a1_range_to_grid_range(cells).get("endRowIndex", 0)
+
+
+def normalize_row(row, width) -> list:
+    """
+    Pads or cuts a row to the given width and makes numbers comparable
+    whether they were read back from the sheet as ints or floats.
+    """
+    row = (list(row) + [""] * width)[:width]
+    return [
+        float(value)
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+        else value
+        for value in row
+    ]
+
 
 class GoogleSheetsHandler:
     """
     Handles interactions with Google Sheets, including saving movie data
     and actor analysis.
+
+    Data can be given as JSON file paths or as iterables of records; rows
+    are streamed to the sheet in requests of at most
+    ``max_payload_bytes``. In "diff" sync mode (the default) a sync is
+    one read and one write: the current sheet values are read with one
+    values batch get, which also gives the grid sizes, and only the rows
+    that changed are written back in a single batch update, with the
+    rows the grid lacks, unless the payload limit splits it. The sheet
+    ids are fetched when the handler connects. "rewrite" mode clears and
+    rewrites the worksheets. The number of API calls and cells written
+    is kept in ``api_calls`` and ``cells_written``.
     """
 
-    def __init__(self, creds_file, spreadsheet_id):
+    sync_modes = ("diff", "rewrite")
+
+    def __init__(self, creds_file, spreadsheet_id, sync_mode="diff",
+                 client=None, max_payload_bytes=MAX_PAYLOAD_BYTES):
         """
         Initializes Google Sheets handler with provided credentials and
-        spreadsheet ID.
+        spreadsheet ID. A ready gspread-compatible client can be passed
+        instead of credentials.
         """
+        if sync_mode not in self.sync_modes:
+            raise ValueError(
+                f"Unknown sync mode {sync_mode!r}, "
+                f"expected one of {self.sync_modes}"
+            )
+        self.sync_mode = sync_mode
+        self.max_payload_bytes = max_payload_bytes
+        self.api_calls = 0
+        self.cells_written = 0
+
         self.scope = [
             "https://spreadsheets.google.com/feeds",
             "https://www.googleapis.com/auth/spreadsheets",
             "https://www.googleapis.com/auth/drive.file",
             "https://www.googleapis.com/auth/drive",
         ]
-        self.creds = ServiceAccountCredentials.from_json_keyfile_name(
-            creds_file, self.scope
-        )
-        self.client = gspread.authorize(self.creds)
+        if client is None:
+            self.creds = ServiceAccountCredentials.from_json_keyfile_name(
+                creds_file, self.scope
+            )
+            client = gspread.authorize(self.creds)
+        self.client = client
         self.sheet = self.client.open_by_key(spreadsheet_id)
+        # Sheet ids and row counts; syncs refresh the row counts
+        self.grid = self.grid_sizes()
 
     def clear_and_reset_sheet(self, worksheet_name, headers):
         """
@@ -33,65 +188,244 @@ class GoogleSheetsHandler:
         worksheet = self.sheet.worksheet(worksheet_name)
         worksheet.clear()
         worksheet.append_row(headers)
+        self.api_calls += 3
+        self.cells_written += len(headers)
+        return worksheet
 
-    def save_movies_data(self, movies_file_path):
+    def rewrite_sheet(self, worksheet_name, headers, rows):
         """
-        Saves movie data from a JSON file to Google Sheets.
+        Clears the worksheet and appends the headers and rows to it in
+        payload-sized chunks.
         """
-        worksheet_name = "Movies Data"
-        headers = [
-            "Position in rating",
-            "Title",
-            "Original title",
-            "Year",
-            "Rating",
-            "Director(s)",
-            "Cast",
-        ]
-        self.clear_and_reset_sheet(worksheet_name, headers)
+        worksheet = self.clear_and_reset_sheet(worksheet_name, headers)
 
-        worksheet = self.sheet.worksheet(worksheet_name)
+        for chunk in self.chunks(rows):
+            worksheet.append_rows(chunk)
+            self.api_calls += 1
+            self.cells_written += sum(len(row) for row in chunk)
+
+    def chunks(self, rows):
+        """
+        Groups rows into lists whose payload stays under the limit.
+        """
+        chunk, size = [], 0
+        for row in rows:
+            row_size = payload_size(row)
+            if chunk and size + row_size > self.max_payload_bytes:
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(row)
+            size += row_size
+        if chunk:
+            yield chunk
+
+    def save_movies_data(self, movies):
+        """
+        Saves movie data to Google Sheets, from a JSON file path or an
+        iterable of movie records.
+        """
+        rows = (movie_row(movie) for movie in load_records(movies))
+        return self.save_tables({MOVIES_WORKSHEET: (MOVIES_HEADERS, rows)})
 
-        with open(movies_file_path, "r", encoding="utf-8") as f:
-            movies_data = json.load(f)
+    def save_actor_analysis(self, actors):
+        """
+        Saves actor analysis data to Google Sheets, from a JSON file path
+        or an iterable of actor records.
+        """
+        rows = (actor_row(actor_data) for actor_data in load_records(actors))
+        return self.save_tables({ACTORS_WORKSHEET: (ACTORS_HEADERS, rows)})
+
+    def save_data(self, movies, actors):
+        """
+        Saves movie data and actor analysis, each given as a JSON file
+        path or an iterable of records, in one sync of the spreadsheet.
+        """
+        return self.save_tables({
+            MOVIES_WORKSHEET: (
+                MOVIES_HEADERS,
+                (movie_row(movie) for movie in load_records(movies)),
+            ),
+            ACTORS_WORKSHEET: (
+                ACTORS_HEADERS,
+                (actor_row(actor) for actor in load_records(actors)),
+            ),
+        })
 
-        rows = []
-        for movie in movies_data:
-            row = [
-                movie.get("Position in rating", ""),
-                movie.get("Title", ""),
-                movie.get("Original title", ""),
-                movie.get("Year", ""),
-                movie.get("Rating", ""),
-                ", ".join(movie.get("Director(s)", [])),
-                ", ".join(movie.get("Cast", [])),
-            ]
-            rows.append(row)
+    def save_tables(self, tables) -> dict:
+        """
+        Writes ``{worksheet name: (headers, rows)}`` to the spreadsheet
+        using the handler's sync mode and returns a report of the API
+        calls and cells written. Rows can be any iterable, including a
+        generator.
+        """
+        api_calls, cells_written = self.api_calls, self.cells_written
+        if self.sync_mode == "diff":
+            self.sync(tables)
+        else:
+            for worksheet_name, (headers, rows) in tables.items():
+                self.rewrite_sheet(worksheet_name, headers, rows)
 
-        if rows:
-            worksheet.append_rows(rows)
+        return {
+            "api_calls": self.api_calls - api_calls,
+            "cells_written": self.cells_written - cells_written,
+        }
 
-    def save_actor_analysis(self, actors_file_path):
+    def sync(self, tables) -> None:
         """
-        Saves actor analysis data from a JSON file to Google Sheets.
+        Reads the current values of all worksheets in one call and writes
+        the changed row ranges, with the rows the grid lacks, in one
+        batch update, or as few as the payload limit allows. Rows left
+        over from a longer previous dataset are blanked.
         """
-        worksheet_name = "Actor Analysis"
-        headers = ["Actor", "Movies Count", "Average Rating", "Movies"]
-        self.clear_and_reset_sheet(worksheet_name, headers)
+        names = list(tables)
+        current = self.sheet.values_batch_get(
+            [absolute_range_name(name) for name in names],
+            params={"valueRenderOption": "UNFORMATTED_VALUE"},
+        )
+        self.api_calls += 1
 
-        with open(actors_file_path, "r", encoding="utf-8") as f:
-            actors = json.load(f)
+        batch, batch_size, last_rows = [], 0, {}
+        for name, value_range in zip(names, current["valueRanges"]):
+            # The range read back spans the whole grid of the worksheet
+            sheet_id, _ = self.grid[name]
+            self.grid[name] = (sheet_id, grid_rows(value_range["range"]))
+            headers, rows = tables[name]
+            for first_row, row_data, size in self.diff_ranges(
+                    value_range.get("values", []),
+                    itertools.chain([headers], rows), len(headers),
+            ):
+                if batch and batch_size + size > self.max_payload_bytes:
+                    self.write_batch(batch, last_rows)
+                    batch, batch_size, last_rows = [], 0, {}
+                batch.append(update_cells(sheet_id, first_row, row_data))
+                batch_size += size
+                last_rows[name] = first_row + len(row_data) - 1
 
-        worksheet = self.sheet.worksheet(worksheet_name)
-        rows = []
-        for actor_data in actors:
-            row = [
-                actor_data.get("Actor", ""),
-                actor_data.get("Movies Count", ""),
-                actor_data.get("Average Rating", ""),
-                ", ".join(actor_data.get("Movies", [])),
-            ]
-            rows.append(row)
-
-        if rows:
-            worksheet.append_rows(rows)
+        if batch:
+            self.write_batch(batch, last_rows)
+
+    def update_rows(self, worksheet_name, rows, width) -> None:
+        """
+        Writes ``(row number, values)`` pairs, row numbers starting at 1,
+        without reading the sheet first. Consecutive rows are sent as one
+        range and all ranges in as few batch updates as the payload limit
+        allows.
+        """
+        sheet_id, _ = self.grid[worksheet_name]
+        blank = [""] * width
+        batch, batch_size, run = [], 0, []
+
+        def run_range():
+            return update_cells(
+                sheet_id, run[0][0], [row_data for _, row_data in run]
+            )
+
+        for row_number, values in sorted(rows, key=lambda row: row[0]):
+            values = row_data((list(values) + blank)[:width])
+            size = payload_size(values)
+            if run and (
+                    run[-1][0] + 1 != row_number or
+                    batch_size + size > self.max_payload_bytes
+            ):
+                batch.append(run_range())
+                last_row = run[-1][0]
+                run = []
+                if batch_size + size > self.max_payload_bytes:
+                    self.write_batch(batch, {worksheet_name: last_row})
+                    batch, batch_size = [], 0
+            run.append((row_number, values))
+            batch_size += size
+
+        if run:
+            batch.append(run_range())
+            self.write_batch(batch, {worksheet_name: run[-1][0]})
+
+    def write_batch(self, requests, last_rows) -> None:
+        """
+        Sends one batch update with the given cell updates, preceded by
+        the grid rows needed by the worksheets they would overflow.
+        """
+        grow_requests = []
+        for name, last_row in last_rows.items():
+            sheet_id, row_count = self.grid[name]
+            if last_row > row_count:
+                grow_requests.append({
+                    "appendDimension": {
+                        "sheetId": sheet_id,
+                        "dimension": "ROWS",
+                        "length": last_row - row_count,
+                    }
+                })
+                self.grid[name] = (sheet_id, last_row)
+
+        self.sheet.batch_update({"requests": grow_requests + requests})
+        self.api_calls += 1
+        self.cells_written += sum(
+            len(row["values"])
+            for request in requests
+            for row in request["updateCells"]["rows"]
+        )
+
+    def grid_sizes(self) -> dict:
+        """
+        Returns ``{worksheet name: (sheet id, row count)}``.
+        """
+        metadata = self.sheet.fetch_sheet_metadata()
+        self.api_calls += 1
+        return {
+            sheet["properties"]["title"]: (
+                sheet["properties"]["sheetId"],
+                sheet["properties"]["gridProperties"]["rowCount"],
+            )
+            for sheet in metadata["sheets"]
+        }
+
+    def diff_ranges(self, current_values, new_values, width):
+        """
+        Compares the rows of a worksheet with the new ones, consumed one
+        at a time, and yields ``(first row number, row data, payload
+        size)`` for each run of consecutive changed rows. Runs are split
+        to keep within the payload limit.
+        """
+        blank = [""] * width
+        blank_data = row_data(blank)
+        run_start, run_values, run_size = None, [], 0
+
+        def run_range():
+            return run_start + 1, run_values, run_size
+
+        index = -1
+        for index, row in enumerate(new_values):
+            row = (list(row) + blank)[:width]
+            current_row = (
+                current_values[index]
+                if index < len(current_values) else blank
+            )
+            if normalize_row(row, width) != normalize_row(current_row, width):
+                if run_start is None:
+                    run_start = index
+                run_values.append(row_data(row))
+                run_size += payload_size(run_values[-1])
+                if run_size >= self.max_payload_bytes:
+                    yield run_range()
+                    run_start, run_values, run_size = None, [], 0
+            elif run_start is not None:
+                yield run_range()
+                run_start, run_values, run_size = None, [], 0
+
+        # Blank the rows left over from a longer previous dataset
+        for index in range(index + 1, len(current_values)):
+            if normalize_row(current_values[index], width) == blank:
+                continue
+            if run_start is None or run_start + len(run_values) != index:
+                if run_start is not None:
+                    yield run_range()
+                run_start, run_values, run_size = index, [], 0
+            run_values.append(blank_data)
+            run_size += payload_size(blank_data)
+            if run_size >= self.max_payload_bytes:
+                yield run_range()
+                run_start, run_values, run_size = None, [], 0
+
+        if run_start is not None:
+            yield run_range()
@@ -0,0 +1,302 @@
+"""
+Per-stage timings and counters for the crawl's hot path.
+
+Code on the hot path reports to the shared ``timings`` registry:
+
+    with timings.stage("browser/get"):
+        driver.get(url)
+
+    @timings.timed("sheets/final_sync")
+    def final_sync(...):
+        ...
+
+    timings.incr("timeouts/title")
+
+The registry is disabled unless the StageMetrics extension is enabled
+(METRICS_ENABLED); when disabled, ``stage`` returns a shared no-op
+context manager and ``incr`` returns at once.
+"""
+import contextlib
+import functools
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+logger = logging.getLogger(__name__)
+
+NO_STAGE = contextlib.nullcontext()
+
+# Scrapy stats reported next to the stage timings
+CRAWL_STATS = {
+    "pages": "response_received_count",
+    "retries": "retry/count",
+    "bytes": "downloader/response_bytes",
+    "items": "item_scraped_count",
+}
+
+
+class Stage:
+    """
+    Context manager timing one pass through a stage.
+    """
+
+    __slots__ = ("timings", "name", "started")
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.timings.record(self.name, time.perf_counter() - self.started)
+
+
+class StageTimings:
+    """
+    Thread-safe registry of stage durations (count, total and maximum
+    seconds) and event counters.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.stages = {}  # name -> [count, total seconds, max seconds]
+        self.counters = {}
+
+    def stage(self, name: str):
+        """
+        Returns a context manager recording the time spent in its block
+        under the given stage name.
+        """
+        if not self.enabled:
+            return NO_STAGE
+        return Stage(self, name)
+
+    def timed(self, name: str):
+        """
+        Decorator recording every call of the function as the stage.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, name: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                self.stages[name] = [1, seconds, seconds]
+            else:
+                stage[0] += 1
+                stage[1] += seconds
+                if seconds > stage[2]:
+                    stage[2] = seconds
+
+    def incr(self, name: str, value: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self) -> None:
+        with self.lock:
+            self.stages = {}
+            self.counters = {}
+
+    def snapshot(self) -> dict:
+        """
+        Returns the stages and counters recorded so far.
+        """
+        with self.lock:
+            stages = {name: list(stage) for name, stage in self.stages.items()}
+            counters = dict(self.counters)
+        return {
+            "stages": {
+                name: {
+                    "count": count,
+                    "total_s": total,
+                    "mean_s": total / count,
+                    "max_s": longest,
+                }
+                for name, (count, total, longest) in sorted(stages.items())
+            },
+            "counters": dict(sorted(counters.items())),
+        }
+
+
+timings = StageTimings()
+
+
+def summary_table(snapshot) -> str:
+    """
+    Formats a snapshot, extended with the crawl counters, as a text table.
+    """
+    lines = [
+        f"{'stage':<28}{'count':>8}{'total s':>11}{'mean ms':>11}"
+        f"{'max ms':>11}"
+    ]
+    for name, stage in snapshot["stages"].items():
+        lines.append(
+            f"{name:<28}{stage['count']:>8}{stage['total_s']:>11.2f}"
+            f"{stage['mean_s'] * 1000:>11.1f}{stage['max_s'] * 1000:>11.1f}"
+        )
+    counters = {**snapshot.get("crawl", {}), **snapshot["counters"]}
+    for name, value in counters.items():
+        lines.append(f"{name:<28}{value:>8}")
+    return "\n".join(lines)
+
+
+def prometheus_text(snapshot) -> str:
+    """
+    Formats a snapshot in the Prometheus text exposition format.
+    """
+    lines = [
+        "# TYPE top250_stage_seconds summary",
+    ]
+    for name, stage in snapshot["stages"].items():
+        lines.append(
+            f'top250_stage_seconds_count{{stage="{name}"}} {stage["count"]}'
+        )
+        lines.append(
+            f'top250_stage_seconds_sum{{stage="{name}"}} {stage["total_s"]}'
+        )
+    lines.append("# TYPE top250_stage_seconds_max gauge")
+    for name, stage in snapshot["stages"].items():
+        lines.append(
+            f'top250_stage_seconds_max{{stage="{name}"}} {stage["max_s"]}'
+        )
+    lines.append("# TYPE top250_events_total counter")
+    for name, value in snapshot["counters"].items():
+        lines.append(f'top250_events_total{{event="{name}"}} {value}')
+    lines.append("# TYPE top250_crawl gauge")
+    for name, value in snapshot.get("crawl", {}).items():
+        lines.append(f'top250_crawl{{stat="{name}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Serves the current metrics at /metrics.
+    """
+
+    def __init__(self, *args, metrics, **kwargs):
+        self.metrics = metrics
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text(self.metrics.snapshot()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StageMetrics:
+    """
+    Scrapy extension enabling the ``timings`` registry for the crawl.
+
+    Times the download of every page per page type, logs a summary table
+    of all stages and counters when the spider closes, and optionally
+    writes them to METRICS_JSON_PATH and serves them in the Prometheus
+    text format on METRICS_PROMETHEUS_PORT while the crawl runs.
+    Overhead is negligible when it is disabled (METRICS_ENABLED).
+    """
+
+    def __init__(self, stats, json_path=None, prometheus_port=None):
+        self.stats = stats
+        self.json_path = json_path
+        self.prometheus_port = prometheus_port
+        self.httpd = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("METRICS_ENABLED", True):
+            raise NotConfigured
+        port = crawler.settings.get("METRICS_PROMETHEUS_PORT")
+        ext = cls(
+            crawler.stats,
+            json_path=crawler.settings.get("METRICS_JSON_PATH"),
+            prometheus_port=int(port) if port else None,
+        )
+        crawler.signals.connect(
+            ext.spider_opened, signal=signals.spider_opened
+        )
+        crawler.signals.connect(
+            ext.response_received, signal=signals.response_received
+        )
+        # Fired once the spider_closed handlers, such as the final Google
+        # Sheets sync, are done, so their stages are included
+        crawler.signals.connect(
+            ext.engine_stopped, signal=signals.engine_stopped
+        )
+        return ext
+
+    def snapshot(self) -> dict:
+        """
+        Returns the stage timings and counters with the crawl counters
+        from the Scrapy stats.
+        """
+        snapshot = timings.snapshot()
+        snapshot["crawl"] = {
+            name: self.stats.get_value(key, 0)
+            for name, key in CRAWL_STATS.items()
+        }
+        return snapshot
+
+    def spider_opened(self, spider):
+        timings.reset()
+        timings.enabled = True
+        if self.prometheus_port:
+            handler = functools.partial(MetricsHandler, metrics=self)
+            self.httpd = ThreadingHTTPServer(
+                ("", self.prometheus_port), handler
+            )
+            self.httpd.daemon_threads = True
+            threading.Thread(
+                target=self.httpd.serve_forever, name="metrics", daemon=True
+            ).start()
+            logger.info(
+                "Serving metrics on port %d at /metrics", self.prometheus_port
+            )
+
+    def response_received(self, response, request, spider):
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            timings.record(
+                f"download/{request.meta.get('page_type', 'other')}", latency
+            )
+
+    def engine_stopped(self):
+        snapshot = self.snapshot()
+        timings.enabled = False
+        logger.info("Stage timings:\n%s", summary_table(snapshot))
+
+        if self.json_path:
+            with open(self.json_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, indent=4)
+
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
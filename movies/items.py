@@ -5,8 +5,81 @@
 
 import scrapy
 
+from movies.extractors import title_id
+
 
 class MoviesItem(scrapy.Item):
-    # define the fields for your item here like:
-    # name = scrapy.Field()
-    pass
+    """
+    A movie from the chart with its directors and billed cast. Each field
+    carries the key it is exported under in movies.json. Directors and
+    cast are lists of person keys of the spider's PersonTable.
+    """
+    position = scrapy.Field(export_name="Position in rating")
+    title = scrapy.Field(export_name="Title")
+    original_title = scrapy.Field(export_name="Original title")
+    year = scrapy.Field(export_name="Year")
+    rating = scrapy.Field(export_name="Rating")
+    directors = scrapy.Field(export_name="Director(s)")
+    cast = scrapy.Field(export_name="Cast")
+    # URL of the movie page, kept for the crawl checkpoint, not exported
+    url = scrapy.Field()
+
+    # Order of the keys in an exported movie record
+    export_order = (
+        "position", "title", "original_title", "year", "rating",
+        "directors", "cast",
+    )
+
+    # Fields holding person keys
+    people_fields = ("directors", "cast")
+
+    # Record key of the IMDb title ID, in records with people by key
+    id_key = "IMDb ID"
+
+    def to_record(self, people=None) -> dict:
+        """
+        Returns the movie as a record with the exported key names. People
+        are given by key, or by name when a PersonTable is passed. Records
+        with people by key, as in the movies JSON lines file, also carry
+        the IMDb title ID, which delta runs match chart entries by.
+        """
+        record = {
+            self.fields[name]["export_name"]: (
+                people.names_of(self.get(name) or [])
+                if people is not None and name in self.people_fields
+                else self.get(name)
+            )
+            for name in self.export_order
+        }
+        if people is None:
+            record[self.id_key] = title_id(self.get("url"))
+        return record
+
+    @classmethod
+    def from_record(cls, record: dict, **fields) -> "MoviesItem":
+        """
+        Builds an item from an exported record, overriding the given
+        fields.
+        """
+        return cls({
+            **{
+                name: record[cls.fields[name]["export_name"]]
+                for name in cls.export_order
+            },
+            **fields,
+        })
+
+    @classmethod
+    def named_record(cls, record: dict, people) -> dict:
+        """
+        Returns a copy of a record with person keys replaced by names, as
+        exported, without the IMDb title ID.
+        """
+        record = dict(record)
+        record.pop(cls.id_key, None)
+        for name in cls.people_fields:
+            export_name = cls.fields[name]["export_name"]
+            record[export_name] = people.names_of(
+                record.get(export_name) or []
+            )
+        return record
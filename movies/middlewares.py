@@ -3,11 +3,24 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import itertools
+import time
+
 from scrapy import signals
+from scrapy.downloadermiddlewares.retry import get_retry_request
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse
+from scrapy.utils.httpobj import urlparse_cached
+from selenium.common import TimeoutException, WebDriverException
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
+from movies.adaptive_wait import AdaptiveTimeouts
+from movies.browser_pool import BrowserPool
+from movies.chrome_driver import ChromeDriver
+from movies.throttle import AIMDThrottle, ThrottleGate
+
 
 class MoviesSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -101,3 +114,420 @@ class MoviesDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class BrowserRenderMiddleware:
+    """
+    Renders requests in a pool of browsers running off the reactor
+    thread and returns the resulting DOM as the response, so spider
+    callbacks can parse it with regular selectors.
+
+    Request meta keys:
+    - render: True to load the page in a browser, False to let Scrapy
+      download it over plain HTTP (BROWSER_RENDER_DEFAULT by default).
+    - wait_for: CSS selector, or list of selectors, that must be present
+      before the DOM is taken.
+    - wait_timeout: seconds to wait for it (BROWSER_WAIT_TIMEOUT by default)
+      until enough pages of the same page_type have been rendered to learn
+      the timeout from them (see AdaptiveTimeouts).
+
+    A render that times out is retried with a doubled timeout, at most
+    BROWSER_TIMEOUT_RETRIES times and with at most BROWSER_RETRY_QUEUE_SIZE
+    retries in flight; beyond that the TimeoutException reaches the
+    request's errback.
+
+    When the browser crashes (any other WebDriverException) the pool
+    discards it and the request goes back to the scheduler, at most
+    BROWSER_CRASH_RETRIES times, to be rendered by a fresh browser.
+    Browsers are also recycled after BROWSER_MAX_PAGES pages or above
+    BROWSER_MAX_RSS_MB of memory (see BrowserPool).
+    """
+
+    def __init__(self, pool_size, wait_timeout, render_default=True,
+                 driver_factory=None, timeouts=None,
+                 timeout_retries=2, retry_queue_size=8, stats=None,
+                 max_pages=0, max_rss_mb=0, crash_retries=2):
+        self.pool = BrowserPool(
+            pool_size, driver_factory, max_pages=max_pages,
+            max_rss_mb=max_rss_mb,
+        )
+        self.crash_retries = crash_retries
+        self.wait_timeout = wait_timeout
+        self.render_default = render_default
+        self.timeouts = timeouts or AdaptiveTimeouts()
+        self.timeout_retries = timeout_retries
+        self.retry_queue_size = retry_queue_size
+        self.pending_retries = 0
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        s = cls(
+            pool_size=settings.getint("BROWSER_POOL_SIZE", 4),
+            wait_timeout=settings.getfloat("BROWSER_WAIT_TIMEOUT", 10),
+            render_default=settings.getbool("BROWSER_RENDER_DEFAULT", True),
+            driver_factory=ChromeDriver(
+                page_load_strategy=settings.get(
+                    "BROWSER_PAGE_LOAD_STRATEGY", "eager"
+                ),
+                headless=settings.getbool("BROWSER_HEADLESS", True),
+                block_images=settings.getbool("BROWSER_BLOCK_IMAGES", True),
+                blocked_urls=(
+                    settings.getlist("BROWSER_BLOCKED_URLS")
+                    if "BROWSER_BLOCKED_URLS" in settings else None
+                ),
+                window_size=settings.get("BROWSER_WINDOW_SIZE", "1280,800"),
+            ),
+            timeouts=AdaptiveTimeouts(
+                min_timeout=settings.getfloat("BROWSER_WAIT_MIN_TIMEOUT", 1),
+                max_timeout=settings.getfloat("BROWSER_WAIT_MAX_TIMEOUT", 30),
+                margin=settings.getfloat("BROWSER_WAIT_MARGIN", 2),
+            ),
+            timeout_retries=settings.getint("BROWSER_TIMEOUT_RETRIES", 2),
+            retry_queue_size=settings.getint("BROWSER_RETRY_QUEUE_SIZE", 8),
+            stats=crawler.stats,
+            max_pages=settings.getint("BROWSER_MAX_PAGES", 0),
+            max_rss_mb=settings.getfloat("BROWSER_MAX_RSS_MB", 0),
+            crash_retries=settings.getint("BROWSER_CRASH_RETRIES", 2),
+        )
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def process_request(self, request, spider):
+        if not request.meta.get("render", self.render_default):
+            return None
+        request.meta["render_started"] = time.monotonic()
+        timeout = self.timeouts.timeout(
+            request.meta.get("page_type", "other"),
+            request.meta.get("wait_timeout", self.wait_timeout),
+        )
+        return self.render(request, spider, timeout)
+
+    def render(self, request, spider, timeout, attempt=0):
+        deferred = self.pool.render(
+            request.url,
+            wait_for=request.meta.get("wait_for"),
+            timeout=timeout,
+        )
+        deferred.addCallbacks(
+            self.build_response, self.retry_timeout,
+            callbackArgs=(request,),
+            errbackArgs=(request, spider, timeout, attempt),
+        )
+        deferred.addErrback(self.requeue_crashed, request, spider)
+        return deferred
+
+    def requeue_crashed(self, failure, request, spider):
+        """
+        Sends a request whose browser crashed back to the scheduler.
+        """
+        if failure.check(TimeoutException) or \
+                not failure.check(WebDriverException):
+            return failure
+        retry_request = get_retry_request(
+            request,
+            spider=spider,
+            reason="browser crashed",
+            max_retry_times=self.crash_retries,
+            stats_base_key="browser_crash_retry",
+        )
+        return failure if retry_request is None else retry_request
+
+    def retry_timeout(self, failure, request, spider, timeout, attempt):
+        """
+        Renders a request that timed out again with a longer timeout, if
+        it has retries left and the retry queue is not full.
+        """
+        failure.trap(TimeoutException)
+        page_type = request.meta.get("page_type", "other")
+        if (
+                attempt >= self.timeout_retries or
+                self.pending_retries >= self.retry_queue_size
+        ):
+            self.inc_stat(f"pages/{page_type}/timeout_gave_up")
+            return failure
+
+        self.inc_stat(f"pages/{page_type}/timeout_retry")
+        # Tells PageTypeThrottleMiddleware the render was slowed down
+        request.meta["render_timeouts"] = attempt + 1
+        self.pending_retries += 1
+        deferred = self.render(
+            request, spider, self.timeouts.escalate(timeout), attempt + 1
+        )
+        deferred.addBoth(self.retry_done)
+        return deferred
+
+    def retry_done(self, result):
+        self.pending_retries -= 1
+        return result
+
+    def inc_stat(self, key):
+        if self.stats is not None:
+            self.stats.inc_value(key)
+
+    def build_response(self, result, request):
+        url, page_source, wait_seconds = result
+        self.timeouts.observe(
+            request.meta.get("page_type", "other"), wait_seconds
+        )
+        # Same meta key as Scrapy's HTTP download handlers
+        request.meta["download_latency"] = (
+            time.monotonic() - request.meta.pop("render_started")
+        )
+        return HtmlResponse(
+            url=url,
+            body=page_source,
+            encoding="utf-8",
+            request=request,
+            flags=["rendered"],
+        )
+
+    def spider_opened(self, spider):
+        self.pool.start()
+        spider.logger.info(
+            "Browser pool started with %d workers" % self.pool.size
+        )
+
+    def spider_closed(self, spider):
+        self.pool.stop()
+
+
+class PageTypeStatsMiddleware:
+    """
+    Counts requests and response bytes per page type (the "page_type"
+    request meta key), split by how the page was fetched:
+
+        pages/<page_type>/<rendered|cached|http>/request_count
+        pages/<page_type>/<rendered|cached|http>/response_bytes
+
+    For rendered pages the byte count is the size of the DOM handed to
+    the spider; "cached" responses came from the HTTP cache without
+    being downloaded again.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    def process_response(self, request, response, spider):
+        page_type = request.meta.get("page_type", "other")
+        if "rendered" in response.flags:
+            fetch = "rendered"
+        elif "cached" in response.flags:
+            fetch = "cached"
+        else:
+            fetch = "http"
+        prefix = f"pages/{page_type}/{fetch}"
+        self.stats.inc_value(f"{prefix}/request_count", spider=spider)
+        self.stats.inc_value(
+            f"{prefix}/response_bytes", len(response.body), spider=spider
+        )
+        return response
+
+
+class PageTypeThrottleMiddleware:
+    """
+    Adapts the concurrency and delay of every page type, fetched over
+    HTTP or rendered, to how the site responds (see AIMDThrottle):
+
+    - HTTP requests go to a downloader slot of their page type and host,
+      whose concurrency and delay are set from the page type's throttle.
+      Responses are observed as they are downloaded, before the retry
+      middleware, so 429 and 503 responses and failed downloads back off.
+      Their retries, spaced by the backoff delay, may be up to
+      PAGE_THROTTLE_RETRY_TIMES per request instead of RETRY_TIMES.
+    - Rendered requests bypass the downloader slots; they wait for a
+      place in the page type's ThrottleGate before going to the browser
+      pool. Renders that timed out back off.
+
+    The throttle of each page type is reported in the stats when the
+    crawl ends:
+
+        throttle/<page_type>/<http|rendered>/<concurrency|peak|delay|backoffs>
+    """
+
+    def __init__(self, crawler, render_default=True, backoff_statuses=(),
+                 retry_times=8, **throttle_kwargs):
+        self.crawler = crawler
+        self.render_default = render_default
+        self.backoff_statuses = set(backoff_statuses)
+        self.retry_times = retry_times
+        self.throttle_kwargs = throttle_kwargs
+        self.throttles = {}  # "<page_type>/<http|rendered>" -> AIMDThrottle
+        self.gates = {}  # "<page_type>/rendered" -> ThrottleGate
+        self.tokens = itertools.count()
+        self.held = {}  # token -> gate, of rendered requests in flight
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("PAGE_THROTTLE_ENABLED", True):
+            raise NotConfigured
+        s = cls(
+            crawler,
+            render_default=settings.getbool("BROWSER_RENDER_DEFAULT", True),
+            backoff_statuses=[
+                int(status) for status in
+                settings.getlist("PAGE_THROTTLE_BACKOFF_STATUSES")
+            ],
+            retry_times=settings.getint("PAGE_THROTTLE_RETRY_TIMES", 8),
+            start_concurrency=settings.getint(
+                "PAGE_THROTTLE_START_CONCURRENCY", 2
+            ),
+            max_concurrency=settings.getint(
+                "PAGE_THROTTLE_MAX_CONCURRENCY", 16
+            ),
+            min_delay=settings.getfloat("PAGE_THROTTLE_MIN_DELAY", 0),
+            max_delay=settings.getfloat("PAGE_THROTTLE_MAX_DELAY", 60),
+            delay_step=settings.getfloat("PAGE_THROTTLE_DELAY_STEP", 0.25),
+            increase=settings.getfloat("PAGE_THROTTLE_INCREASE", 0.25),
+            decrease=settings.getfloat("PAGE_THROTTLE_DECREASE", 0.5),
+            latency_factor=settings.getfloat(
+                "PAGE_THROTTLE_LATENCY_FACTOR", 3
+            ),
+        )
+        crawler.signals.connect(
+            s.response_downloaded, signal=signals.response_downloaded
+        )
+        crawler.signals.connect(
+            s.request_left_downloader, signal=signals.request_left_downloader
+        )
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def throttle(self, key: str) -> AIMDThrottle:
+        if key not in self.throttles:
+            self.throttles[key] = AIMDThrottle(**self.throttle_kwargs)
+        return self.throttles[key]
+
+    def process_request(self, request, spider):
+        page_type = request.meta.get("page_type")
+        if page_type is None:
+            return None
+        if request.meta.get("render", self.render_default):
+            return self.admit_rendered(request, f"{page_type}/rendered")
+
+        key = f"{page_type}/http"
+        throttle = self.throttle(key)
+        request.meta["throttle"] = key
+        request.meta["throttle_epoch"] = throttle.epoch
+        request.meta.setdefault("max_retry_times", self.retry_times)
+        request.meta["download_slot"] = \
+            f"{page_type}@{urlparse_cached(request).hostname}"
+        self.update_slot(request)
+        return None
+
+    def update_slot(self, request) -> None:
+        """
+        Sets the concurrency and delay of the downloader slot of an HTTP
+        request from its page type's throttle.
+        """
+        throttle = self.throttle(request.meta["throttle"])
+        slot_key = request.meta["download_slot"]
+        downloader = self.crawler.engine.downloader
+        slot = downloader.slots.get(slot_key)
+        if slot is None:
+            # Settings of the slot the downloader creates for the request
+            downloader.per_slot_settings[slot_key] = {
+                "concurrency": throttle.slots, "delay": throttle.delay,
+            }
+        else:
+            slot.concurrency = throttle.slots
+            slot.delay = throttle.delay
+
+    def admit_rendered(self, request, key):
+        """
+        Returns a Deferred firing once the rendered request has a place
+        in its page type's gate.
+        """
+        # A request sent back to the scheduler when its browser crashed
+        # frees the place of its previous attempt
+        self.release(request)
+        if key not in self.gates:
+            self.gates[key] = ThrottleGate(self.throttle(key))
+        gate = self.gates[key]
+        token = next(self.tokens)
+
+        def admitted(_):
+            self.held[token] = gate
+            request.meta["throttle"] = key
+            request.meta["throttle_epoch"] = gate.throttle.epoch
+            request.meta["throttle_token"] = token
+
+        return gate.acquire().addCallback(admitted)
+
+    def release(self, request) -> None:
+        gate = self.held.pop(request.meta.pop("throttle_token", None), None)
+        if gate is not None:
+            gate.release()
+
+    def process_response(self, request, response, spider):
+        if "throttle_token" in request.meta:
+            self.release(request)
+            throttle = self.throttle(request.meta["throttle"])
+            epoch = request.meta["throttle_epoch"]
+            if request.meta.get("render_timeouts"):
+                throttle.backoff(epoch)
+            else:
+                throttle.success(request.meta.get("download_latency"), epoch)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        if "throttle_token" in request.meta:
+            self.release(request)
+            if isinstance(exception, TimeoutException):
+                self.throttle(request.meta["throttle"]).backoff(
+                    request.meta["throttle_epoch"]
+                )
+        return None
+
+    def response_downloaded(self, response, request, spider):
+        if "throttle" not in request.meta or \
+                "throttle_token" in request.meta:
+            return
+        request.meta["throttle_observed"] = True
+        throttle = self.throttle(request.meta["throttle"])
+        epoch = request.meta["throttle_epoch"]
+        if response.status in self.backoff_statuses:
+            throttle.backoff(epoch, retry_after(response))
+        else:
+            throttle.success(request.meta.get("download_latency"), epoch)
+        self.update_slot(request)
+
+    def request_left_downloader(self, request, spider):
+        if "throttle" not in request.meta or \
+                "throttle_token" in request.meta:
+            return
+        if not request.meta.pop("throttle_observed", False):
+            # Timed out or failed before a response
+            self.throttle(request.meta["throttle"]).backoff(
+                request.meta["throttle_epoch"]
+            )
+            self.update_slot(request)
+
+    def spider_closed(self, spider):
+        for gate in self.gates.values():
+            gate.close()
+        stats = self.crawler.stats
+        for key, throttle in sorted(self.throttles.items()):
+            stats.set_value(f"throttle/{key}/concurrency", throttle.slots)
+            stats.set_value(f"throttle/{key}/peak", throttle.peak)
+            stats.set_value(f"throttle/{key}/delay", round(throttle.delay, 2))
+            stats.set_value(f"throttle/{key}/backoffs", throttle.backoffs)
+
+
+def retry_after(response):
+    """
+    Returns the seconds of a response's Retry-After header, None when
+    missing or given as a date.
+    """
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
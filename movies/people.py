@@ -0,0 +1,78 @@
+import json
+
+
+class PersonTable:
+    """
+    Names of the people credited in a crawl, each stored once, keyed by
+    the number of their IMDb ID (``nm0000209`` -> 209). Movies refer to
+    people by these integer keys, and names are looked up only when data
+    is exported, so namesakes stay apart. People credited without a
+    profile link get negative keys, one per distinct name.
+    """
+
+    def __init__(self):
+        self.names = {}
+        self.unlinked = {}  # name -> key, for people without an IMDb ID
+        self.next_unlinked = -1
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, key) -> bool:
+        return key in self.names
+
+    def add(self, person_id, name: str) -> int:
+        """
+        Registers a person by IMDb ID (``nm...``), or by name alone when
+        the ID is None, and returns the person's key.
+        """
+        if person_id:
+            key = int(person_id[2:])
+        else:
+            key = self.unlinked.get(name, self.next_unlinked)
+        return self.set(key, name)
+
+    def set(self, key: int, name: str) -> int:
+        """
+        Registers a person by key, e.g. read back from a people file.
+        """
+        self.names[key] = name
+        if key < 0:
+            self.unlinked[name] = key
+            self.next_unlinked = min(self.next_unlinked, key - 1)
+        return key
+
+    def restore(self, key: int, name: str) -> int:
+        """
+        Registers a person read from the title cache and returns the key
+        to use in this crawl. Unlinked people get their key again, as the
+        cache is shared by crawls that numbered them differently.
+        """
+        if key < 0:
+            return self.add(None, name)
+        return self.set(key, name)
+
+    def name(self, key: int) -> str:
+        return self.names[key]
+
+    def names_of(self, keys) -> list:
+        return [self.names[key] for key in keys]
+
+    def pairs(self, keys) -> list:
+        """
+        Returns ``[key, name]`` pairs, e.g. for caching credits.
+        """
+        return [[key, self.names[key]] for key in keys]
+
+    def line(self, key: int) -> str:
+        """
+        Returns the line of a people JSON lines file for a person.
+        """
+        return json.dumps([key, self.names[key]], ensure_ascii=False) + "\n"
+
+    def load(self, records) -> None:
+        """
+        Registers ``[key, name]`` records, e.g. the lines of a people file.
+        """
+        for key, name in records:
+            self.set(key, name)
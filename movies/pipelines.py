@@ -3,11 +3,290 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import json
+import os
+
+from decouple import config
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
+from movies import signals
+from movies.actor_stats import ActorStats
+from movies.instrumentation import timings
+from movies.items import MoviesItem
+
+MOVIES_JSON_PATH = config("MOVIES_JSON_PATH")
+ACTORS_JSON_PATH = config("ACTORS_JSON_PATH")
+MOVIES_JSONL_PATH = config("MOVIES_JSONL_PATH", default="movies.jsonl")
+PEOPLE_JSONL_PATH = config("PEOPLE_JSONL_PATH", default="people.jsonl")
+
+
+def dump_json_array(records, f) -> None:
+    """
+    Writes records one by one as a JSON array formatted like
+    ``json.dump(list(records), f, ensure_ascii=False, indent=4)``,
+    without building the list.
+    """
+    empty = True
+    for record in records:
+        f.write("[\n    " if empty else ",\n    ")
+        f.write(
+            json.dumps(record, ensure_ascii=False, indent=4)
+            .replace("\n", "\n    ")
+        )
+        empty = False
+    f.write("[]" if empty else "\n]")
+
+
+def read_jsonl(path):
+    """
+    Yields the records of a JSON lines file, skipping a line cut short by
+    a crash.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def is_worker(spider) -> bool:
+    """
+    Tells whether the spider is a worker of a sharded crawl, whose movies
+    go to the work queue instead of the output files.
+    """
+    return getattr(spider, "role", None) == "worker"
+
+
+def is_resuming(spider) -> bool:
+    """
+    Tells whether the spider continues an interrupted crawl.
+    """
+    checkpoint = getattr(spider, "checkpoint", None)
+    return checkpoint is not None and len(checkpoint) > 0
+
 
 class MoviesPipeline:
+    """
+    Streams movie items to an append-only JSON lines file as they are
+    scraped, so a crash loses at most the last unsynced lines, and turns
+    it into the sorted movies JSON file when the spider closes.
+
+    Movie lines refer to people by key. Each person of the spider's
+    PersonTable is written once, as a ``[key, name]`` line of the people
+    file, before the first movie line crediting them; names are resolved
+    only in the movies JSON file and the records passed on for export.
+
+    Movies are recorded in the spider's checkpoint once their line is
+    synced to disk. When resuming, new lines are appended to the files.
+    """
+
+    def __init__(self, jsonl_path, json_path, people_path, fsync_every=25,
+                 crawler=None):
+        self.jsonl_path = jsonl_path
+        self.json_path = json_path
+        self.people_path = people_path
+        self.fsync_every = fsync_every
+        self.crawler = crawler
+        self.file = None
+        self.people_file = None
+        self.people = None
+        self.written_people = set()
+        self.checkpoint = None
+        self.enabled = True
+        self.unsynced = []
+        self.offsets = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            jsonl_path=MOVIES_JSONL_PATH,
+            json_path=MOVIES_JSON_PATH,
+            people_path=PEOPLE_JSONL_PATH,
+            fsync_every=crawler.settings.getint(
+                "MOVIES_JSONL_FSYNC_EVERY", 25
+            ),
+            crawler=crawler,
+        )
+
+    def open_spider(self, spider):
+        self.enabled = not is_worker(spider)
+        if not self.enabled:
+            return
+        self.checkpoint = getattr(spider, "checkpoint", None)
+        self.people = spider.people
+        if (
+                is_resuming(spider) and os.path.exists(self.jsonl_path) and
+                os.path.exists(self.people_path)
+        ):
+            self.keep_completed(self.checkpoint.completed_positions())
+            for key, name in read_jsonl(self.people_path):
+                self.people.set(key, name)
+                self.written_people.add(key)
+            self.file = open(self.jsonl_path, "a", encoding="utf-8")
+            self.people_file = open(self.people_path, "a", encoding="utf-8")
+        else:
+            self.file = open(self.jsonl_path, "w", encoding="utf-8")
+            self.people_file = open(self.people_path, "w", encoding="utf-8")
+
+    def keep_completed(self, positions) -> None:
+        """
+        Rewrites the file with only the movies recorded as completed,
+        dropping lines written after the last checkpoint and a line cut
+        short by a crash. Those movies are scraped again.
+        """
+        temp_path = self.jsonl_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for record in read_jsonl(self.jsonl_path):
+                if record["Position in rating"] in positions:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(temp_path, self.jsonl_path)
+
     def process_item(self, item, spider):
+        if not self.enabled or not isinstance(item, MoviesItem):
+            return item
+
+        with timings.stage("pipeline/write"):
+            for key in item.get("directors", []) + item.get("cast", []):
+                if key not in self.written_people:
+                    self.people_file.write(self.people.line(key))
+                    self.written_people.add(key)
+            self.file.write(
+                json.dumps(item.to_record(), ensure_ascii=False) + "\n"
+            )
+        self.unsynced.append((item.get("url"), item["position"]))
+        if len(self.unsynced) >= self.fsync_every:
+            self.sync()
+        return item
+
+    @timings.timed("pipeline/fsync")
+    def sync(self) -> None:
+        """
+        Flushes the buffered lines, forces them to disk and marks their
+        movies as completed in the checkpoint. The people go first, so a
+        synced movie line never refers to an unsynced person.
+        """
+        for f in (self.people_file, self.file):
+            f.flush()
+            os.fsync(f.fileno())
+        if self.checkpoint is not None:
+            self.checkpoint.mark_done(
+                entry for entry in self.unsynced if entry[0]
+            )
+        self.unsynced = []
+
+    def close_spider(self, spider):
+        if not self.enabled:
+            return
+        self.sync()
+        self.file.close()
+        self.people_file.close()
+        self.finalize()
+        if self.crawler is not None:
+            self.crawler.signals.send_catch_log(
+                signal=signals.movies_finalized,
+                records=self.iter_records,
+                spider=spider,
+            )
+
+    def finalize(self) -> None:
+        """
+        Writes the movies JSON file sorted by position. Only the position
+        and file offset of each line are kept in memory; records are read
+        back one at a time. A later line for the same position wins.
+        """
+        offsets = {}
+        with open(self.jsonl_path, "rb") as f:
+            offset = f.tell()
+            for line in iter(f.readline, b""):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    pass
+                else:
+                    offsets[record["Position in rating"]] = offset
+                offset = f.tell()
+
+        self.offsets = [offsets[position] for position in sorted(offsets)]
+        with open(self.json_path, "w", encoding="utf-8") as f:
+            dump_json_array(self.iter_records(), f)
+
+    def iter_records(self, named=True):
+        """
+        Yields the finalized movie records sorted by position, reading
+        them from the JSON lines file one at a time, with people named or,
+        unless ``named``, given by key.
+        """
+        with open(self.jsonl_path, "rb") as f:
+            for offset in self.offsets:
+                f.seek(offset)
+                record = json.loads(f.readline())
+                if named:
+                    record = MoviesItem.named_record(record, self.people)
+                yield record
+
+
+class ActorStatsPipeline:
+    """
+    Feeds every movie item into the running actor analysis and writes the
+    actors JSON file when the spider closes, with no second pass over the
+    movies.
+    """
+
+    def __init__(self, json_path, crawler=None):
+        self.json_path = json_path
+        self.crawler = crawler
+        self.stats = ActorStats()
+        self.enabled = True
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(json_path=ACTORS_JSON_PATH, crawler=crawler)
+
+    def open_spider(self, spider):
+        self.enabled = not is_worker(spider)
+        if self.enabled and is_resuming(spider) and \
+                os.path.exists(MOVIES_JSONL_PATH):
+            for record in read_jsonl(MOVIES_JSONL_PATH):
+                self.stats.add_record(record)
+
+    def process_item(self, item, spider):
+        if self.enabled and isinstance(item, MoviesItem):
+            self.stats.add_item(item)
+        return item
+
+    def close_spider(self, spider):
+        if not self.enabled:
+            return
+        actors = self.stats.finalize(spider.people)
+        with open(self.json_path, "w", encoding="utf-8") as f:
+            dump_json_array(actors, f)
+        if self.crawler is not None:
+            self.crawler.signals.send_catch_log(
+                signal=signals.actors_finalized, actors=actors, spider=spider
+            )
+
+
+class WorkResultsPipeline:
+    """
+    Hands the movies of a sharded crawl's worker to the work queue, with
+    the names of their people, completing their jobs. The coordinator
+    writes the output files. Does nothing in other crawls.
+    """
+
+    def process_item(self, item, spider):
+        if not is_worker(spider) or not isinstance(item, MoviesItem):
+            return item
+
+        keys = item.get("directors", []) + item.get("cast", [])
+        with timings.stage("pipeline/complete"):
+            spider.work_queue.complete(spider.worker_id, item["url"], {
+                "url": item["url"],
+                "record": item.to_record(),
+                "people": spider.people.pairs(keys),
+            })
+            spider.work_queue.renew(spider.worker_id)
+        spider.job_completed(item["url"])
         return item
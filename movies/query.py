@@ -0,0 +1,853 @@
+"""
+Indexed queries over the scraped movies and people, without reading the
+whole movies JSON file:
+
+    python -m movies.query find --actor "Al Pacino" --year-from 1991
+    python -m movies.query find --director nm0000229 --rating-from 8.5
+    python -m movies.query find --title "the godf"
+    python -m movies.query people "de niro"
+    python -m movies.query serve --port 8250
+
+The index is a single file (QUERY_INDEX_PATH) built from the movies and
+people JSON lines files. It holds the movie records by position, the
+people by key, and inverted indexes: actors and directors to their
+movies, and years, ratings and folded title prefixes to movies. Every
+section is an array or a table of UTF-8 strings, sorted where it is
+searched, and is used in place through a memory map. Opening the index
+reads only its table of contents.
+
+``update_index`` reads only the lines appended to the JSON lines files
+since the index was built. When a file was rewritten instead, e.g. by a
+new crawl, the index is built afresh. The index uses the machine's byte
+order: it is a local cache of the JSON lines files.
+"""
+import argparse
+import functools
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from decouple import config
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.project import get_project_settings
+
+from movies import signals as movies_signals
+from movies.columnar import ROLES
+from movies.instrumentation import timings
+from movies.items import MoviesItem
+
+logger = logging.getLogger(__name__)
+
+MOVIES_JSONL_PATH = config("MOVIES_JSONL_PATH", default="movies.jsonl")
+PEOPLE_JSONL_PATH = config("PEOPLE_JSONL_PATH", default="people.jsonl")
+
+MAGIC = b"MOVIDX01"
+HEADER = struct.Struct("<8sQ")  # Magic, length of the table of contents
+ALIGNMENT = 8
+MISSING_YEAR = -1
+
+# Bytes read at a time when checking that a source file is unchanged
+CHUNK_SIZE = 1 << 20
+
+
+def fold(text: str) -> bytes:
+    """
+    Returns the form of a name or title that lookups compare. UTF-8 keeps
+    the order of the code points, so folded strings sort as bytes.
+    """
+    return text.casefold().encode("utf-8")
+
+
+def person_key(person: str):
+    """
+    Returns the key of an IMDb person ID (``nm0000199`` -> 199), or None
+    for a name.
+    """
+    if len(person) > 2 and person[:2] == "nm" and person[2:].isdigit():
+        return int(person[2:])
+    return None
+
+
+class StringTable:
+    """
+    The strings of an index section as a sequence of bytes, which can be
+    bisected in place when the section is sorted.
+    """
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> bytes:
+        return self.data[self.offsets[index]:self.offsets[index + 1]] \
+            .tobytes()
+
+
+def string_table(strings) -> tuple:
+    """
+    Returns the offsets and data sections of a string table.
+    """
+    offsets = array("Q", [0])
+    data = bytearray()
+    for string in strings:
+        data += string
+        offsets.append(len(data))
+    return offsets, bytes(data)
+
+
+class MovieIndex:
+    """
+    Read-only view of an index file, memory-mapped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, toc_length = HEADER.unpack_from(self.map)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a movie index")
+            toc = json.loads(
+                self.map[HEADER.size:HEADER.size + toc_length]
+            )
+        except (struct.error, ValueError):
+            self.map.close()
+            raise ValueError(f"{path} is not a movie index")
+        self.sources = toc["sources"]
+        start = aligned(HEADER.size + toc_length)
+        self.view = memoryview(self.map)
+        self.sections = {
+            name: self.view[start + offset:start + offset + size]
+            .cast(typecode)
+            for name, (offset, size, typecode) in toc["sections"].items()
+        }
+        self.positions = self.sections["positions"]
+        self.records = StringTable(
+            self.sections["records_offsets"], self.sections["records"]
+        )
+        self.titles = StringTable(
+            self.sections["titles_offsets"], self.sections["titles"]
+        )
+        self.names = StringTable(
+            self.sections["names_offsets"], self.sections["names"]
+        )
+        self.people_names = StringTable(
+            self.sections["people_names_offsets"],
+            self.sections["people_names"],
+        )
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def close(self) -> None:
+        for section in self.sections.values():
+            section.release()
+        self.view.release()
+        self.map.close()
+
+    def stale(self) -> bool:
+        """
+        Tells whether a source file changed since the index was built.
+        """
+        for source in self.sources.values():
+            try:
+                stat = os.stat(source["path"])
+            except FileNotFoundError:
+                continue
+            if [stat.st_size, stat.st_mtime_ns] != source["stat"]:
+                return True
+        return False
+
+    def row(self, position: int):
+        row = bisect_left(self.positions, position)
+        if row < len(self.positions) and self.positions[row] == position:
+            return row
+        return None
+
+    def name(self, key: int) -> str:
+        keys = self.sections["people_keys"]
+        return self.people_names[bisect_left(keys, key)].decode("utf-8")
+
+    def names_of(self, keys) -> list:
+        return [self.name(key) for key in keys]
+
+    def person_keys(self, person: str) -> list:
+        """
+        Returns the keys of the people with an IMDb ID (``nm...``) or a
+        name, namesakes included; names compare case-insensitively.
+        """
+        key = person_key(person)
+        if key is not None:
+            keys = self.sections["people_keys"]
+            index = bisect_left(keys, key)
+            found = index < len(keys) and keys[index] == key
+            return [key] if found else []
+        name = fold(person)
+        first = bisect_left(self.names, name)
+        last = bisect_right(self.names, name, first)
+        return list(self.sections["names_keys"][first:last])
+
+    def credited(self, role: str, keys) -> set:
+        """
+        Returns the positions of the movies crediting any of the people
+        in a role ("cast" or "director").
+        """
+        role_keys = self.sections[f"{role}_keys"]
+        offsets = self.sections[f"{role}_offsets"]
+        positions = set()
+        for key in keys:
+            index = bisect_left(role_keys, key)
+            if index < len(role_keys) and role_keys[index] == key:
+                positions.update(
+                    self.sections[f"{role}_positions"][
+                        offsets[index]:offsets[index + 1]
+                    ]
+                )
+        return positions
+
+    def titled(self, prefix: str) -> set:
+        """
+        Returns the positions of the movies whose title or original title
+        starts with a prefix, case-insensitively.
+        """
+        prefix = fold(prefix)
+        first = bisect_left(self.titles, prefix)
+        # No UTF-8 string has a 0xff byte
+        last = bisect_left(self.titles, prefix + b"\xff", first)
+        return set(self.sections["titles_positions"][first:last])
+
+    def in_range(self, field: str, low=None, high=None) -> set:
+        """
+        Returns the positions of the movies whose year or rating is within
+        inclusive bounds.
+        """
+        values = self.sections[f"{field}_values"]
+        first = 0 if low is None else bisect_left(values, low)
+        last = len(values) if high is None else bisect_right(values, high)
+        return set(self.sections[f"{field}_positions"][first:last])
+
+    def find(self, actor=None, director=None, title=None, year_from=None,
+             year_to=None, rating_from=None, rating_to=None,
+             limit=None) -> list:
+        """
+        Returns the positions of the movies matching every given filter,
+        in order. The most selective index gives the candidates, and the
+        years and ratings of the candidates are checked row by row.
+        """
+        candidates = []
+        if actor is not None:
+            candidates.append(
+                self.credited("cast", self.person_keys(actor))
+            )
+        if director is not None:
+            candidates.append(
+                self.credited("director", self.person_keys(director))
+            )
+        if title is not None:
+            candidates.append(self.titled(title))
+        if not candidates:
+            if year_from is not None or year_to is not None:
+                candidates.append(self.in_range("year", year_from, year_to))
+            elif rating_from is not None or rating_to is not None:
+                candidates.append(
+                    self.in_range("rating", rating_from, rating_to)
+                )
+            else:
+                candidates.append(set(self.positions))
+        candidates.sort(key=len)
+        positions = candidates[0].intersection(*candidates[1:])
+
+        years = self.sections["years"]
+        ratings = self.sections["ratings"]
+        matches = []
+        for position in positions:
+            row = self.row(position)
+            year, rating = years[row], ratings[row]
+            # Missing ratings are NaN, outside any bounds
+            if (
+                    (year_from is not None and year < year_from) or
+                    (year_to is not None and
+                     not MISSING_YEAR < year <= year_to) or
+                    (rating_from is not None and
+                     not rating >= rating_from) or
+                    (rating_to is not None and not rating <= rating_to)
+            ):
+                continue
+            matches.append(position)
+        matches.sort()
+        return matches[:limit] if limit is not None else matches
+
+    def record(self, position: int, named=True) -> dict:
+        """
+        Returns the record of the movie at a position, with people named
+        or, unless ``named``, given by key.
+        """
+        record = json.loads(self.records[self.row(position)])
+        if named:
+            record = MoviesItem.named_record(record, self)
+        return record
+
+    def people(self, prefix: str, limit=20) -> list:
+        """
+        Returns the people whose name starts with a prefix, with the
+        number of movies they are credited in per role.
+        """
+        prefix = fold(prefix)
+        first = bisect_left(self.names, prefix)
+        last = min(
+            bisect_left(self.names, prefix + b"\xff", first), first + limit
+        )
+        people = []
+        for key in self.sections["names_keys"][first:last]:
+            person = {"key": key, "name": self.name(key)}
+            for role in ROLES:
+                person[role] = len(self.credited(role, [key]))
+            people.append(person)
+        return people
+
+
+class IndexBuilder:
+    """
+    Movies and people of an index being built, from an index and the
+    lines appended to the JSON lines files since.
+    """
+
+    def __init__(self):
+        self.records = {}  # Record lines, people by key, by position
+        self.years = {}
+        self.ratings = {}
+        self.titles = {}  # Folded titles, by position
+        self.credits = {role: {} for role in ROLES}  # Positions, by key
+        self.names = {}
+
+    @classmethod
+    def from_index(cls, index: MovieIndex) -> "IndexBuilder":
+        builder = cls()
+        for row, position in enumerate(index.positions):
+            builder.records[position] = index.records[row]
+            year = index.sections["years"][row]
+            builder.years[position] = year if year != MISSING_YEAR else None
+            rating = index.sections["ratings"][row]
+            builder.ratings[position] = (
+                rating if not math.isnan(rating) else None
+            )
+            builder.titles[position] = []
+        for title, position in zip(index.titles,
+                                   index.sections["titles_positions"]):
+            builder.titles[position].append(title)
+        for role in ROLES:
+            offsets = index.sections[f"{role}_offsets"]
+            positions = index.sections[f"{role}_positions"]
+            for i, key in enumerate(index.sections[f"{role}_keys"]):
+                builder.credits[role][key] = set(
+                    positions[offsets[i]:offsets[i + 1]]
+                )
+        for key, name in zip(index.sections["people_keys"],
+                             index.people_names):
+            builder.names[key] = name.decode("utf-8")
+        return builder
+
+    def add_person(self, line: bytes) -> None:
+        key, name = json.loads(line)
+        self.names[key] = name
+
+    def add_movie(self, line: bytes) -> None:
+        """
+        Indexes a movie line. A later line for the same position wins, as
+        in the movies JSON file.
+        """
+        record = json.loads(line)
+        position = record["Position in rating"]
+        if position in self.records:
+            self.remove_movie(position)
+        self.records[position] = line
+        self.years[position] = record["Year"]
+        self.ratings[position] = record["Rating"]
+        self.titles[position] = sorted({
+            fold(record[key]) for key in ("Title", "Original title")
+            if record.get(key)
+        })
+        for role, key in ROLES.items():
+            for person in record.get(key) or []:
+                self.credits[role].setdefault(person, set()).add(position)
+
+    def remove_movie(self, position: int) -> None:
+        record = json.loads(self.records.pop(position))
+        for role, key in ROLES.items():
+            for person in record.get(key) or []:
+                positions = self.credits[role].get(person)
+                if positions is not None:
+                    positions.discard(position)
+                    if not positions:
+                        del self.credits[role][person]
+
+    def sections(self) -> dict:
+        """
+        Returns the index sections, as arrays and bytes, by name.
+        """
+        positions = sorted(self.records)
+        sections = {"positions": array("i", positions)}
+        sections["records_offsets"], sections["records"] = string_table(
+            self.records[position] for position in positions
+        )
+        sections["years"] = array("i", [
+            MISSING_YEAR if self.years[position] is None
+            else self.years[position]
+            for position in positions
+        ])
+        sections["ratings"] = array("d", [
+            math.nan if self.ratings[position] is None
+            else self.ratings[position]
+            for position in positions
+        ])
+        for field, values in (("year", self.years),
+                              ("rating", self.ratings)):
+            pairs = sorted(
+                (value, position) for position, value in values.items()
+                if value is not None
+            )
+            sections[f"{field}_values"] = array(
+                "i" if field == "year" else "d",
+                [value for value, _ in pairs],
+            )
+            sections[f"{field}_positions"] = array(
+                "i", [position for _, position in pairs]
+            )
+
+        titles = sorted(
+            (title, position) for position, folded in self.titles.items()
+            for title in folded
+        )
+        sections["titles_offsets"], sections["titles"] = string_table(
+            title for title, _ in titles
+        )
+        sections["titles_positions"] = array(
+            "i", [position for _, position in titles]
+        )
+
+        for role, credits in self.credits.items():
+            keys = sorted(credits)
+            offsets = array("Q", [0])
+            role_positions = array("i")
+            for key in keys:
+                role_positions.extend(sorted(credits[key]))
+                offsets.append(len(role_positions))
+            sections[f"{role}_keys"] = array("q", keys)
+            sections[f"{role}_offsets"] = offsets
+            sections[f"{role}_positions"] = role_positions
+
+        keys = sorted(self.names)
+        sections["people_keys"] = array("q", keys)
+        sections["people_names_offsets"], sections["people_names"] = \
+            string_table(self.names[key].encode("utf-8") for key in keys)
+        names = sorted((fold(name), key) for key, name in self.names.items())
+        sections["names_offsets"], sections["names"] = string_table(
+            name for name, _ in names
+        )
+        sections["names_keys"] = array("q", [key for _, key in names])
+        return sections
+
+    def write(self, path: str, sources: dict) -> None:
+        """
+        Writes the index to a temporary file and moves it over ``path``,
+        so readers keep the index they mapped.
+        """
+        sections = self.sections()
+        contents = {}
+        offset = 0
+        for name, section in sections.items():
+            typecode = section.typecode if isinstance(section, array) \
+                else "B"
+            size = len(section) * (
+                section.itemsize if isinstance(section, array) else 1
+            )
+            contents[name] = [offset, size, typecode]
+            offset = aligned(offset + size)
+        toc = json.dumps(
+            {"sources": sources, "sections": contents}
+        ).encode("utf-8")
+
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(toc)) + toc)
+            start = aligned(HEADER.size + len(toc))
+            for name, section in sections.items():
+                f.write(b"\0" * (start + contents[name][0] - f.tell()))
+                f.write(section)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+
+def aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def file_crc(path: str, size: int) -> int:
+    """
+    Returns the CRC-32 of the first ``size`` bytes of a file.
+    """
+    crc = 0
+    with open(path, "rb") as f:
+        while size > 0:
+            chunk = f.read(min(size, CHUNK_SIZE))
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            size -= len(chunk)
+    return crc
+
+
+def unchanged(path: str, source) -> bool:
+    """
+    Tells whether a JSON lines file still starts with the lines an index
+    was built from, i.e. lines were only appended to it since.
+    """
+    if source is None or source["path"] != os.path.abspath(path):
+        return False
+    if not source["size"]:
+        return True
+    return (
+        os.path.exists(path) and
+        os.path.getsize(path) >= source["size"] and
+        file_crc(path, source["size"]) == source["crc"]
+    )
+
+
+def read_appended(path: str, source) -> tuple:
+    """
+    Returns the complete lines of a JSON lines file after those an index
+    was built from, and the file's new source entry. A line cut short
+    is left for the next update.
+    """
+    start, crc = (source["size"], source["crc"]) if source else (0, 0)
+    data = b""
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            f.seek(start)
+            data = f.read()
+        stat = [stat.st_size, stat.st_mtime_ns]
+    else:
+        stat = [0, 0]
+    data = data[:data.rfind(b"\n") + 1]
+    return data.splitlines(), {
+        "path": os.path.abspath(path),
+        "size": start + len(data),
+        "crc": zlib.crc32(data, crc),
+        "stat": stat,
+    }
+
+
+def update_index(path: str, movies_path=MOVIES_JSONL_PATH,
+                 people_path=PEOPLE_JSONL_PATH, full=False) -> dict:
+    """
+    Brings the index at ``path`` up to date with the movies and people
+    JSON lines files, parsing only their new lines when the index was
+    built from the start of the files as they are now. Returns counts of
+    the movies and people indexed and of the lines read, and whether the
+    index was built afresh.
+    """
+    if not os.path.exists(movies_path):
+        raise FileNotFoundError(f"No movies file at {movies_path!r}")
+    builder = None
+    sources = {}
+    if not full and os.path.exists(path):
+        try:
+            index = MovieIndex(path)
+        except ValueError:
+            index = None
+        if index is not None:
+            if (
+                    unchanged(movies_path, index.sources.get("movies")) and
+                    unchanged(people_path, index.sources.get("people"))
+            ):
+                builder = IndexBuilder.from_index(index)
+                sources = index.sources
+            index.close()
+    rebuilt = builder is None
+    if rebuilt:
+        builder = IndexBuilder()
+
+    # People first: movie lines refer to people written before them
+    lines = 0
+    new_sources = {}
+    for name, file_path, add in (
+            ("people", people_path, builder.add_person),
+            ("movies", movies_path, builder.add_movie),
+    ):
+        appended, new_sources[name] = read_appended(
+            file_path, sources.get(name)
+        )
+        for line in appended:
+            try:
+                add(line)
+            except (ValueError, KeyError, TypeError):
+                continue  # A line cut short by a crash, then appended to
+            lines += 1
+    builder.write(path, new_sources)
+    return {
+        "movies": len(builder.records),
+        "people": len(builder.names),
+        "lines": lines,
+        "rebuilt": rebuilt,
+    }
+
+
+def open_index(path: str, movies_path=MOVIES_JSONL_PATH,
+               people_path=PEOPLE_JSONL_PATH) -> MovieIndex:
+    """
+    Opens the index, first updating it if it is missing or its source
+    files changed.
+    """
+    index = None
+    if os.path.exists(path):
+        try:
+            index = MovieIndex(path)
+        except ValueError:
+            index = None
+    if index is None or index.stale():
+        if index is not None:
+            index.close()
+        with timings.stage("query/index"):
+            result = update_index(path, movies_path, people_path)
+        logger.info(
+            "Indexed %d movies and %d people (%s, %d lines read)",
+            result["movies"], result["people"],
+            "built afresh" if result["rebuilt"] else "updated",
+            result["lines"],
+        )
+        index = MovieIndex(path)
+    return index
+
+
+class QueryService:
+    """
+    The index behind the HTTP endpoint, updated before a query when its
+    source files changed. An index replaced by an update is unmapped by
+    the garbage collector, as queries running may still use it.
+    """
+
+    def __init__(self, path, movies_path=MOVIES_JSONL_PATH,
+                 people_path=PEOPLE_JSONL_PATH):
+        self.path = path
+        self.movies_path = movies_path
+        self.people_path = people_path
+        self.lock = threading.Lock()
+        self.index = open_index(path, movies_path, people_path)
+
+    def current(self) -> MovieIndex:
+        with self.lock:
+            if self.index.stale():
+                self.index = open_index(
+                    self.path, self.movies_path, self.people_path
+                )
+            return self.index
+
+    def movies(self, params: dict) -> dict:
+        started = time.perf_counter()
+        index = self.current()
+        positions = index.find(
+            actor=params.get("actor"),
+            director=params.get("director"),
+            title=params.get("title"),
+            year_from=optional(int, params.get("year_from")),
+            year_to=optional(int, params.get("year_to")),
+            rating_from=optional(float, params.get("rating_from")),
+            rating_to=optional(float, params.get("rating_to")),
+            limit=optional(int, params.get("limit")),
+        )
+        movies = [index.record(position) for position in positions]
+        return {
+            "count": len(movies),
+            "movies": movies,
+            "took_us": round((time.perf_counter() - started) * 1e6),
+        }
+
+    def people(self, params: dict) -> dict:
+        people = self.current().people(
+            params.get("prefix", ""), optional(int, params.get("limit")) or 20
+        )
+        return {"count": len(people), "people": people}
+
+
+def optional(cast, value):
+    return None if value in (None, "") else cast(value)
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Serves JSON answers at /movies (actor, director, title, year_from,
+    year_to, rating_from, rating_to, limit) and /people (prefix, limit).
+    """
+
+    def __init__(self, *args, service, **kwargs):
+        self.service = service
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        endpoints = {
+            "/movies": self.service.movies,
+            "/people": self.service.people,
+        }
+        if url.path not in endpoints:
+            self.send_error(404)
+            return
+        params = {
+            name: values[-1]
+            for name, values in parse_qs(url.query).items()
+        }
+        try:
+            answer = endpoints[url.path](params)
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        body = json.dumps(answer, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class QueryIndexer:
+    """
+    Scrapy extension bringing the query index at QUERY_INDEX_PATH up to
+    date with the JSON lines files when the crawl ends. Disabled when the
+    path is empty.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get("QUERY_INDEX_PATH")
+        if not path:
+            raise NotConfigured
+        ext = cls(path)
+        crawler.signals.connect(
+            ext.movies_finalized, signal=movies_signals.movies_finalized
+        )
+        return ext
+
+    def movies_finalized(self, records, spider):
+        with timings.stage("query/index"):
+            result = update_index(self.path)
+        logger.info(
+            "Indexed %d movies and %d people in %s (%s)",
+            result["movies"], result["people"], self.path,
+            "built afresh" if result["rebuilt"] else "updated",
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Query the scraped movies and people through an index"
+    )
+    parser.add_argument("--index", help="index file (default: the "
+                        "QUERY_INDEX_PATH setting)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="update the index")
+    build.add_argument("--full", action="store_true",
+                       help="build it afresh from the whole files")
+
+    find = commands.add_parser("find", help="print the matching movies")
+    find.add_argument("--actor", help="name or IMDb ID (nm...)")
+    find.add_argument("--director", help="name or IMDb ID (nm...)")
+    find.add_argument("--title", help="prefix of the title or original "
+                      "title")
+    find.add_argument("--year-from", type=int)
+    find.add_argument("--year-to", type=int)
+    find.add_argument("--rating-from", type=float)
+    find.add_argument("--rating-to", type=float)
+    find.add_argument("--limit", type=int)
+
+    people = commands.add_parser("people",
+                                 help="print the people named so")
+    people.add_argument("prefix", help="start of the name")
+    people.add_argument("--limit", type=int, default=20)
+
+    serve = commands.add_parser("serve", help="answer queries over HTTP")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8250)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    path = args.index or get_project_settings().get("QUERY_INDEX_PATH") \
+        or "movies.idx"
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if not os.path.exists(MOVIES_JSONL_PATH):
+        sys.exit(f"No movies file at {MOVIES_JSONL_PATH!r}")
+
+    if args.command == "build":
+        started = time.monotonic()
+        result = update_index(path, full=args.full)
+        logger.info(
+            "Indexed %d movies and %d people in %.3f s (%s, %d lines read)",
+            result["movies"], result["people"], time.monotonic() - started,
+            "built afresh" if result["rebuilt"] else "updated",
+            result["lines"],
+        )
+        return 0
+
+    if args.command == "serve":
+        service = QueryService(path)
+        handler = functools.partial(QueryHandler, service=service)
+        httpd = ThreadingHTTPServer((args.host, args.port), handler)
+        httpd.daemon_threads = True
+        logger.info(
+            "Serving queries at http://%s:%d/movies and /people",
+            args.host, httpd.server_address[1],
+        )
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    index = open_index(path)
+    started = time.perf_counter()
+    if args.command == "people":
+        results = index.people(args.prefix, args.limit)
+    else:
+        results = [
+            index.record(position)
+            for position in index.find(
+                actor=args.actor, director=args.director, title=args.title,
+                year_from=args.year_from, year_to=args.year_to,
+                rating_from=args.rating_from, rating_to=args.rating_to,
+                limit=args.limit,
+            )
+        ]
+    took = time.perf_counter() - started
+    for result in results:
+        print(json.dumps(result, ensure_ascii=False))
+    logger.info("%d results in %.0f us", len(results), took * 1e6)
+    return 0 if results else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
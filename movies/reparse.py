@@ -0,0 +1,219 @@
+"""
+Regenerates the output files from the page archive, without a browser
+or the network, e.g. after fixing the selectors for new IMDb markup:
+
+    python -m movies.reparse
+    python -m movies.reparse --archive archive/ --spider chart --workers 8
+
+The chart pages of the spider's last archived run give the movies and
+their positions; the latest archived page of each movie and of its full
+credits is parsed with the extractors the spiders use, in a pool of
+processes. The movies JSON lines, people, movies JSON and actors JSON
+files are written as a finished crawl writes them.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from decouple import config
+from scrapy.utils.project import get_project_settings
+
+from movies.actor_stats import ActorStats
+from movies.archive import PageArchive, read_member, read_page
+from movies.extractors import extract_cast, extract_chart, extract_movie
+from movies.items import MoviesItem
+from movies.people import PersonTable
+from movies.pipelines import dump_json_array
+
+logger = logging.getLogger(__name__)
+
+MOVIES_JSON_PATH = config("MOVIES_JSON_PATH")
+ACTORS_JSON_PATH = config("ACTORS_JSON_PATH")
+MOVIES_JSONL_PATH = config("MOVIES_JSONL_PATH", default="movies.jsonl")
+PEOPLE_JSONL_PATH = config("PEOPLE_JSONL_PATH", default="people.jsonl")
+
+EXTRACTORS = {
+    "chart": extract_chart,
+    "title": extract_movie,
+    "fullcredits": extract_cast,
+}
+
+# Pages handed to a worker process at a time
+CHUNKSIZE = 16
+
+archive_path = None  # Archive directory of the worker processes
+pages_files = {}  # Pages files opened once per worker process
+
+
+def open_pages(directory: str) -> None:
+    global archive_path
+    archive_path = directory
+
+
+def pages_file(name: str):
+    if name not in pages_files:
+        pages_files[name] = open(os.path.join(archive_path, name), "rb")
+    return pages_files[name]
+
+
+def parse_page(task):
+    """
+    Runs the extractor of a page type over an archived page. Returns
+    ``(url, result)``, the result being None when extraction failed.
+    """
+    page_type, url, name, offset, length = task
+    try:
+        response = read_page(pages_file(name), offset, length)
+        return url, EXTRACTORS[page_type](response)
+    except Exception:
+        return url, None
+
+
+def parse_pages(executor, page_type: str, pages: dict, chunksize) -> dict:
+    """
+    Parses ``{url: (pages file, offset, length)}`` archived pages of a
+    type in the pool and returns ``{url: result}`` of the pages that
+    parsed.
+    """
+    tasks = [(page_type, url, *member) for url, member in pages.items()]
+    return {
+        url: result
+        for url, result in executor.map(parse_page, tasks,
+                                        chunksize=chunksize)
+        if result is not None
+    }
+
+
+def chart_entries(archive, executor, spider: str) -> list:
+    """
+    Returns the chart entries of the spider's last run, numbered like
+    the spider numbers them.
+    """
+    charts = archive.last_run(spider, "chart")
+    parsed = parse_pages(executor, "chart", charts, 1)
+    if spider == "top250":
+        return [entry for url in charts for entry in parsed.get(url, [])]
+
+    # Chart spiders number movies in list order, page after page
+    page_numbers = {}
+    for url, (name, offset, length) in charts.items():
+        with open(os.path.join(archive.directory, name), "rb") as f:
+            header = read_member(f, offset, length)[0]
+        page_numbers[url] = header["meta"].get("page", 1)
+    entries = []
+    for url in sorted(parsed, key=page_numbers.get):
+        for entry in parsed[url]:
+            entries.append({**entry, "position": len(entries) + 1})
+    return entries
+
+
+def reparse(archive_dir: str, spider="top250", workers=None) -> dict:
+    """
+    Rebuilds the movies of the spider's last run from the archive and
+    writes the output files. Returns counts of the movies rebuilt and of
+    those whose pages are not archived or no longer parse.
+    """
+    archive = PageArchive(archive_dir)
+    people = PersonTable()
+    stats = ActorStats()
+    items = []
+    try:
+        with ProcessPoolExecutor(
+                max_workers=workers, initializer=open_pages,
+                initargs=(archive_dir,),
+        ) as executor:
+            entries = chart_entries(archive, executor, spider)
+            movies = parse_pages(
+                executor, "title",
+                archive.latest([entry["url"] for entry in entries], "title"),
+                CHUNKSIZE,
+            )
+            credits = parse_pages(
+                executor, "fullcredits",
+                archive.latest(
+                    [movie["cast_url"] for movie in movies.values()],
+                    "fullcredits",
+                ),
+                CHUNKSIZE,
+            )
+    finally:
+        archive.close()
+
+    missing = 0
+    for entry in entries:
+        movie = movies.get(entry["url"])
+        cast = credits.get(movie["cast_url"]) if movie else None
+        if cast is None:
+            missing += 1
+            continue
+        actors, directors = cast
+        item = MoviesItem(
+            position=entry["position"],
+            title=movie["title"],
+            original_title=movie["orig_title"],
+            year=movie["year"],
+            rating=movie["rating"],
+            directors=[people.add(*person) for person in directors],
+            cast=[people.add(*person) for person in actors],
+            url=entry["url"],
+        )
+        items.append(item)
+        stats.add_item(item)
+
+    write_outputs(sorted(items, key=lambda item: item["position"]),
+                  people, stats)
+    return {"movies": len(items), "missing": missing}
+
+
+def write_outputs(items, people, stats) -> None:
+    """
+    Writes the output files of a crawl for items sorted by position.
+    """
+    with open(PEOPLE_JSONL_PATH, "w", encoding="utf-8") as f:
+        for key in sorted(people.names):
+            f.write(people.line(key))
+    with open(MOVIES_JSONL_PATH, "w", encoding="utf-8") as f:
+        for item in items:
+            f.write(json.dumps(item.to_record(), ensure_ascii=False) + "\n")
+    with open(MOVIES_JSON_PATH, "w", encoding="utf-8") as f:
+        dump_json_array((item.to_record(people) for item in items), f)
+    with open(ACTORS_JSON_PATH, "w", encoding="utf-8") as f:
+        dump_json_array(stats.finalize(people), f)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Regenerate the output files from the page archive"
+    )
+    parser.add_argument("--archive", help="archive directory (default: "
+                        "the PAGE_ARCHIVE_DIR setting)")
+    parser.add_argument("--spider", default="top250",
+                        help="spider whose last run is parsed again")
+    parser.add_argument("--workers", type=int,
+                        help="processes (default: one per CPU)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    archive_dir = args.archive or get_project_settings().get(
+        "PAGE_ARCHIVE_DIR"
+    )
+    if not archive_dir or not os.path.exists(archive_dir):
+        sys.exit(f"No page archive at {archive_dir!r}")
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    started = time.monotonic()
+    result = reparse(archive_dir, args.spider, args.workers)
+    logger.info(
+        "Reparsed %d movies in %.2f s, %d not archived or not parsed",
+        result["movies"], time.monotonic() - started, result["missing"],
+    )
+    return 0 if result["movies"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
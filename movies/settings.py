@@ -25,11 +25,39 @@ CONCURRENT_REQUESTS = 16
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
 # See also autothrottle settings and docs
+# Requests with a page type are throttled by PageTypeThrottleMiddleware
+# instead, which sets the delay of their downloader slots, so this delay
+# does not slow them down. It still spaces the requests without a page
+# type, and every request when PAGE_THROTTLE_ENABLED is False
 DOWNLOAD_DELAY = 3
 # The download delay setting will honor only one of:
 CONCURRENT_REQUESTS_PER_DOMAIN = 8
 #CONCURRENT_REQUESTS_PER_IP = 16
 
+# Concurrency and delay adapted per page type (chart, title, fullcredits),
+# static and rendered, from latency, throttling responses and timeouts:
+# AIMD, starting at the start concurrency and doubling per round trip until
+# the first sign of congestion
+PAGE_THROTTLE_ENABLED = True
+PAGE_THROTTLE_START_CONCURRENCY = 2
+PAGE_THROTTLE_MAX_CONCURRENCY = 16
+# Concurrency added per round trip without congestion, after the first
+PAGE_THROTTLE_INCREASE = 0.25
+# Concurrency multiplier on congestion
+PAGE_THROTTLE_DECREASE = 0.5
+# Delay between requests of a page type (seconds): the least, the most,
+# and the step: congestion doubles the delay, to the step at least, and
+# every success takes the step off
+PAGE_THROTTLE_MIN_DELAY = 0
+PAGE_THROTTLE_MAX_DELAY = 60
+PAGE_THROTTLE_DELAY_STEP = 0.25
+# A response this many times slower than usual counts as congestion
+PAGE_THROTTLE_LATENCY_FACTOR = 3
+# Statuses by which the site asks to slow down
+PAGE_THROTTLE_BACKOFF_STATUSES = [429, 503]
+# Retries of the requests of a page type, spaced by the backoff delay
+PAGE_THROTTLE_RETRY_TIMES = 8
+
 # Disable cookies (enabled by default)
 #COOKIES_ENABLED = False
 
@@ -50,21 +78,123 @@ CONCURRENT_REQUESTS_PER_DOMAIN = 8
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "movies.middlewares.MoviesDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    "movies.middlewares.PageTypeThrottleMiddleware": 541,
+    "movies.middlewares.PageTypeStatsMiddleware": 542,
+    "movies.middlewares.BrowserRenderMiddleware": 543,
+}
+
+# Number of browsers rendering pages in parallel, off the reactor thread
+BROWSER_POOL_SIZE = 4
+# Default time to wait for the request's "wait_for" selector (seconds)
+BROWSER_WAIT_TIMEOUT = 10
+# Once 20 pages of a type have been rendered, the wait timeout is learned
+# from them: 95th percentile of the waits times the margin, within bounds
+BROWSER_WAIT_MIN_TIMEOUT = 1
+BROWSER_WAIT_MAX_TIMEOUT = 30
+BROWSER_WAIT_MARGIN = 2
+# Renders that time out are retried with a doubled timeout, this many times
+BROWSER_TIMEOUT_RETRIES = 2
+# Maximum number of timed-out renders being retried at the same time
+BROWSER_RETRY_QUEUE_SIZE = 8
+# "eager" returns from driver.get once the document is parsed, and the page
+# is ready when the request's "wait_for" selectors are present; "normal"
+# also waits for images and scripts. ("none" is not supported: the DOM could
+# be captured from the previous page.)
+BROWSER_PAGE_LOAD_STRATEGY = "eager"
+# Lightweight browser profile: headless, small window, images disabled and
+# requests to these URL patterns blocked (images, media, fonts, ads and
+# trackers, see movies.chrome_driver.DEFAULT_BLOCKED_URLS). An empty list
+# blocks nothing.
+BROWSER_HEADLESS = True
+BROWSER_BLOCK_IMAGES = True
+BROWSER_WINDOW_SIZE = "1280,800"
+#BROWSER_BLOCKED_URLS = ["*.jpg", "*.png", "*doubleclick.net*"]
+# Browsers are replaced by fresh ones after this many pages, or when Chrome
+# uses more memory than this (checked every 10 pages, Linux only); 0 to
+# disable
+BROWSER_MAX_PAGES = 200
+BROWSER_MAX_RSS_MB = 1500
+# Times a request is rescheduled after its browser crashed
+BROWSER_CRASH_RETRIES = 2
+# Whether requests without a "render" meta key are loaded in a browser.
+# Each URL goes over the wire once: either rendered or plain HTTP.
+BROWSER_RENDER_DEFAULT = True
+# Whether movie title pages are rendered in a browser (chart and cast pages
+# are parsed as static HTML and rendered only as a fallback)
+RENDER_TITLE_PAGES = True
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+EXTENSIONS = {
+    "movies.export.SheetsExporter": 500,
+    "movies.instrumentation.StageMetrics": 510,
+    "movies.columnar.ColumnarExporter": 520,
+    "movies.archive.PageArchiver": 530,
+    "movies.query.QueryIndexer": 540,
+}
+
+# Directory every fetched chart, movie and cast page is archived to, static
+# and rendered, for `python -m movies.reparse`, e.g. "archive". The archive
+# is append-only and never pruned, so it grows by every page of every run.
+# Empty (the default) disables it.
+PAGE_ARCHIVE_DIR = ""
+# gzip level of the archived pages (1-9)
+PAGE_ARCHIVE_COMPRESSLEVEL = 6
+# Archived pages are synced to disk and indexed every this many pages
+PAGE_ARCHIVE_FLUSH_EVERY = 100
+
+# Work queue of sharded crawls (`-a role=coordinator` / `-a role=worker`):
+# "sqlite:///work_queue.sqlite" for workers on one machine, or
+# "redis://host:6379/0" for workers on several (needs redis)
+WORK_QUEUE_URL = ""
+# Leased jobs not completed or renewed within this many seconds go back to
+# the other workers
+WORK_QUEUE_LEASE_SECONDS = 300
+# Jobs leased this many times without a result are given up
+WORK_QUEUE_MAX_ATTEMPTS = 3
+# Jobs a worker leases at a time
+WORK_QUEUE_BATCH_SIZE = 16
+# Seconds between the coordinator's checks for worker results
+WORK_QUEUE_POLL_INTERVAL = 1.0
+
+# Directory the movies, credits and people tables are written to when the
+# crawl ends, for analytics (needs pyarrow). Empty to disable.
+COLUMNAR_EXPORT_DIR = ""
+# "parquet" or "arrow" (Arrow IPC / Feather files)
+COLUMNAR_EXPORT_FORMAT = "parquet"
+
+# Index of the movies and people for `python -m movies.query`, updated from the
+# JSON lines files when the crawl ends. Empty to disable.
+QUERY_INDEX_PATH = "movies.idx"
+
+# Per-stage timings (downloads, browser, parsing, Google Sheets) and counters,
+# logged as a table when the crawl ends
+METRICS_ENABLED = True
+# File the timings are also written to as JSON, e.g. "metrics.json"
+METRICS_JSON_PATH = None
+# Port serving the timings in the Prometheus text format at /metrics
+METRICS_PROMETHEUS_PORT = None
+
+# Google Sheets export, running in a background worker during the crawl
+SHEETS_EXPORT_ENABLED = True
+# Movies written to the sheet per batch while crawling
+SHEETS_EXPORT_BATCH_SIZE = 50
+# Maximum seconds a scraped movie waits before its batch is written
+SHEETS_EXPORT_FLUSH_INTERVAL = 30
+# Maximum seconds the shutdown waits for the final sync
+SHEETS_EXPORT_JOIN_TIMEOUT = 300
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    "movies.pipelines.MoviesPipeline": 300,
-#}
+ITEM_PIPELINES = {
+    "movies.pipelines.WorkResultsPipeline": 200,
+    "movies.pipelines.MoviesPipeline": 300,
+    "movies.pipelines.ActorStatsPipeline": 400,
+}
+
+# Number of movies written to the JSON lines file between two fsyncs
+MOVIES_JSONL_FSYNC_EVERY = 25
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -79,13 +209,44 @@ CONCURRENT_REQUESTS_PER_DOMAIN = 8
 # Enable showing throttling stats for every response received:
 #AUTOTHROTTLE_DEBUG = False
 
+# Movie and cast pages are deduplicated by title ID, about 4 bytes per title
+DUPEFILTER_CLASS = "movies.dupefilter.TitleDupeFilter"
+
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-#HTTPCACHE_ENABLED = True
-#HTTPCACHE_EXPIRATION_SECS = 0
-#HTTPCACHE_DIR = "httpcache"
-#HTTPCACHE_IGNORE_HTTP_CODES = []
-#HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+# Plain HTTP pages are revalidated with their ETag/Last-Modified headers,
+# so repeated runs only download what changed. Rendered pages bypass it.
+HTTPCACHE_ENABLED = True
+HTTPCACHE_POLICY = "scrapy.extensions.httpcache.RFC2616Policy"
+HTTPCACHE_EXPIRATION_SECS = 0
+HTTPCACHE_DIR = "httpcache"
+HTTPCACHE_IGNORE_HTTP_CODES = [403, 429, 500, 502, 503, 504]
+HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+
+# SQLite file recording completed movies, so an interrupted crawl resumes
+# with the missing ones only. Cleared when a crawl finishes. Empty to
+# disable.
+CHECKPOINT_PATH = "top250.checkpoint.sqlite"
+
+# SQLite cache of scraped movie data by IMDb ID, shared across runs, e.g.
+# "title_cache.sqlite". Movies whose fields are all fresh are not requested
+# at all, and a fresh cast list skips the cast page. Empty (the default)
+# disables it, so every run fetches every page.
+TITLE_CACHE_PATH = ""
+# Seconds fields stay fresh, overriding movies.title_cache.DEFAULT_TTLS
+TITLE_CACHE_TTLS = {
+    "rating": 24 * 60 * 60,
+    "cast": 90 * 24 * 60 * 60,
+    "directors": 90 * 24 * 60 * 60,
+}
+# Least recently used titles beyond this many are evicted
+TITLE_CACHE_MAX_ENTRIES = 50000
+
+# "diff" writes only the changed rows in one batch update per spreadsheet,
+# "rewrite" clears the worksheets and writes them again
+GOOGLE_SHEETS_SYNC_MODE = "diff"
+# Upper bound for the size of a single Sheets API request body (bytes)
+GOOGLE_SHEETS_MAX_PAYLOAD_BYTES = 2_000_000
 
 # Set settings whose default value is deprecated to a future-proof value
 REQUEST_FINGERPRINTER_IMPLEMENTATION = "2.7"
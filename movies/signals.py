@@ -0,0 +1,18 @@
+"""
+Signals sent by the movies item pipelines when the crawl output is
+complete, so exporters can use the data without reading it back from
+the JSON files.
+"""
+
+# Sent by MoviesPipeline after writing the movies JSON file. Arguments:
+# records - callable returning a fresh iterator over the movie records
+#           sorted by position, streamed from disk; people are named,
+#           or given by key when called with named=False
+# spider  - the spider
+movies_finalized = object()
+
+# Sent by ActorStatsPipeline after writing the actors JSON file.
+# Arguments:
+# actors - list of actor analysis records
+# spider - the spider
+actors_finalized = object()
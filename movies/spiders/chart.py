@@ -0,0 +1,141 @@
+import os
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from scrapy.http import Response
+from scrapy.utils.job import job_dir
+
+from movies.extractors import extract_chart, extract_next_page
+from movies.instrumentation import timings
+from movies.spiders.top250 import Top250Spider
+
+# Meta of a chart page carried to the next one; the rest, such as
+# retry_times or redirect_urls, belongs to the page's own download
+PAGE_META_KEYS = ("page_type", "wait_for", "wait_timeout")
+
+
+class ChartSpider(Top250Spider):
+    """
+    Spider for any IMDb chart or title list, paginated or not, scraped
+    with the same movie and cast parsing as Top250Spider:
+
+        scrapy crawl chart -a url=https://www.imdb.com/chart/moviemeter/
+        scrapy crawl chart -a url=https://www.imdb.com/list/ls055592025/ \
+            -a page_param=page -s JOBDIR=jobs/ls055592025
+
+    Pages are followed through their "next" link or, with page_param,
+    by incrementing that query parameter until a page lists no movies
+    (max_pages bounds it). Movies are numbered in list order.
+
+    Chart pages are requested one at a time, after the movies of the
+    previous page, so memory stays bounded however long the list is.
+    With a JOBDIR the pending requests are kept on disk, completed
+    movies are checkpointed in the JOBDIR, and the crawl can be stopped
+    and resumed. As a coordinator it publishes the movies of every page
+    to the work queue instead.
+    """
+    name = "chart"
+
+    modes = ("full",)
+
+    def __init__(self, *args, url=None, page_param=None, max_pages=None,
+                 **kwargs):
+        super(ChartSpider, self).__init__(*args, **kwargs)
+        if not url:
+            raise ValueError("The chart spider needs a url argument")
+        self.chart_url = url
+        self.page_param = page_param
+        self.max_pages = int(max_pages) if max_pages else None
+        self.completed = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(ChartSpider, cls).from_crawler(
+            crawler, *args, **kwargs
+        )
+        spider.start_urls = [spider.chart_url]
+        return spider
+
+    @classmethod
+    def checkpoint_path(cls, settings):
+        """
+        Checkpoints are kept per job, as positions only make sense within
+        one list; without a JOBDIR there is no checkpoint.
+        """
+        directory = job_dir(settings)
+        if not directory:
+            return None
+        return os.path.join(directory, "checkpoint.sqlite")
+
+    def parse(self, response: Response, **kwargs) -> None:
+        """
+        Parses a page of the list, requests its movies and then the next
+        page.
+        """
+        with timings.stage("parse/chart"):
+            entries = extract_chart(response)
+        page = response.meta.get('page', 1)
+        # Later pages are fetched the way the first one could be parsed,
+        # and an empty one is the end of the list
+        if not entries and page == 1 and not self.is_rendered(response):
+            yield self.render_fallback(response)
+            return
+
+        offset = response.meta.get('offset', 0)
+        self.custom_logger.info(
+            "Page %d: %d movies parsed", page, len(entries),
+            extra=self.log_fields(response, "parse/chart"),
+        )
+
+        if self.completed is None:
+            self.completed = (
+                self.checkpoint.completed_urls()
+                if self.checkpoint is not None else set()
+            )
+
+        jobs = []
+        for index, entry in enumerate(entries):
+            if entry["url"] in self.completed:
+                continue
+            position = offset + index + 1
+            cached = self.cached_movie(entry, position)
+            if cached is not None:
+                yield cached
+            elif self.work_queue is not None:
+                jobs.append({"url": entry["url"], "position": position})
+            else:
+                yield self.title_request(entry["url"], position=position)
+
+        next_url = self.next_page_url(response, page)
+        last = not (
+            entries and next_url and
+            (self.max_pages is None or page < self.max_pages)
+        )
+        if self.work_queue is not None:
+            self.publish(jobs, self.completed, last=last)
+        if not last:
+            yield response.request.replace(
+                url=next_url,
+                meta={
+                    **{
+                        key: response.meta[key]
+                        for key in PAGE_META_KEYS if key in response.meta
+                    },
+                    'render': self.is_rendered(response),
+                    'page': page + 1,
+                    'offset': offset + len(entries),
+                },
+            )
+
+    def next_page_url(self, response: Response, page: int):
+        """
+        Returns the URL of the page after the given one, or None.
+        """
+        if not self.page_param:
+            return extract_next_page(response)
+        parts = urlsplit(response.request.url)
+        query = [
+            (key, value) for key, value in parse_qsl(parts.query)
+            if key != self.page_param
+        ]
+        query.append((self.page_param, str(page + 1)))
+        return urlunsplit(parts._replace(query=urlencode(query)))
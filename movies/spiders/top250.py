@@ -1,18 +1,39 @@
-import json
+import os
+import socket
+
 import scrapy
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
 from scrapy.http import Response
+from twisted.internet import task
 from selenium.common import TimeoutException
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from decouple import config
 
 from logger import setup_logger
-from ..chrome_driver import ChromeDriver
-from movies.google_sheets import GoogleSheetsHandler
-
-MOVIES_JSON_PATH = config("MOVIES_JSON_PATH")
-ACTORS_JSON_PATH = config("ACTORS_JSON_PATH")
+from movies.checkpoint import CheckpointStore
+from movies.extractors import (
+    extract_cast,
+    extract_chart,
+    extract_movie,
+    title_id,
+)
+from movies.instrumentation import timings
+from movies.items import MoviesItem
+from movies.people import PersonTable
+from movies.pipelines import read_jsonl
+from movies.title_cache import TitleCache
+from movies.work_queue import open_work_queue
+
+MOVIES_JSONL_PATH = config("MOVIES_JSONL_PATH", default="movies.jsonl")
+PEOPLE_JSONL_PATH = config("PEOPLE_JSONL_PATH", default="people.jsonl")
+SPIDER_LOG_PATH = config("SPIDER_LOG_PATH", default="top250.log")
+
+# Title cache fields a movie item is built from, besides the rating
+CACHED_MOVIE_FIELDS = ("title", "original_title", "year", "directors", "cast")
+CACHED_CAST_FIELDS = ("directors", "cast")
+
+# Worker results a coordinator turns into items per results request
+RESULTS_PER_REQUEST = 500
 
 
 class Top250Spider(scrapy.Spider):
@@ -24,224 +45,662 @@ class Top250Spider(scrapy.Spider):
     allowed_domains = ["www.imdb.com"]
     start_urls = ["https://www.imdb.com/chart/top/?ref_=nv_mv_250"]
 
-    def __init__(self, *args, **kwargs):
+    modes = ("full", "delta")
+    roles = ("coordinator", "worker")
+
+    def __init__(self, *args, mode="full", role=None, worker_id=None,
+                 **kwargs):
         super(Top250Spider, self).__init__(*args, **kwargs)
-        self.driver = ChromeDriver()
+        if mode not in self.modes:
+            raise ValueError(
+                f"Unknown mode {mode!r}, expected one of {self.modes}"
+            )
+        if role is not None and role not in self.roles:
+            raise ValueError(
+                f"Unknown role {role!r}, expected one of {self.roles}"
+            )
+        self.mode = mode
+        # Sharded crawls: the coordinator publishes the movies to the work
+        # queue and collects the workers' results
+        self.role = role
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.work_queue = None
+        self.work_batch_size = 16
+        self.poll_interval = 1.0
+        self.publishing = False
+        self.leased_urls = set()  # Worker jobs not completed yet
+        self.results_poll = None
+        self.collecting = False
         self.movies_urls = []  # List to store movie URLs
-        self.movies_data = []  # List to store movie data
-        self.custom_logger = setup_logger(self.name, "top250.log")
+        self.checkpoint = None
+        self.title_cache = None
+        # Pages not requested because the title cache had them, by type
+        self.cache_skipped = {"title": 0, "fullcredits": 0}
+        self.people = PersonTable()  # Everyone credited, by IMDb ID
+        self.previous_movies = {}  # Last run's movie records, by position
+        self.render_title_pages = True
+        self.custom_logger = setup_logger(self.name, SPIDER_LOG_PATH)
         self.custom_logger.info("Processing top 250 movies")
 
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(Top250Spider, cls).from_crawler(
+            crawler, *args, **kwargs
+        )
+        checkpoint_path = cls.checkpoint_path(crawler.settings)
+        # A worker's jobs are tracked by the work queue
+        if checkpoint_path and spider.role != "worker":
+            spider.checkpoint = CheckpointStore(checkpoint_path)
+        title_cache_path = crawler.settings.get("TITLE_CACHE_PATH")
+        if title_cache_path:
+            spider.title_cache = TitleCache(
+                title_cache_path,
+                ttls=crawler.settings.getdict("TITLE_CACHE_TTLS"),
+                max_entries=crawler.settings.getint(
+                    "TITLE_CACHE_MAX_ENTRIES", 50000
+                ),
+            )
+            spider.custom_logger.info(
+                f"Title cache enabled ({title_cache_path}, "
+                f"{len(spider.title_cache)} titles): pages of movies with "
+                f"fresh cached data are not requested"
+            )
+        if spider.mode == "delta" and spider.role != "worker":
+            # Before the pipelines open, and truncate, the output files
+            spider.load_previous_run()
+        if spider.role is not None:
+            queue_url = crawler.settings.get("WORK_QUEUE_URL")
+            if not queue_url:
+                raise ValueError(
+                    f"The {spider.role} role needs a WORK_QUEUE_URL setting"
+                )
+            spider.work_queue = open_work_queue(
+                queue_url, spider.name,
+                lease_seconds=crawler.settings.getfloat(
+                    "WORK_QUEUE_LEASE_SECONDS", 300
+                ),
+                max_attempts=crawler.settings.getint(
+                    "WORK_QUEUE_MAX_ATTEMPTS", 3
+                ),
+            )
+            spider.work_batch_size = crawler.settings.getint(
+                "WORK_QUEUE_BATCH_SIZE", 16
+            )
+            spider.poll_interval = crawler.settings.getfloat(
+                "WORK_QUEUE_POLL_INTERVAL", 1.0
+            )
+            crawler.signals.connect(
+                spider.spider_idle, signal=signals.spider_idle
+            )
+        spider.render_title_pages = crawler.settings.getbool(
+            "RENDER_TITLE_PAGES", True
+        )
+        # Allow pointing the spider at a stand-in server, e.g. benchmarks
+        spider.start_urls = crawler.settings.getlist(
+            "TOP250_START_URLS", cls.start_urls
+        )
+        spider.allowed_domains = crawler.settings.getlist(
+            "TOP250_ALLOWED_DOMAINS", cls.allowed_domains
+        )
+        return spider
+
+    @classmethod
+    def checkpoint_path(cls, settings):
+        return settings.get("CHECKPOINT_PATH")
+
     def close(self, reason):
         """
-        Closes the WebDriver, sorts movie data, saves it to JSON, and
-        uploads it to Google Sheets.
+        A finished crawl clears the checkpoint, so the next run starts
+        over. The data itself is exported by the item pipelines and
+        SheetsExporter.
         """
-        self.driver.quit()
-        self.movies_data.sort(key=lambda x: x['Position in rating'])
         self.custom_logger.info("Top 250 movies processed")
 
-        # Save data to JSON files
-        with open(MOVIES_JSON_PATH, 'w', encoding='utf-8') as f:
-            json.dump(self.movies_data, f, ensure_ascii=False, indent=4)
-
-        # Process data for actor analysis
-        actors = self.process_actors_analysis()
-        with open(ACTORS_JSON_PATH, 'w', encoding='utf-8') as f:
-            json.dump(actors, f, ensure_ascii=False, indent=4)
-
-        # Upload data to Google Sheets
-        creds_file = config("CREDENTIALS_FILE_PATH")
-        spreadsheet_id = config("GOOGLE_SHEET_ID")
-        sheets_handler = GoogleSheetsHandler(creds_file, spreadsheet_id)
+        if self.checkpoint is not None:
+            if reason == "finished":
+                self.checkpoint.clear()
+            self.checkpoint.close()
+
+        if self.results_poll is not None and self.results_poll.running:
+            self.results_poll.stop()
+        if self.work_queue is not None:
+            if self.role == "worker":
+                # Jobs not started yet go back to the other workers
+                self.work_queue.release(self.worker_id)
+            self.work_queue.close()
+
+        if self.title_cache is not None:
+            for name, value in self.title_cache.stats().items():
+                self.crawler.stats.set_value(f"title_cache/{name}", value)
+            for page_type, skipped in self.cache_skipped.items():
+                self.crawler.stats.set_value(
+                    f"title_cache/skipped/{page_type}", skipped
+                )
+            self.custom_logger.info(
+                f"Title cache: skipped {self.cache_skipped['title']} title "
+                f"pages and {self.cache_skipped['fullcredits']} cast pages"
+            )
+            self.title_cache.close()
 
-        self.custom_logger.info("Uploading data to Google Sheets")
-        sheets_handler.save_movies_data(MOVIES_JSON_PATH)
-        sheets_handler.save_actor_analysis(ACTORS_JSON_PATH)
-        self.custom_logger.info("Data uploaded successfully")
+    def start_requests(self):
+        """
+        Requests the chart page as static HTML. It is rendered in a
+        browser only if the static parse finds no movies. Workers start
+        with a batch of jobs from the work queue instead.
+        """
+        if self.role == "worker":
+            yield from self.lease_jobs()
+            return
+        for url in self.start_urls:
+            yield scrapy.Request(
+                url=url,
+                callback=self.parse,
+                errback=self.handle_error,
+                meta={
+                    'page_type': "chart",
+                    'render': False,
+                    'wait_for': ".ipc-metadata-list",
+                    'wait_timeout': 10,
+                }
+            )
 
     def parse(self, response: Response, **kwargs) -> None:
         """
         Parses the main IMDb Top 250 page and collects URLs of the
-        individual movie pages.
+        individual movie pages. In delta mode, movies whose chart entry
+        is unchanged since the last run are carried forward instead.
         """
-        self.driver.get(response.url)
-        WebDriverWait(self.driver, 10).until(
-            EC.presence_of_all_elements_located(
-                (By.CSS_SELECTOR, ".ipc-metadata-list")
-            )
+        with timings.stage("parse/chart"):
+            entries = extract_chart(response)
+        if not entries and not self.is_rendered(response):
+            yield self.render_fallback(response)
+            return
+
+        self.custom_logger.info(
+            f"{len(entries)} movies parsed",
+            extra=self.log_fields(response, "parse/chart"),
         )
 
-        movies = self.driver.find_elements(
-            By.CSS_SELECTOR, ".ipc-metadata-list li"
+        completed = (
+            self.checkpoint.completed_urls()
+            if self.checkpoint is not None else set()
         )
-        self.custom_logger.info(f"{len(movies)} movies parsed")
-
-        for movie in movies:
-            detail_page_url = movie.find_element(
-                By.CSS_SELECTOR, ".ipc-title-link-wrapper"
-            ).get_attribute("href")
-            self.movies_urls.append(detail_page_url)
-
-        # Trigger the batch processing of movie URLs
-        for url in self.movies_urls:  # Adjust the range as needed
-            yield scrapy.Request(
-                url=url,
-                callback=self.parse_movie_info
+        if completed:
+            self.custom_logger.info(
+                f"Resuming: {len(completed)} movies already completed"
             )
 
-    def parse_movie_info(self, response: Response) -> None:
-        """
-        Parses individual movie pages and extracts detailed information.
-        """
-        try:
-            self.driver.get(response.url)
-            WebDriverWait(self.driver, 3).until(
-                EC.presence_of_element_located(
-                    (By.CSS_SELECTOR, ".sc-ec65ba05-0 > .hero__primary-text")
+        unchanged = {}
+        if self.mode == "delta":
+            unchanged = self.unchanged_movies(entries)
+
+        jobs = []
+        for entry in entries:
+            if entry["url"] in completed:
+                continue
+            previous = unchanged.get(entry["position"])
+            if previous is not None:
+                yield self.carry_forward(previous, entry)
+                continue
+            cached = self.cached_movie(entry, entry["position"])
+            if cached is not None:
+                yield cached
+            else:
+                self.movies_urls.append(entry["url"])
+                jobs.append(
+                    {"url": entry["url"], "position": entry["position"]}
                 )
+
+        if self.mode == "delta":
+            self.custom_logger.info(
+                f"Delta: {len(unchanged)} movies unchanged, "
+                f"{len(self.movies_urls)} to scrape"
             )
 
-            position = self.driver.find_element(
-                By.CSS_SELECTOR, ".sc-15ed0f38-1 > a"
-            ).text.split('#')[1].strip()
+        if self.work_queue is not None:
+            self.publish(jobs, completed, last=True)
+            return
 
-            title = self.driver.find_element(
-                By.CSS_SELECTOR, ".sc-ec65ba05-0 > .hero__primary-text"
-            ).text
+        # Trigger the batch processing of movie URLs
+        for url in self.movies_urls:
+            yield self.title_request(url)
 
-            try:
-                orig_title = self.driver.find_element(
-                    By.CSS_SELECTOR, ".sc-ec65ba05-1"
-                ).text.replace("Original title: ", "")
+    def cached_movie(self, entry: dict, position: int):
+        """
+        Builds the item of a chart entry from the title cache when all
+        its fields are fresh there, so neither of its pages is requested.
+        The chart's rating is used when the chart has one.
+        """
+        if self.title_cache is None:
+            return None
+        fields = CACHED_MOVIE_FIELDS
+        if entry["rating"] is None:
+            fields += ("rating",)
+        movie = self.title_cache.get(entry["id"], fields)
+        if movie is None:
+            return None
+        directors = self.cached_people(movie["directors"])
+        cast = self.cached_people(movie["cast"])
+        if directors is None or cast is None:
+            return None
+        self.cache_skipped["title"] += 1
+        self.cache_skipped["fullcredits"] += 1
+        return MoviesItem(
+            position=position,
+            title=movie["title"],
+            original_title=movie["original_title"],
+            year=movie["year"],
+            rating=movie.get("rating", entry["rating"]),
+            directors=directors,
+            cast=cast,
+            url=entry["url"],
+        )
 
-            except Exception:
-                self.custom_logger.warning(
-                    f"Error retrieving original title for movie: {title}")
-                orig_title = title
+    def cached_people(self, pairs):
+        """
+        Registers the people of cached credits, stored as ``[key, name]``
+        pairs, and returns their keys. None for credits cached by name
+        only, before people were keyed by IMDb ID.
+        """
+        if not all(
+                isinstance(pair, list) and len(pair) == 2 for pair in pairs
+        ):
+            return None
+        return [self.people.restore(key, name) for key, name in pairs]
 
-            rating = response.css(".sc-eb51e184-1::text").get()
+    def people_keys(self, people) -> list:
+        """
+        Registers extracted ``(IMDb ID, name)`` people and returns their
+        keys.
+        """
+        return [self.people.add(person_id, name) for person_id, name in people]
 
-            year = self.driver.find_elements(
-                By.CSS_SELECTOR, ".sc-ec65ba05-2 > li >.ipc-link"
-            )[0].text
+    def title_request(self, url: str, **meta) -> scrapy.Request:
+        """
+        Builds the request of a movie page. Movie pages, and then their
+        cast pages, go before chart pages, so the scheduler holds about
+        one chart page worth of movies at a time.
+        """
+        return scrapy.Request(
+            url=url,
+            callback=self.parse_movie_info,
+            errback=self.handle_error,
+            priority=1,
+            # The work queue deduplicates the jobs of workers, which may
+            # be leased the same job again after a failure
+            dont_filter=self.role == "worker",
+            meta={
+                'movie_url': url,
+                'page_type': "title",
+                'render': self.render_title_pages,
+                'wait_for': (
+                    '[data-testid="hero__pageTitle"]'
+                    ' > .hero__primary-text'
+                ),
+                'wait_timeout': 3,
+                **meta,
+            }
+        )
 
-            cast_list_url = self.driver.find_element(
-                By.CSS_SELECTOR, ".sc-4cf2da2d-0 > li > a"
-            ).get_attribute("href")
+    def parse_movie_info(self, response: Response) -> None:
+        """
+        Parses individual movie pages and extracts detailed information.
+        """
+        try:
+            with timings.stage("parse/title"):
+                movie = extract_movie(response)
+            # Set by chart spiders listing movies outside the Top 250
+            if response.meta.get('position') is not None:
+                movie["position"] = response.meta['position']
+            fields = self.log_fields(
+                response, "parse/title", movie["position"]
+            )
+            if movie["position"] is None:
+                self.custom_logger.error(
+                    f"No chart position for movie: {response.url}",
+                    extra=fields,
+                )
+                return
+            if movie["orig_title_missing"]:
+                self.custom_logger.warning(
+                    "Error retrieving original title for movie: "
+                    f"{movie['title']}",
+                    extra=fields,
+                )
 
             self.custom_logger.info(
-                f"Processing movie: {position} - {orig_title}"
+                f"Processing movie: {movie['position']} - "
+                f"{movie['orig_title']}",
+                extra=fields,
             )
 
+            movie_url = response.meta.get('movie_url', response.url)
+            imdb_id = title_id(movie_url)
+            credits = None
+            if self.title_cache is not None and imdb_id:
+                self.title_cache.put(imdb_id, {
+                    "title": movie["title"],
+                    "original_title": movie["orig_title"],
+                    "year": movie["year"],
+                    "rating": movie["rating"],
+                })
+                credits = self.title_cache.get(imdb_id, CACHED_CAST_FIELDS)
+            if credits is not None:
+                directors = self.cached_people(credits["directors"])
+                cast = self.cached_people(credits["cast"])
+                if directors is not None and cast is not None:
+                    # Credits are cached and fresh: skip the cast page
+                    self.cache_skipped["fullcredits"] += 1
+                    yield MoviesItem(
+                        position=movie["position"],
+                        title=movie["title"],
+                        original_title=movie["orig_title"],
+                        year=movie["year"],
+                        rating=movie["rating"],
+                        directors=directors,
+                        cast=cast,
+                        url=movie_url,
+                    )
+                    return
+
             yield scrapy.Request(
-                url=cast_list_url,
+                url=movie["cast_url"],
                 callback=self.parse_cast,
+                errback=self.handle_error,
+                priority=2,
+                dont_filter=self.role == "worker",
                 meta={
-                    'position': int(position),
-                    'title': title,
-                    'orig_title': orig_title,
-                    'rating': float(rating),
-                    'year': int(year),
+                    'movie_url': movie_url,
+                    'position': movie["position"],
+                    'title': movie["title"],
+                    'orig_title': movie["orig_title"],
+                    'rating': movie["rating"],
+                    'year': movie["year"],
+                    'page_type': "fullcredits",
+                    'render': False,
+                    'wait_for': 'td.castlist_label',
+                    'wait_timeout': 5,
                 }
             )
 
-        except TimeoutException as e:
-            self.custom_logger.warning(
-                f"Timeout while waiting for movie on {response.url}: {e}")
         except Exception as e:
-            self.custom_logger.error(f"Error processing movie: {e}")
+            self.custom_logger.error(
+                f"Error processing movie: {e}",
+                extra=self.log_fields(response, "parse/title"),
+            )
 
     def parse_cast(self, response: Response) -> None:
         """
         Parses the cast list of a movie and extracts actor and director
-        information.
+        information. The page is server-rendered, so it is parsed as
+        static HTML and rendered in a browser only if nothing is found.
         """
         try:
-            self.driver.get(response.url)
-            WebDriverWait(self.driver, 5).until(
-                EC.presence_of_element_located(
-                    (By.CSS_SELECTOR, 'td.castlist_label')
-                )
-            )
+            with timings.stage("parse/cast"):
+                actors, directors = extract_cast(response)
+            if not (actors or directors) and not self.is_rendered(response):
+                yield self.render_fallback(response)
+                return
 
             self.custom_logger.info(
                 f"Processing cast: {response.meta['position']} - "
-                f"{response.meta['orig_title']}"
+                f"{response.meta['orig_title']}",
+                extra=self.log_fields(response, "parse/cast"),
             )
 
-            actors_rows = self.driver.find_elements(
-                By.CSS_SELECTOR, 'table.cast_list tr'
+            directors = self.people_keys(directors)
+            actors = self.people_keys(actors)
+            imdb_id = title_id(response.meta.get('movie_url'))
+            if self.title_cache is not None and imdb_id:
+                self.title_cache.put(imdb_id, {
+                    "directors": self.people.pairs(directors),
+                    "cast": self.people.pairs(actors),
+                })
+
+            yield MoviesItem(
+                position=response.meta['position'],
+                title=response.meta['title'],
+                original_title=response.meta['orig_title'],
+                year=response.meta['year'],
+                rating=response.meta['rating'],
+                directors=directors,
+                cast=actors,
+                url=response.meta.get('movie_url'),
             )
-            directors_rows = self.driver.find_elements(
-                By.CSS_SELECTOR, "#director + table > tbody > tr > .name > a"
+
+        except Exception as e:
+            self.custom_logger.error(
+                f"Error processing cast: {e}",
+                extra=self.log_fields(response, "parse/cast"),
             )
 
-            actors = []
+    def load_previous_run(self) -> None:
+        """
+        Reads the movie records and people of the last run from the JSON
+        lines files, keeping the records by IMDb title ID. Records without
+        one, or with people given by name, written by older versions, are
+        left out and scraped again.
+        """
+        if not (
+                os.path.exists(MOVIES_JSONL_PATH) and
+                os.path.exists(PEOPLE_JSONL_PATH)
+        ):
+            return
+        self.people.load(read_jsonl(PEOPLE_JSONL_PATH))
+        for record in read_jsonl(MOVIES_JSONL_PATH):
+            imdb_id = record.get(MoviesItem.id_key)
+            keys = record["Director(s)"] + record["Cast"]
+            if imdb_id and all(key in self.people for key in keys):
+                self.previous_movies[imdb_id] = record
+
+    def unchanged_movies(self, entries) -> dict:
+        """
+        Returns the previous movie records, by position, of the chart
+        entries whose movie was last scraped at the same position with the
+        same rating. Records are matched by IMDb title ID, so the movies
+        file of another spider, or of a run against another chart, never
+        carries a different movie forward.
+        """
+        if not self.previous_movies:
+            self.custom_logger.info("Delta: no previous run, scraping all")
+            return {}
+
+        unchanged = {}
+        for entry in entries:
+            movie = self.previous_movies.get(entry["id"])
+            if (
+                    movie is not None and entry["rating"] is not None and
+                    movie["Position in rating"] == entry["position"] and
+                    movie["Rating"] == entry["rating"]
+            ):
+                unchanged[entry["position"]] = movie
+        return unchanged
+
+    @staticmethod
+    def carry_forward(movie: dict, entry: dict) -> MoviesItem:
+        """
+        Builds the item of an unchanged movie from its previous record.
+        """
+        return MoviesItem.from_record(movie, url=entry["url"])
+
+    def publish(self, jobs, completed, last: bool) -> None:
+        """
+        Publishes movie jobs to the work queue, for the workers, instead
+        of requesting them. The queue is started afresh unless the crawl
+        resumes; then the results taken but not checkpointed before the
+        interruption are collected again.
+        """
+        if not self.publishing:
+            self.publishing = True
+            if completed:
+                self.work_queue.requeue_results(completed)
+            else:
+                self.work_queue.reset()
+            self.results_poll = task.LoopingCall(self.poll_results)
+            self.results_poll.start(self.poll_interval, now=False)
+        self.work_queue.publish(jobs)
+        self.custom_logger.info(f"Published {len(jobs)} movie jobs")
+        if last:
+            self.work_queue.mark_published()
+
+    def lease_jobs(self) -> list:
+        """
+        Leases a batch of movie jobs from the work queue and returns the
+        requests of their movie pages.
+        """
+        jobs = self.work_queue.lease(self.worker_id, self.work_batch_size)
+        self.leased_urls.update(job["url"] for job in jobs)
+        return [
+            self.title_request(job["url"], position=job["position"])
+            for job in jobs
+        ]
+
+    def job_completed(self, url: str) -> None:
+        """
+        Leases the next batch of jobs once half of a worker's jobs are
+        completed, so its downloads never wait for the spider to idle.
+        """
+        self.leased_urls.discard(url)
+        if len(self.leased_urls) <= self.work_batch_size // 2:
+            for request in self.lease_jobs():
+                self.crawler.engine.crawl(request)
+
+    def poll_results(self) -> None:
+        """
+        Schedules the collection of the worker results that came in, every
+        WORK_QUEUE_POLL_INTERVAL seconds while the coordinator runs.
+        """
+        if not self.collecting and self.work_queue.counts()["done"]:
+            self.collecting = True
+            self.crawler.engine.crawl(self.results_request())
 
-            for row in actors_rows:
-                label = row.find_elements(By.CSS_SELECTOR, 'td.castlist_label')
-                if (
-                        label and
-                        "Rest of cast listed alphabetically:" in label[0].text
-                ):
-                    break
-                actor_name = row.find_elements(
-                    By.CSS_SELECTOR, 'td:nth-child(2) a'
-                )
-                if actor_name:
-                    actors.append(actor_name[0].text.strip())
-
-            directors = [row.text.strip() for row in directors_rows]
-
-            movie_data = {
-                "Position in rating": response.meta['position'],
-                "Title": response.meta['title'],
-                "Original title": response.meta['orig_title'],
-                "Year": response.meta['year'],
-                "Rating": response.meta['rating'],
-                "Director(s)": directors,
-                "Cast": actors
-            }
+    def results_request(self) -> scrapy.Request:
+        """
+        Builds a request whose callback turns the results of the workers
+        into items, so they go through the item pipelines like any other
+        movie. A ``data:`` URL needs no network.
+        """
+        return scrapy.Request(
+            "data:,",
+            callback=self.collect_results,
+            dont_filter=True,
+            meta={'dont_cache': True, 'render': False},
+        )
 
-            self.movies_data.append(movie_data)
+    def collect_results(self, response: Response):
+        """
+        Yields the items of the worker results not collected yet. The
+        keys of people without an IMDb ID are worker-local and renumbered.
+        """
+        try:
+            results = self.work_queue.take_results(RESULTS_PER_REQUEST)
+        finally:
+            self.collecting = False
+        for result in results:
+            keys = {
+                key: self.people.restore(key, name)
+                for key, name in result["people"]
+            }
+            record = result["record"]
+            yield MoviesItem.from_record(
+                record,
+                directors=[keys[key] for key in record["Director(s)"]],
+                cast=[keys[key] for key in record["Cast"]],
+                url=result["url"],
+            )
 
-        except TimeoutException as e:
+    def spider_idle(self, spider):
+        """
+        Keeps sharded crawls open until the work queue is drained. An idle
+        worker fails the jobs it holds, which yielded no movie, and leases
+        more; an idle coordinator collects the results that came in.
+        """
+        if spider is not self:
+            return
+        if self.role == "worker":
+            self.work_queue.release(self.worker_id, failed=True)
+            self.leased_urls.clear()
+            requests = self.lease_jobs()
+            for request in requests:
+                self.crawler.engine.crawl(request)
+            if requests or not self.queue_drained():
+                raise DontCloseSpider
+            return
+
+        if not self.publishing:
+            return  # The chart gave no movies
+        self.poll_results()
+        if self.collecting or not self.queue_drained():
+            raise DontCloseSpider
+        counts = self.work_queue.counts()
+        if counts["failed"]:
             self.custom_logger.warning(
-                f"Timeout while waiting for cast on {response.url}: {e}")
-        except Exception as e:
-            self.custom_logger.error(f"Error processing cast: {e}")
-
-    def process_actors_analysis(self):
-        """
-        Processes the collected movie data to analyze actor appearances
-        and average ratings.
-        """
-        actor_counts = {}
-        for movie in self.movies_data:
-            for actor in movie.get("Cast", []):
-                if actor not in actor_counts:
-                    actor_counts[actor] = {
-                        "Movies Count": 0,
-                        "Total Rating": 0,
-                        "Movies": []
-                    }
-                actor_counts[actor]["Movies Count"] += 1
-                actor_counts[actor]["Total Rating"] += movie.get("Rating", 0)
-                actor_counts[actor]["Movies"].append(movie["Original title"])
-
-        # Calculate average rating for each actor
-        actors_analysis = []
-        for actor, data in actor_counts.items():
-            if data["Movies Count"] > 1:  # Exclude actors with only one movie
-                average_rating = round(
-                    data["Total Rating"] / data["Movies Count"], 2
-                )
-                actors_analysis.append({
-                    "Actor": actor,
-                    "Movies Count": data["Movies Count"],
-                    "Average Rating": average_rating,
-                    "Movies": data["Movies"]
-                })
+                f"{counts['failed']} movie jobs failed on every attempt"
+            )
+
+    def queue_drained(self) -> bool:
+        """
+        Tells whether every published job has been completed or failed.
+        """
+        counts = self.work_queue.counts()
+        return (
+            self.work_queue.published() and
+            not counts["pending"] and not counts["leased"]
+        )
+
+    @staticmethod
+    def log_fields(page, stage: str, position=None) -> dict:
+        """
+        Returns the fields of a log line about a request or response, for
+        the ``extra`` of the logging call. Info lines with a stage are
+        sampled when they come in fast.
+        """
+        if position is None:
+            position = page.meta.get('position')
+        return {"position": position, "url": page.url, "stage": stage}
+
+    @staticmethod
+    def is_rendered(response: Response) -> bool:
+        """
+        Tells whether the response is a browser-rendered DOM.
+        """
+        return "rendered" in response.flags
+
+    def render_fallback(self, response: Response) -> scrapy.Request:
+        """
+        Repeats the request of a static page that gave no data, this time
+        rendered in a browser.
+        """
+        self.custom_logger.warning(
+            f"Nothing found in static HTML of {response.url}, rendering it",
+            extra=self.log_fields(response, "render_fallback"),
+        )
+        self.crawler.stats.inc_value(
+            f"pages/{response.meta.get('page_type')}/render_fallback"
+        )
+        return response.request.replace(
+            dont_filter=True,
+            meta={**response.meta, 'render': True},
+        )
 
-        return actors_analysis
+    def handle_error(self, failure) -> None:
+        """
+        Logs requests that failed to download or render.
+        """
+        request = failure.request
+        page_type = request.meta.get('page_type', 'other')
+        timings.incr(f"errors/{page_type}")
+        fields = self.log_fields(request, f"download/{page_type}")
+        if failure.check(TimeoutException):
+            timings.incr(f"timeouts/{page_type}")
+            page = "cast" if request.callback == self.parse_cast else "movie"
+            self.custom_logger.warning(
+                f"Timeout while waiting for {page} on {request.url}: "
+                f"{failure.value}",
+                extra=fields,
+            )
+        else:
+            self.custom_logger.error(
+                f"Error loading {request.url}: {failure.value}",
+                extra=fields,
+            )
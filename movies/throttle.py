@@ -0,0 +1,148 @@
+from collections import deque
+
+from twisted.internet import defer
+
+
+class AIMDThrottle:
+    """
+    Concurrency and delay of one page type, adjusted from how its
+    requests fare, additive increase / multiplicative decrease style.
+
+    A success raises the concurrency: by one per response until the
+    first backoff (slow start), then by ``increase`` per window of
+    ``concurrency`` responses, up to ``max_concurrency``. A response
+    throttled by the site (429, 503), a failed download, a browser
+    timeout or a latency above ``latency_factor`` times the usual one
+    backs off: the
+    concurrency is multiplied by ``decrease`` and the delay between
+    requests doubles, to ``delay_step`` at least and ``max_delay`` at
+    most, so that retries do not run straight into the congestion again.
+    Every success takes ``delay_step`` off the delay, and the concurrency
+    grows again once the delay is back to ``min_delay``.
+
+    Every backoff starts a new epoch; the requests sent before it report
+    the congestion it already answered, so they do not back off again.
+    """
+
+    def __init__(self, start_concurrency=2, max_concurrency=16,
+                 min_delay=0.0, max_delay=60.0, delay_step=0.25,
+                 increase=0.25, decrease=0.5, latency_factor=3.0,
+                 smoothing=0.2):
+        self.concurrency = float(start_concurrency)
+        self.max_concurrency = max_concurrency
+        self.increase = increase
+        self.delay = min_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay_step = delay_step
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.smoothing = smoothing
+        self.slow_start = True
+        self.epoch = 0
+        self.latency = None  # Smoothed latency of the successes
+        self.baseline = None  # Lowest smoothed latency so far
+        self.backoffs = 0
+        self.peak = self.slots
+
+    @property
+    def slots(self) -> int:
+        """
+        Requests allowed in flight at once.
+        """
+        return max(1, int(self.concurrency))
+
+    def success(self, latency, epoch: int) -> None:
+        """
+        Records a response the site served normally, after ``latency``
+        seconds (None when unknown), to a request sent in ``epoch``.
+        """
+        if latency is not None:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.smoothing * (latency - self.latency)
+            if self.baseline is None or self.latency < self.baseline:
+                self.baseline = self.latency
+            if latency > self.baseline * self.latency_factor:
+                self.backoff(epoch)
+                return
+
+        if self.delay > self.min_delay:
+            self.delay = max(self.min_delay, self.delay - self.delay_step)
+        elif self.slow_start:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+        else:
+            self.concurrency = min(
+                self.max_concurrency,
+                self.concurrency + self.increase / self.concurrency,
+            )
+        self.peak = max(self.peak, self.slots)
+
+    def backoff(self, epoch: int, retry_after=None) -> bool:
+        """
+        Slows the page type down after a sign of congestion on a request
+        sent in ``epoch``; a ``retry_after`` given by the site is the
+        least delay. Returns whether it slowed down.
+        """
+        if epoch < self.epoch:
+            return False
+        self.epoch += 1
+        self.backoffs += 1
+        self.slow_start = False
+        self.concurrency = max(1.0, self.concurrency * self.decrease)
+        self.delay = min(self.max_delay, max(self.delay * 2, self.delay_step))
+        if retry_after:
+            self.delay = min(self.max_delay, max(self.delay, retry_after))
+        return True
+
+
+class ThrottleGate:
+    """
+    Admits requests that do not go through Scrapy's downloader slots,
+    such as rendered pages, at most ``throttle.slots`` at a time and
+    ``throttle.delay`` seconds apart, in arrival order.
+    """
+
+    def __init__(self, throttle: AIMDThrottle, clock=None):
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self.throttle = throttle
+        self.clock = clock
+        self.in_flight = 0
+        self.waiting = deque()
+        self.last_start = None
+        self.wakeup = None
+
+    def acquire(self) -> defer.Deferred:
+        """
+        Returns a Deferred firing once the request may start.
+        """
+        deferred = defer.Deferred()
+        self.waiting.append(deferred)
+        self.admit()
+        return deferred
+
+    def release(self) -> None:
+        """
+        Frees the place of a finished request.
+        """
+        self.in_flight -= 1
+        self.admit()
+
+    def admit(self) -> None:
+        while self.waiting and self.in_flight < self.throttle.slots:
+            if self.last_start is not None and self.throttle.delay:
+                wait = self.last_start + self.throttle.delay - \
+                    self.clock.seconds()
+                if wait > 0:
+                    if self.wakeup is None or not self.wakeup.active():
+                        self.wakeup = self.clock.callLater(wait, self.admit)
+                    return
+            self.in_flight += 1
+            self.last_start = self.clock.seconds()
+            self.waiting.popleft().callback(None)
+
+    def close(self) -> None:
+        if self.wakeup is not None and self.wakeup.active():
+            self.wakeup.cancel()
@@ -0,0 +1,139 @@
+import json
+import sqlite3
+import time
+
+DAY = 24 * 60 * 60
+
+# Seconds each field stays fresh: ratings move daily, credits hardly ever
+DEFAULT_TTLS = {
+    "rating": DAY,
+    "title": 90 * DAY,
+    "original_title": 90 * DAY,
+    "year": 365 * DAY,
+    "directors": 90 * DAY,
+    "cast": 90 * DAY,
+}
+
+
+class TitleCache:
+    """
+    Persistent cache of parsed data keyed by IMDb title ID (``tt...``),
+    shared by successive runs and spiders. Credits are stored as
+    ``[person key, name]`` pairs, so people keep their IMDb ID.
+
+    Every field is stored with the time it was scraped and is fresh for
+    its TTL. ``get`` counts a hit only when all requested fields are
+    fresh; otherwise a miss, or "stale" when they are cached but
+    expired. Beyond ``max_entries`` IDs the least recently used ones are
+    evicted when the cache is closed.
+    """
+
+    def __init__(self, path: str, ttls=None, max_entries: int = 50000):
+        self.path = path
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " id TEXT PRIMARY KEY,"
+            " accessed_at REAL"
+            ")"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS fields ("
+            " id TEXT,"
+            " field TEXT,"
+            " value TEXT,"
+            " fetched_at REAL,"
+            " PRIMARY KEY (id, field)"
+            ")"
+        )
+        self.connection.commit()
+
+    def __len__(self) -> int:
+        (count,) = self.connection.execute(
+            "SELECT COUNT(*) FROM entries"
+        ).fetchone()
+        return count
+
+    def get(self, imdb_id: str, fields):
+        """
+        Returns ``{field: value}`` for the given fields of an ID if all of
+        them are cached and fresh, None otherwise.
+        """
+        fields = list(fields)
+        rows = self.connection.execute(
+            "SELECT field, value, fetched_at FROM fields"
+            f" WHERE id = ? AND field IN ({', '.join('?' * len(fields))})",
+            [imdb_id, *fields],
+        ).fetchall()
+        if len(rows) < len(fields):
+            self.misses += 1
+            return None
+
+        now = time.time()
+        if any(
+                now - fetched_at > self.ttls.get(field, 0)
+                for field, _, fetched_at in rows
+        ):
+            self.stale += 1
+            return None
+
+        self.hits += 1
+        with self.connection:
+            self.connection.execute(
+                "UPDATE entries SET accessed_at = ? WHERE id = ?",
+                (now, imdb_id),
+            )
+        return {field: json.loads(value) for field, value, _ in rows}
+
+    def put(self, imdb_id: str, values: dict) -> None:
+        """
+        Stores freshly scraped fields of an ID.
+        """
+        now = time.time()
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?)",
+                (imdb_id, now),
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO fields VALUES (?, ?, ?, ?)",
+                [
+                    (imdb_id, field, json.dumps(value, ensure_ascii=False),
+                     now)
+                    for field, value in values.items()
+                ],
+            )
+
+    def evict(self) -> int:
+        """
+        Deletes the least recently used IDs beyond ``max_entries`` and
+        returns how many were deleted.
+        """
+        with self.connection:
+            deleted = self.connection.execute(
+                "DELETE FROM entries WHERE id IN ("
+                " SELECT id FROM entries ORDER BY accessed_at DESC"
+                " LIMIT -1 OFFSET ?"
+                ")",
+                (self.max_entries,),
+            ).rowcount
+            if deleted:
+                self.connection.execute(
+                    "DELETE FROM fields"
+                    " WHERE id NOT IN (SELECT id FROM entries)"
+                )
+        return deleted
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "stale": self.stale}
+
+    def close(self) -> None:
+        self.evict()
+        self.connection.close()
@@ -0,0 +1,414 @@
+"""
+Shared queue of movie jobs for sharded crawls: a coordinator publishes
+the movies of the chart, any number of workers, on one machine or
+several, lease them in batches and hand back the scraped records, and
+the coordinator collects the records into the output files.
+
+    WORK_QUEUE_URL = "sqlite:///work_queue.sqlite"   # workers on one box
+    WORK_QUEUE_URL = "redis://queue-host:6379/0"     # workers on any box
+
+A lease expires unless its worker completes the job or renews it, so
+the jobs of a worker that dies are leased again by the others. A job
+leased ``max_attempts`` times without a result is given up as failed.
+Both backends behave the same; the Redis one needs the ``redis``
+package.
+"""
+import contextlib
+import json
+import sqlite3
+import time
+from urllib.parse import urlsplit
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+def open_work_queue(url: str, name: str, **kwargs):
+    """
+    Opens the work queue at a ``sqlite:///path`` or ``redis://`` URL.
+    Queues of different names (spiders) sharing a Redis are independent.
+    """
+    scheme = urlsplit(url).scheme
+    if scheme == "sqlite":
+        return SQLiteWorkQueue(url[len("sqlite:///"):], **kwargs)
+    if scheme in ("redis", "rediss", "unix"):
+        if redis is None:
+            raise ImportError("A Redis work queue needs the redis package")
+        return RedisWorkQueue(redis.Redis.from_url(url), name, **kwargs)
+    raise ValueError(f"Unsupported work queue URL {url!r}")
+
+
+class SQLiteWorkQueue:
+    """
+    Work queue in an SQLite file, shared by processes on one machine.
+    Jobs are leased in position order inside an immediate transaction,
+    so two workers never lease the same job.
+    """
+
+    def __init__(self, path: str, lease_seconds=300, max_attempts=3):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.connection = sqlite3.connect(
+            path, timeout=30, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " url TEXT PRIMARY KEY,"
+            " position INTEGER,"
+            " job TEXT,"
+            " state TEXT,"  # pending, leased, done, merged or failed
+            " worker TEXT,"
+            " lease_expires REAL,"
+            " attempts INTEGER DEFAULT 0,"
+            " result TEXT"
+            ")"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS flags (name TEXT PRIMARY KEY)"
+        )
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Runs the block as one immediate transaction, which takes the write
+        lock at once.
+        """
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.connection
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def reset(self) -> None:
+        """
+        Forgets every job and result, for a new crawl.
+        """
+        with self.transaction():
+            self.connection.execute("DELETE FROM jobs")
+            self.connection.execute("DELETE FROM flags")
+
+    def publish(self, jobs) -> None:
+        """
+        Adds jobs (dicts with "url" and "position" keys) as pending.
+        Jobs already known are left as they are.
+        """
+        with self.transaction():
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO jobs (url, position, job, state)"
+                " VALUES (?, ?, ?, 'pending')",
+                [(job["url"], job["position"], json.dumps(job))
+                 for job in jobs],
+            )
+
+    def mark_published(self) -> None:
+        """
+        Tells the workers that all jobs have been published.
+        """
+        with self.transaction():
+            self.connection.execute(
+                "INSERT OR IGNORE INTO flags VALUES ('published')"
+            )
+
+    def published(self) -> bool:
+        return self.connection.execute(
+            "SELECT 1 FROM flags WHERE name = 'published'"
+        ).fetchone() is not None
+
+    def expire_leases(self) -> None:
+        """
+        Returns the jobs of expired leases to the pending ones, or fails
+        them once they have used up their attempts.
+        """
+        with self.transaction():
+            self.connection.execute(
+                "UPDATE jobs SET worker = NULL,"
+                " state = CASE WHEN attempts >= ? THEN 'failed'"
+                " ELSE 'pending' END"
+                " WHERE state = 'leased' AND lease_expires < ?",
+                (self.max_attempts, time.time()),
+            )
+
+    def lease(self, worker: str, limit: int) -> list:
+        """
+        Leases up to ``limit`` pending jobs, lowest positions first.
+        """
+        self.expire_leases()
+        with self.transaction():
+            rows = self.connection.execute(
+                "SELECT url, job FROM jobs WHERE state = 'pending'"
+                " ORDER BY position LIMIT ?",
+                (limit,),
+            ).fetchall()
+            self.connection.executemany(
+                "UPDATE jobs SET state = 'leased', worker = ?,"
+                " lease_expires = ?, attempts = attempts + 1"
+                " WHERE url = ?",
+                [(worker, time.time() + self.lease_seconds, url)
+                 for url, _ in rows],
+            )
+        return [json.loads(job) for _, job in rows]
+
+    def renew(self, worker: str) -> None:
+        """
+        Extends the leases of a worker, which is still busy with them.
+        """
+        with self.transaction():
+            self.connection.execute(
+                "UPDATE jobs SET lease_expires = ?"
+                " WHERE state = 'leased' AND worker = ?",
+                (time.time() + self.lease_seconds, worker),
+            )
+
+    def complete(self, worker: str, url: str, result: dict) -> None:
+        """
+        Stores the result of a job. A result arriving after the lease
+        expired is kept too.
+        """
+        with self.transaction():
+            self.connection.execute(
+                "UPDATE jobs SET state = 'done', result = ?, worker = NULL"
+                " WHERE url = ? AND state IN ('leased', 'pending', 'failed')",
+                (json.dumps(result, ensure_ascii=False), url),
+            )
+
+    def release(self, worker: str, failed=False) -> int:
+        """
+        Gives back the jobs still leased by a worker and returns how many.
+        Jobs the worker is leaving unattempted get their attempt back;
+        ``failed`` jobs are failed once out of attempts.
+        """
+        with self.transaction():
+            return self.connection.execute(
+                "UPDATE jobs SET worker = NULL,"
+                " attempts = attempts - ?,"
+                " state = CASE WHEN ? AND attempts >= ? THEN 'failed'"
+                " ELSE 'pending' END"
+                " WHERE state = 'leased' AND worker = ?",
+                (0 if failed else 1, failed, self.max_attempts, worker),
+            ).rowcount
+
+    def take_results(self, limit: int) -> list:
+        """
+        Returns up to ``limit`` results not taken yet, marking them taken.
+        """
+        with self.transaction():
+            rows = self.connection.execute(
+                "SELECT url, result FROM jobs WHERE state = 'done'"
+                " ORDER BY position LIMIT ?",
+                (limit,),
+            ).fetchall()
+            self.connection.executemany(
+                "UPDATE jobs SET state = 'merged' WHERE url = ?",
+                [(url,) for url, _ in rows],
+            )
+        return [json.loads(result) for _, result in rows]
+
+    def requeue_results(self, collected) -> None:
+        """
+        Makes the results taken but not among the ``collected`` URLs, e.g.
+        lost by an interrupted coordinator, available to take again.
+        """
+        urls = [
+            (url,) for (url,) in self.connection.execute(
+                "SELECT url FROM jobs WHERE state = 'merged'"
+            ) if url not in collected
+        ]
+        with self.transaction():
+            self.connection.executemany(
+                "UPDATE jobs SET state = 'done' WHERE url = ?", urls
+            )
+
+    def counts(self) -> dict:
+        """
+        Returns the number of jobs in each state.
+        """
+        self.expire_leases()
+        counts = dict.fromkeys(
+            ("pending", "leased", "done", "merged", "failed"), 0
+        )
+        counts.update(self.connection.execute(
+            "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+        ).fetchall())
+        return counts
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+# Moves up to ARGV[1] jobs from the pending sorted set (KEYS[1]) to the
+# leased one (KEYS[2]) with expiry ARGV[2], recording the worker (ARGV[3])
+# and counting the attempt (KEYS[3], KEYS[4])
+LEASE_SCRIPT = """
+local urls = redis.call('ZRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+for _, url in ipairs(urls) do
+    redis.call('ZREM', KEYS[1], url)
+    redis.call('ZADD', KEYS[2], ARGV[2], url)
+    redis.call('HSET', KEYS[3], url, ARGV[3])
+    redis.call('HINCRBY', KEYS[4], url, 1)
+end
+return urls
+"""
+
+
+class RedisWorkQueue:
+    """
+    Work queue in Redis, shared by workers on any number of machines.
+
+    Keys, prefixed with ``<name>:queue:``: ``jobs`` (hash of job JSON by
+    URL), ``positions`` (hash), ``pending`` (sorted set by position),
+    ``leased`` (sorted set by lease expiry), ``owners`` and ``attempts``
+    (hashes by URL), ``results`` (hash of result JSON by URL), ``new``
+    (list of the URLs of results not taken yet), ``failed`` (set) and
+    ``published`` (flag).
+    """
+
+    def __init__(self, client, name: str, lease_seconds=300,
+                 max_attempts=3):
+        self.client = client
+        self.prefix = f"{name}:queue:"
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lease_script = client.register_script(LEASE_SCRIPT)
+
+    def key(self, name: str) -> str:
+        return self.prefix + name
+
+    def reset(self) -> None:
+        self.client.delete(*(
+            self.key(name) for name in (
+                "jobs", "positions", "pending", "leased", "owners",
+                "attempts", "results", "new", "failed", "published",
+            )
+        ))
+
+    def publish(self, jobs) -> None:
+        jobs = list(jobs)
+        if not jobs:
+            return
+        known = self.client.hmget(
+            self.key("jobs"), [job["url"] for job in jobs]
+        )
+        pipe = self.client.pipeline()
+        for job, existing in zip(jobs, known):
+            if existing is not None:
+                continue
+            pipe.hset(self.key("jobs"), job["url"], json.dumps(job))
+            pipe.hset(self.key("positions"), job["url"], job["position"])
+            pipe.zadd(self.key("pending"), {job["url"]: job["position"]})
+        pipe.execute()
+
+    def mark_published(self) -> None:
+        self.client.set(self.key("published"), 1)
+
+    def published(self) -> bool:
+        return bool(self.client.exists(self.key("published")))
+
+    def expire_leases(self) -> None:
+        expired = self.client.zrangebyscore(
+            self.key("leased"), "-inf", time.time()
+        )
+        for url in expired:
+            self.requeue(url, failed=True)
+
+    def requeue(self, url, failed: bool) -> bool:
+        """
+        Takes a job out of the leased ones, unless another process did
+        first, and makes it pending again or fails it.
+        """
+        if not self.client.zrem(self.key("leased"), url):
+            return False
+        self.client.hdel(self.key("owners"), url)
+        attempts = int(self.client.hget(self.key("attempts"), url) or 0)
+        if not failed:
+            attempts = self.client.hincrby(self.key("attempts"), url, -1)
+        if failed and attempts >= self.max_attempts:
+            self.client.sadd(self.key("failed"), url)
+        else:
+            position = float(self.client.hget(self.key("positions"), url))
+            self.client.zadd(self.key("pending"), {url: position})
+        return True
+
+    def lease(self, worker: str, limit: int) -> list:
+        self.expire_leases()
+        urls = self.lease_script(
+            keys=[self.key("pending"), self.key("leased"),
+                  self.key("owners"), self.key("attempts")],
+            args=[limit, time.time() + self.lease_seconds, worker],
+        )
+        if not urls:
+            return []
+        return [
+            json.loads(job)
+            for job in self.client.hmget(self.key("jobs"), urls)
+        ]
+
+    def owned(self, worker: str) -> list:
+        return [
+            url for url, owner in
+            self.client.hgetall(self.key("owners")).items()
+            if owner.decode() == worker
+        ]
+
+    def renew(self, worker: str) -> None:
+        urls = self.owned(worker)
+        if urls:
+            expires = time.time() + self.lease_seconds
+            self.client.zadd(
+                self.key("leased"), {url: expires for url in urls}, xx=True
+            )
+
+    def complete(self, worker: str, url: str, result: dict) -> None:
+        # The first result of a job wins, as with SQLite
+        if not self.client.hsetnx(self.key("results"), url,
+                                  json.dumps(result, ensure_ascii=False)):
+            return
+        pipe = self.client.pipeline()
+        pipe.zrem(self.key("leased"), url)
+        pipe.zrem(self.key("pending"), url)
+        pipe.hdel(self.key("owners"), url)
+        pipe.srem(self.key("failed"), url)
+        pipe.rpush(self.key("new"), url)
+        pipe.execute()
+
+    def release(self, worker: str, failed=False) -> int:
+        return sum(
+            self.requeue(url, failed) for url in self.owned(worker)
+        )
+
+    def take_results(self, limit: int) -> list:
+        urls = self.client.lpop(self.key("new"), limit)
+        if not urls:
+            return []
+        return [
+            json.loads(result)
+            for result in self.client.hmget(self.key("results"), urls)
+            if result is not None
+        ]
+
+    def requeue_results(self, collected) -> None:
+        new = set(self.client.lrange(self.key("new"), 0, -1))
+        urls = [
+            url for url in self.client.hkeys(self.key("results"))
+            if url not in new and url.decode() not in collected
+        ]
+        if urls:
+            self.client.rpush(self.key("new"), *urls)
+
+    def counts(self) -> dict:
+        self.expire_leases()
+        new = self.client.llen(self.key("new"))
+        return {
+            "pending": self.client.zcard(self.key("pending")),
+            "leased": self.client.zcard(self.key("leased")),
+            "done": new,
+            "merged": self.client.hlen(self.key("results")) - new,
+            "failed": self.client.scard(self.key("failed")),
+        }
+
+    def close(self) -> None:
+        self.client.close()
@@ -0,0 +1,9 @@
+import os
+
+# The movies modules read their configuration from the environment when
+# they are imported
+os.environ.setdefault("MOVIES_JSON_PATH", "movies.json")
+os.environ.setdefault("ACTORS_JSON_PATH", "actors.json")
+os.environ.setdefault("CHROME_DRIVER_PATH", "chromedriver")
+os.environ.setdefault("GOOGLE_SHEET_ID", "test")
+os.environ.setdefault("CREDENTIALS_FILE_PATH", "test")
@@ -0,0 +1,89 @@
+"""
+ActorStatsPipeline gives the actor analysis the spider used to compute
+from movies.json at the end of the run, whatever order movies arrive in.
+"""
+import json
+import os
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from movies.items import MoviesItem
+from movies.people import PersonTable
+from movies.pipelines import ActorStatsPipeline, read_jsonl
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def baseline_analysis(movies_data):
+    """
+    The analysis of the movies JSON file the spider ran before the
+    pipeline replaced it.
+    """
+    actor_counts = {}
+    for movie in movies_data:
+        for actor in movie.get("Cast", []):
+            if actor not in actor_counts:
+                actor_counts[actor] = {
+                    "Movies Count": 0,
+                    "Total Rating": 0,
+                    "Movies": []
+                }
+            actor_counts[actor]["Movies Count"] += 1
+            actor_counts[actor]["Total Rating"] += movie.get("Rating", 0)
+            actor_counts[actor]["Movies"].append(movie["Original title"])
+
+    actors_analysis = []
+    for actor, data in actor_counts.items():
+        if data["Movies Count"] > 1:
+            average_rating = round(
+                data["Total Rating"] / data["Movies Count"], 2
+            )
+            actors_analysis.append({
+                "Actor": actor,
+                "Movies Count": data["Movies Count"],
+                "Average Rating": average_rating,
+                "Movies": data["Movies"]
+            })
+    return actors_analysis
+
+
+@pytest.fixture
+def people():
+    people = PersonTable()
+    people.load(read_jsonl(os.path.join(FIXTURES, "people.jsonl")))
+    return people
+
+
+@pytest.fixture
+def records():
+    return list(read_jsonl(os.path.join(FIXTURES, "movies.jsonl")))
+
+
+def run_pipeline(records, people, json_path):
+    pipeline = ActorStatsPipeline(json_path=str(json_path))
+    spider = SimpleNamespace(people=people)
+    pipeline.open_spider(spider)
+    for record in records:
+        pipeline.process_item(MoviesItem.from_record(record), spider)
+    pipeline.close_spider(spider)
+    with open(json_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("seed", [None, 1, 2, 3])
+def test_same_as_baseline_analysis(records, people, tmp_path, seed):
+    if seed is not None:
+        random.Random(seed).shuffle(records)
+    movies_data = [
+        MoviesItem.named_record(record, people)
+        for record in sorted(records, key=lambda r: r["Position in rating"])
+    ]
+
+    actors = run_pipeline(records, people, tmp_path / "actors.json")
+
+    assert actors == baseline_analysis(movies_data)
+    assert [actor["Actor"] for actor in actors][:3] == [
+        "Marlon Brando", "Al Pacino", "Robert Duvall"
+    ]
@@ -0,0 +1,71 @@
+"""
+The pandas analysis gives the same actor analysis as ActorStatsPipeline.
+"""
+import json
+import os
+from collections import Counter
+from itertools import combinations
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pandas")
+
+from movies.analysis import actor_stats, analyze, load_jsonl  # noqa: E402
+from movies.items import MoviesItem  # noqa: E402
+from movies.people import PersonTable  # noqa: E402
+from movies.pipelines import ActorStatsPipeline, read_jsonl  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+MOVIES_PATH = os.path.join(FIXTURES, "movies.jsonl")
+PEOPLE_PATH = os.path.join(FIXTURES, "people.jsonl")
+
+
+def pipeline_actors(tmp_path) -> list:
+    people = PersonTable()
+    people.load(read_jsonl(PEOPLE_PATH))
+    spider = SimpleNamespace(people=people)
+    pipeline = ActorStatsPipeline(json_path=str(tmp_path / "actors.json"))
+    pipeline.open_spider(spider)
+    for record in read_jsonl(MOVIES_PATH):
+        pipeline.process_item(MoviesItem.from_record(record), spider)
+    pipeline.close_spider(spider)
+    with open(tmp_path / "actors.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("min_movies", [2, 3])
+def test_actor_stats_same_as_pipeline(tmp_path, min_movies):
+    tables = load_jsonl(MOVIES_PATH, PEOPLE_PATH)
+    expected = [
+        actor for actor in pipeline_actors(tmp_path)
+        if actor["Movies Count"] >= min_movies
+    ]
+
+    assert actor_stats(tables, min_movies) == expected
+
+
+def test_analyze(tmp_path):
+    result = analyze(load_jsonl(MOVIES_PATH, PEOPLE_PATH))
+
+    assert result["directors"][0] == {
+        "Director": "Francis Ford Coppola",
+        "Movies Count": 3,
+        "Average Rating": 8.87,
+        "Movies": [
+            "The Godfather", "The Godfather Part II", "Apocalypse Now"
+        ],
+    }
+    assert {"Decade": 1970, "Movies Count": 3, "Average Rating": 8.87} in \
+        result["decades"]
+
+    people = dict(read_jsonl(PEOPLE_PATH))
+    pairs = Counter(
+        frozenset((people[a], people[b]))
+        for record in read_jsonl(MOVIES_PATH)
+        for a, b in combinations(set(record["Cast"]), 2)
+    )
+    assert {
+        frozenset(pair["Actors"]): pair["Movies Count"]
+        for pair in result["co_appearances"]
+    } == {pair: count for pair, count in pairs.items() if count >= 2}
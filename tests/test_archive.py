@@ -0,0 +1,142 @@
+"""
+Pages appended to the archive are read back from its index as the
+responses they were parsed from, and the archiver extension archives
+only the pages the spiders parse.
+"""
+import os
+from types import SimpleNamespace
+
+from scrapy import Request
+from scrapy.http import HtmlResponse
+
+from movies.archive import (
+    PAGES_FILE,
+    PageArchive,
+    PageArchiver,
+    read_member,
+    read_page,
+)
+
+TITLE_URL = "https://www.imdb.com/title/tt0111161/"
+CHART_URL = "https://www.imdb.com/chart/top/"
+
+
+def header(url, page_type, run=1.0, flags=(), **meta):
+    return {
+        "url": url,
+        "request_url": url,
+        "status": 200,
+        "encoding": "utf-8",
+        "flags": list(flags),
+        "spider": "top250",
+        "run": run,
+        "fetched_at": run,
+        "meta": {"page_type": page_type, **meta},
+    }
+
+
+def read_back(archive, url):
+    name, offset, length = archive.latest([url])[url]
+    with open(os.path.join(archive.directory, name), "rb") as f:
+        return read_member(f, offset, length), read_page(f, offset, length)
+
+
+def test_pages_read_back_from_index(tmp_path):
+    archive = PageArchive(str(tmp_path))
+    archive.append(header(CHART_URL, "chart"), b"<html>chart</html>")
+    archive.append(
+        header(TITLE_URL, "title", flags=["rendered"], position=1),
+        "<h1>Pokój</h1>".encode("utf-8"),
+    )
+    assert TITLE_URL in archive  # Before the index rows are committed
+    archive.close()
+
+    archive = PageArchive(str(tmp_path))
+    assert TITLE_URL in archive and "https://www.imdb.com/" not in archive
+    members = archive.latest()
+    assert members[CHART_URL][:2] == (PAGES_FILE, 0)
+    assert members[TITLE_URL][:2] == (PAGES_FILE, members[CHART_URL][2])
+    (page_header, body), response = read_back(archive, TITLE_URL)
+    assert page_header["meta"] == {"page_type": "title", "position": 1}
+    assert isinstance(response, HtmlResponse)
+    assert response.url == TITLE_URL and response.status == 200
+    assert response.flags == ["rendered"]
+    assert response.text == body.decode("utf-8") == "<h1>Pokój</h1>"
+    archive.close()
+
+
+def test_latest_member_of_a_url_wins(tmp_path):
+    archive = PageArchive(str(tmp_path))
+    archive.append(header(TITLE_URL, "title", run=1.0), b"first")
+    archive.append(header(CHART_URL, "chart", run=1.0), b"chart")
+    archive.flush()
+    archive.append(header(TITLE_URL, "title", run=2.0), b"second")
+    archive.flush()
+
+    assert read_back(archive, TITLE_URL)[1].body == b"second"
+    assert list(archive.latest(page_type="chart")) == [CHART_URL]
+    assert archive.latest([TITLE_URL, "https://www.imdb.com/"]).keys() == {
+        TITLE_URL
+    }
+    archive.close()
+
+
+def test_last_run_of_a_spider(tmp_path):
+    archive = PageArchive(str(tmp_path))
+    old_chart = CHART_URL + "?page=2"
+    archive.append(header(old_chart, "chart", run=1.0), b"old")
+    archive.append(header(CHART_URL, "chart", run=1.0), b"old")
+    archive.append(header(CHART_URL, "chart", run=2.0), b"new")
+    archive.append(header(TITLE_URL, "title", run=3.0), b"title")
+    archive.flush()
+
+    assert list(archive.last_run("top250", "chart")) == [CHART_URL]
+    assert archive.last_run("chart", "chart") == {}
+    archive.close()
+
+
+def test_workers_append_to_pages_files_of_their_own(tmp_path):
+    coordinator = PageArchive(str(tmp_path))
+    worker = PageArchive(str(tmp_path), pages_file="pages-w1.gz")
+    coordinator.append(header(CHART_URL, "chart"), b"chart")
+    worker.append(header(TITLE_URL, "title"), b"title")
+    coordinator.flush()
+    worker.close()
+
+    assert {url: member[0] for url, member in
+            coordinator.latest().items()} == {
+        CHART_URL: PAGES_FILE, TITLE_URL: "pages-w1.gz"
+    }
+    assert read_back(coordinator, TITLE_URL)[1].body == b"title"
+    coordinator.close()
+
+
+def received(archiver, spider, url, status=200, flags=(), **meta):
+    archiver.response_received(
+        HtmlResponse(url, status=status, body=url.encode(), flags=list(flags),
+                     encoding="utf-8"),
+        Request(url, meta=meta), spider,
+    )
+
+
+def test_archiver_archives_parsed_pages(tmp_path):
+    archiver = PageArchiver(str(tmp_path), flush_every=1)
+    spider = SimpleNamespace(name="top250")
+    archiver.spider_opened(spider)
+
+    received(archiver, spider, CHART_URL, page_type="chart", page=1)
+    received(archiver, spider, TITLE_URL, status=503, page_type="title")
+    received(archiver, spider, TITLE_URL + "mediaviewer/")  # No page type
+    received(archiver, spider, CHART_URL, flags=["cached"], page_type="chart")
+    received(archiver, spider, TITLE_URL, flags=["cached"], page_type="title")
+    archiver.tasks.put(None)
+    archiver.thread.join()
+
+    assert archiver.archived == 2
+    archive = PageArchive(str(tmp_path))
+    assert archive.latest().keys() == {CHART_URL, TITLE_URL}
+    (page_header, _), _ = read_back(archive, CHART_URL)
+    assert page_header["spider"] == "top250"
+    assert page_header["run"] == archiver.run_started
+    assert page_header["meta"] == {"page_type": "chart", "page": 1}
+    archive.close()
@@ -0,0 +1,234 @@
+"""
+Browser pool recycling and crash handling, and the render middleware's
+retries, with fake drivers standing in for Chrome.
+"""
+import itertools
+
+import pytest
+from scrapy import Request, Spider
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+from selenium.common import TimeoutException, WebDriverException
+from twisted.internet import defer
+from twisted.python.failure import Failure
+
+from movies import browser_pool
+from movies.browser_pool import BrowserPool
+from movies.middlewares import BrowserRenderMiddleware
+
+URL = "https://www.imdb.com/title/tt0111161/"
+
+
+class FakeProcess:
+    def __init__(self, pid):
+        self.pid = pid
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+
+class FakeDriver:
+    """
+    Records the WebDriver calls of a render; ``fail`` is raised by the
+    next page load.
+    """
+    session_ids = itertools.count(1)
+
+    def __init__(self):
+        self.session_id = f"session-{next(self.session_ids)}"
+        self.service = type("Service", (), {})()
+        self.service.process = FakeProcess(1000)
+        self.calls = []
+        self.fail = None
+        self.quit_called = False
+
+    def set_script_timeout(self, timeout):
+        self.calls.append(("set_script_timeout", timeout))
+
+    def get(self, url):
+        self.calls.append(("get", url))
+        if self.fail is not None:
+            raise self.fail
+
+    def execute_async_script(self, script, wait_for):
+        self.calls.append(("execute_async_script", wait_for))
+        return self.calls[-2][1], "<html></html>"
+
+    def quit(self):
+        self.quit_called = True
+
+
+class FakeDriverFactory:
+    def __init__(self):
+        self.drivers = []
+
+    def create(self):
+        driver = FakeDriver()
+        self.drivers.append(driver)
+        return driver
+
+
+@pytest.fixture
+def factory():
+    return FakeDriverFactory()
+
+
+def test_driver_reused_and_script_timeout_set_once(factory):
+    pool = BrowserPool(2, factory)
+
+    for _ in range(3):
+        url, page_source, _ = pool._render(URL, "h1", 10)
+    pool._render(URL, "h1", 20)
+
+    assert (url, page_source) == (URL, "<html></html>")
+    (driver,) = factory.drivers
+    assert [call for call in driver.calls
+            if call[0] == "set_script_timeout"] == [
+        ("set_script_timeout", 10), ("set_script_timeout", 20)
+    ]
+
+
+def test_recycled_after_max_pages(factory):
+    pool = BrowserPool(1, factory, max_pages=2)
+
+    for _ in range(3):
+        pool._render(URL, None, 10)
+
+    first, second = factory.drivers
+    assert first.quit_called and not second.quit_called
+    assert pool.drivers == [second]
+    assert pool.pages == {second.session_id: 1}
+
+
+def test_recycled_above_max_rss(factory, monkeypatch):
+    rss = {"bytes": 100 * 1024 * 1024}
+    monkeypatch.setattr(
+        browser_pool, "process_tree_rss", lambda pid: rss["bytes"]
+    )
+    pool = BrowserPool(1, factory, max_rss_mb=200, rss_check_every=2)
+
+    for _ in range(4):
+        pool._render(URL, None, 10)
+    assert len(factory.drivers) == 1
+
+    rss["bytes"] = 300 * 1024 * 1024
+    pool._render(URL, None, 10)
+    assert not factory.drivers[0].quit_called  # Checked every 2 pages
+    pool._render(URL, None, 10)
+    assert factory.drivers[0].quit_called
+    pool._render(URL, None, 10)
+    assert len(factory.drivers) == 2
+
+
+def test_exited_driver_replaced(factory):
+    pool = BrowserPool(1, factory)
+    pool._render(URL, None, 10)
+    factory.drivers[0].service.process.returncode = 1
+
+    pool._render(URL, None, 10)
+
+    first, second = factory.drivers
+    assert not BrowserPool.is_alive(first) and BrowserPool.is_alive(second)
+    assert first.quit_called
+    assert pool.drivers == [second]
+
+
+def test_crashed_driver_discarded(factory):
+    pool = BrowserPool(1, factory)
+    pool._render(URL, None, 10)
+    factory.drivers[0].fail = WebDriverException("tab crashed")
+
+    with pytest.raises(WebDriverException):
+        pool._render(URL, None, 10)
+    pool._render(URL, None, 10)
+
+    first, second = factory.drivers
+    assert first.quit_called and not second.quit_called
+    assert first.session_id not in pool.script_timeouts
+
+
+def test_timed_out_driver_kept(factory):
+    pool = BrowserPool(1, factory)
+    pool._render(URL, None, 10)
+    factory.drivers[0].fail = TimeoutException()
+
+    with pytest.raises(TimeoutException):
+        pool._render(URL, None, 10)
+
+    (driver,) = factory.drivers
+    assert not driver.quit_called
+    assert pool.idle_drivers.get_nowait() is driver
+
+
+@pytest.fixture
+def spider():
+    crawler = get_crawler(Spider)
+    return crawler._create_spider("test")
+
+
+@pytest.fixture
+def middleware(factory, spider):
+    return BrowserRenderMiddleware(
+        pool_size=1, wait_timeout=10, driver_factory=factory,
+        timeout_retries=2, crash_retries=2, stats=spider.crawler.stats,
+    )
+
+
+def results(deferred) -> list:
+    outcome = []
+    deferred.addBoth(outcome.append)
+    return outcome
+
+
+def test_crashed_render_requeued(middleware, spider):
+    request = Request(URL, meta={"render": True})
+    crash = Failure(WebDriverException("chrome not reachable"))
+
+    retry = middleware.requeue_crashed(crash, request, spider)
+    assert isinstance(retry, Request)
+    assert retry.dont_filter and retry.meta["retry_times"] == 1
+
+    retry = middleware.requeue_crashed(crash, retry, spider)
+    assert retry.meta["retry_times"] == 2
+    assert middleware.requeue_crashed(crash, retry, spider) is crash
+
+    timeout = Failure(TimeoutException())
+    assert middleware.requeue_crashed(timeout, request, spider) is timeout
+
+
+def test_timed_out_render_retried_with_longer_timeout(middleware, spider):
+    renders = []
+
+    def render(url, wait_for=None, timeout=10):
+        renders.append(timeout)
+        if len(renders) == 1:
+            return defer.fail(TimeoutException())
+        return defer.succeed((url, "<html></html>", 0.5))
+
+    middleware.pool.render = render
+    request = Request(URL, meta={"render": True, "page_type": "title"})
+
+    (response,) = results(middleware.process_request(request, spider))
+
+    assert isinstance(response, HtmlResponse)
+    assert renders == [10, 20]
+    assert request.meta["render_timeouts"] == 1
+    assert middleware.pending_retries == 0
+    assert spider.crawler.stats.get_value(
+        "pages/title/timeout_retry"
+    ) == 1
+
+
+def test_render_gives_up_after_timeout_retries(middleware, spider):
+    middleware.pool.render = \
+        lambda url, wait_for=None, timeout=10: defer.fail(TimeoutException())
+    request = Request(URL, meta={"render": True, "page_type": "title"})
+
+    (failure,) = results(middleware.process_request(request, spider))
+
+    assert failure.check(TimeoutException)
+    assert middleware.pending_retries == 0
+    assert spider.crawler.stats.get_value(
+        "pages/title/timeout_gave_up"
+    ) == 1
@@ -0,0 +1,44 @@
+"""
+The chart spider carries only the pagination meta to the next page.
+"""
+from scrapy import Request
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+from benchmarks.fixtures import chart_page, generate_movies
+from movies.spiders.chart import ChartSpider
+
+CHART_URL = "https://www.imdb.com/chart/moviemeter/"
+
+
+def test_next_page_meta(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    spider = ChartSpider.from_crawler(get_crawler(ChartSpider), url=CHART_URL)
+    request = Request(CHART_URL, meta={
+        "page_type": "chart",
+        "render": False,
+        "wait_for": ".ipc-metadata-list",
+        "wait_timeout": 10,
+        # Set by the downloader middlewares for this page only
+        "retry_times": 2,
+        "redirect_urls": ["https://www.imdb.com/chart/moviemeter"],
+        "download_latency": 0.5,
+        "depth": 0,
+    })
+    movies = generate_movies(3)
+    response = HtmlResponse(
+        CHART_URL, request=request, encoding="utf-8",
+        body=chart_page(movies, "chart/moviemeter/page/2"),
+    )
+
+    next_page = list(spider.parse(response))[-1]
+
+    assert next_page.url == "https://www.imdb.com/chart/moviemeter/page/2/"
+    assert next_page.meta == {
+        "page_type": "chart",
+        "render": False,
+        "wait_for": ".ipc-metadata-list",
+        "wait_timeout": 10,
+        "page": 2,
+        "offset": 3,
+    }
@@ -0,0 +1,112 @@
+"""
+Delta runs carry a movie forward only from a record of the same movie,
+scraped at the same position with the same rating.
+"""
+import json
+
+import pytest
+
+from movies.items import MoviesItem
+from movies.people import PersonTable
+from movies.spiders import top250
+from movies.spiders.top250 import Top250Spider
+
+PEOPLE = [[1, "Director One"], [2, "Actor Two"], [3, "Actor Three"]]
+
+
+def chart_entry(position, imdb_id, rating):
+    return {
+        "position": position,
+        "id": imdb_id,
+        "url": f"https://www.imdb.com/title/{imdb_id}/",
+        "rating": rating,
+    }
+
+
+def movie_record(position, imdb_id, rating, **fields):
+    item = MoviesItem(
+        position=position,
+        title=f"Movie {imdb_id}",
+        original_title=f"Movie {imdb_id}",
+        year=1994,
+        rating=rating,
+        directors=[1],
+        cast=[2, 3],
+        url=f"https://www.imdb.com/title/{imdb_id}/",
+    )
+    return {**item.to_record(), **fields}
+
+
+@pytest.fixture
+def previous_run(tmp_path, monkeypatch):
+    """
+    Writes the JSON lines files of a previous run and returns a delta
+    spider that read them.
+    """
+    monkeypatch.chdir(tmp_path)
+    movies_path = tmp_path / "movies.jsonl"
+    people_path = tmp_path / "people.jsonl"
+    monkeypatch.setattr(top250, "MOVIES_JSONL_PATH", str(movies_path))
+    monkeypatch.setattr(top250, "PEOPLE_JSONL_PATH", str(people_path))
+
+    def write(records):
+        people_path.write_text(
+            "".join(json.dumps(person) + "\n" for person in PEOPLE)
+        )
+        movies_path.write_text(
+            "".join(json.dumps(record) + "\n" for record in records)
+        )
+        spider = Top250Spider(mode="delta")
+        spider.load_previous_run()
+        return spider
+
+    return write
+
+
+def test_unchanged_movie_is_carried_forward(previous_run):
+    spider = previous_run([movie_record(1, "tt0111161", 9.3)])
+    entry = chart_entry(1, "tt0111161", 9.3)
+
+    unchanged = spider.unchanged_movies([entry])
+
+    assert list(unchanged) == [1]
+    item = spider.carry_forward(unchanged[1], entry)
+    assert item["title"] == "Movie tt0111161"
+    assert item["url"] == entry["url"]
+
+
+def test_other_movie_at_same_position_is_not_carried_forward(previous_run):
+    # E.g. the movies file of a chart spider run, numbered by its list
+    spider = previous_run([movie_record(1, "tt0068646", 9.3)])
+
+    assert spider.unchanged_movies([chart_entry(1, "tt0111161", 9.3)]) == {}
+
+
+@pytest.mark.parametrize("entry", [
+    chart_entry(1, "tt0111161", 9.2),  # Re-rated
+    chart_entry(2, "tt0111161", 9.3),  # Moved
+    chart_entry(1, "tt0111161", None),  # No rating on the chart
+])
+def test_changed_movie_is_scraped_again(previous_run, entry):
+    spider = previous_run([movie_record(1, "tt0111161", 9.3)])
+
+    assert spider.unchanged_movies([entry]) == {}
+
+
+def test_record_without_title_id_is_scraped_again(previous_run):
+    record = movie_record(1, "tt0111161", 9.3)
+    del record[MoviesItem.id_key]
+    spider = previous_run([record])
+
+    assert spider.unchanged_movies([chart_entry(1, "tt0111161", 9.3)]) == {}
+
+
+def test_title_id_is_not_exported():
+    record = movie_record(1, "tt0111161", 9.3)
+    people = PersonTable()
+    people.load(PEOPLE)
+
+    assert record[MoviesItem.id_key] == "tt0111161"
+    named = MoviesItem.named_record(record, people)
+    assert MoviesItem.id_key not in named
+    assert named["Cast"] == ["Actor Two", "Actor Three"]
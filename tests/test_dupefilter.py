@@ -0,0 +1,52 @@
+"""
+TitleDupeFilter deduplicates title pages by title ID, except redirects.
+"""
+from scrapy import Request
+from scrapy.utils.test import get_crawler
+
+from movies.dupefilter import CompactIdSet, TitleDupeFilter
+
+TITLE_URL = "https://www.imdb.com/title/tt0111161/"
+
+
+def make_dupefilter():
+    crawler = get_crawler(settings_dict={
+        "REQUEST_FINGERPRINTER_IMPLEMENTATION": "2.7",
+    })
+    return TitleDupeFilter.from_crawler(crawler)
+
+
+def title_request(url=TITLE_URL, **meta):
+    return Request(url, meta={"page_type": "title", **meta})
+
+
+def test_title_seen_once_whatever_the_url():
+    dupefilter = make_dupefilter()
+
+    assert not dupefilter.request_seen(title_request())
+    assert dupefilter.request_seen(title_request(TITLE_URL + "?ref_=chart"))
+    assert not dupefilter.request_seen(Request(
+        TITLE_URL + "fullcredits/", meta={"page_type": "fullcredits"}
+    ))
+
+
+def test_redirect_to_the_same_title_is_followed_once():
+    dupefilter = make_dupefilter()
+    dupefilter.request_seen(title_request())
+    redirected = title_request(
+        TITLE_URL + "?ref_=redirect", redirect_urls=[TITLE_URL]
+    )
+
+    assert not dupefilter.request_seen(redirected)
+    # A redirect loop is still caught by fingerprint
+    assert dupefilter.request_seen(redirected.replace())
+
+
+def test_compact_id_set():
+    ids = CompactIdSet([5, 3], merge_every=2)
+
+    assert not ids.add(4)
+    assert ids.add(3)
+    assert not ids.add(1)
+    assert list(ids.values) == [1, 3, 4, 5]
+    assert CompactIdSet.frombytes(ids.tobytes()).add(4)
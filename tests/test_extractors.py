@@ -0,0 +1,126 @@
+"""
+The extractors give the same data for the static HTML of a page and for
+the DOM the browser renders from it, so a page can be fetched either
+way, and the chart gives the same entries from each of its sources.
+The fixtures are IMDb pages cut down to the elements around the ones
+the extractors read.
+"""
+import os
+
+import pytest
+from scrapy.http import HtmlResponse
+
+from movies.extractors import (
+    _chart_from_json_ld,
+    _chart_from_list,
+    _chart_from_next_data,
+    extract_cast,
+    extract_chart,
+    extract_movie,
+)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+CHART_URL = "https://www.imdb.com/chart/top/"
+TITLE_URL = "https://www.imdb.com/title/tt0245429/"
+FULLCREDITS_URL = TITLE_URL + "fullcredits/?ref_=tt_cl_sm"
+
+
+def fixture_response(name: str, url: str) -> HtmlResponse:
+    """
+    Returns a fixture page as the response of its fetch: a plain HTTP
+    response, or for ``*_rendered.html`` the one the browser pool builds.
+    """
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        body = f.read()
+    rendered = name.endswith("_rendered.html")
+    return HtmlResponse(
+        url=url,
+        body=body,
+        encoding="utf-8",
+        flags=["rendered"] if rendered else [],
+    )
+
+
+@pytest.mark.parametrize("version", ["static", "rendered"])
+def test_extract_movie(version):
+    movie = extract_movie(
+        fixture_response(f"title_{version}.html", TITLE_URL)
+    )
+
+    assert movie == {
+        "position": 31,
+        "title": "Spirited Away",
+        "orig_title": "Sen to Chihiro no kamikakushi",
+        "orig_title_missing": False,
+        "rating": 8.6,
+        "year": 2001,
+        "cast_url": FULLCREDITS_URL,
+    }
+
+
+def test_extract_movie_same_static_and_rendered():
+    assert extract_movie(
+        fixture_response("title_static.html", TITLE_URL)
+    ) == extract_movie(fixture_response("title_rendered.html", TITLE_URL))
+
+
+@pytest.mark.parametrize("version", ["static", "rendered"])
+def test_extract_cast(version):
+    actors, directors = extract_cast(
+        fixture_response(f"fullcredits_{version}.html", FULLCREDITS_URL)
+    )
+
+    # Billed cast only, up to "Rest of cast listed alphabetically"
+    assert actors == [
+        ("nm1001031", "Rumi Hiiragi"),
+        ("nm1039307", "Miyu Irino"),
+        ("nm0645294", "Mari Natsuki"),
+    ]
+    assert directors == [("nm0594503", "Hayao Miyazaki")]
+
+
+def test_extract_cast_same_static_and_rendered():
+    assert extract_cast(
+        fixture_response("fullcredits_static.html", FULLCREDITS_URL)
+    ) == extract_cast(
+        fixture_response("fullcredits_rendered.html", FULLCREDITS_URL)
+    )
+
+
+CHART = [
+    (1, "tt0111161", "The Shawshank Redemption", 9.3),
+    (2, "tt0068646", "The Godfather", 9.2),
+    (3, "tt0468569", "The Dark Knight", 9.0),
+    (4, "tt0071562", "The Godfather Part II", 9.0),
+    (5, "tt0050083", "12 Angry Men", 9.0),
+    (6, "tt0108052", "Schindler's List", 9.0),
+]
+
+
+@pytest.mark.parametrize("extract", [
+    _chart_from_json_ld, _chart_from_next_data, _chart_from_list,
+])
+@pytest.mark.parametrize("version", ["static", "rendered"])
+def test_extract_chart_sources(version, extract):
+    entries = extract(fixture_response(f"chart_{version}.html", CHART_URL))
+
+    assert entries == [
+        {
+            "position": position,
+            "id": imdb_id,
+            "url": f"https://www.imdb.com/title/{imdb_id}/",
+            "title": title,
+            "rating": rating,
+        }
+        for position, imdb_id, title, rating in CHART
+    ]
+
+
+def test_extract_chart_same_from_every_source():
+    static = fixture_response("chart_static.html", CHART_URL)
+    rendered = fixture_response("chart_rendered.html", CHART_URL)
+
+    assert _chart_from_json_ld(static) == _chart_from_next_data(static) \
+        == _chart_from_list(static) == _chart_from_list(rendered)
+    assert extract_chart(static) == extract_chart(rendered)
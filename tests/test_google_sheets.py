@@ -0,0 +1,182 @@
+"""
+Syncs of GoogleSheetsHandler against the in-memory client: one read and
+one write a sync, writing only the rows that changed.
+"""
+import pytest
+
+from movies.fake_gspread import FakeClient
+from movies.google_sheets import (
+    ACTORS_HEADERS,
+    ACTORS_WORKSHEET,
+    MOVIES_HEADERS,
+    MOVIES_WORKSHEET,
+    GoogleSheetsHandler,
+)
+
+
+def movie(position, rating=8.5):
+    return {
+        "Position in rating": position,
+        "Title": f"Movie {position}",
+        "Original title": f"Original {position}",
+        "Year": 1990 + position,
+        "Rating": rating,
+        "Director(s)": ["Director One"],
+        "Cast": ["Actor Two", "Actor Three"],
+    }
+
+
+def actor(name, count=1):
+    return {
+        "Actor": name,
+        "Movies Count": count,
+        "Average Rating": 8.5,
+        "Movies": ["Movie 1"],
+    }
+
+
+MOVIES = [movie(position) for position in range(1, 11)]
+ACTORS = [actor("Actor Two", 2), actor("Actor Three")]
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+def connect(client, **kwargs):
+    return GoogleSheetsHandler(None, "sheet", client=client, **kwargs)
+
+
+def worksheet(client, title):
+    return client.open_by_key("sheet").worksheets[title]
+
+
+def calls(client):
+    return client.open_by_key("sheet").calls
+
+
+def test_first_sync_writes_everything(client):
+    report = connect(client).save_data(MOVIES, ACTORS)
+
+    movies = worksheet(client, MOVIES_WORKSHEET).values()
+    assert movies[0] == MOVIES_HEADERS
+    assert movies[1][:2] == [1, "Movie 1"]
+    assert movies[1][5:] == ["Director One", "Actor Two, Actor Three"]
+    assert len(movies) == 1 + len(MOVIES)
+    assert worksheet(client, ACTORS_WORKSHEET).values()[0] == ACTORS_HEADERS
+    assert report["cells_written"] == (
+        (1 + len(MOVIES)) * len(MOVIES_HEADERS) +
+        (1 + len(ACTORS)) * len(ACTORS_HEADERS)
+    )
+
+
+def test_sync_is_one_read_and_one_write(client):
+    handler = connect(client)
+    assert calls(client) == ["fetch_sheet_metadata"]
+
+    for rating in (8.5, 9.0):
+        del calls(client)[:]
+        report = handler.save_data(
+            [movie(position, rating) for position in range(1, 11)], ACTORS
+        )
+        assert report["api_calls"] == len(calls(client)) == 2
+        assert calls(client)[0] == "values_batch_get"
+
+
+def test_unchanged_rerun_writes_nothing(client):
+    connect(client).save_data(MOVIES, ACTORS)
+    del calls(client)[:]
+
+    report = connect(client).save_data(MOVIES, ACTORS)
+
+    assert report == {"api_calls": 1, "cells_written": 0}
+    assert "batch_update" not in calls(client)
+
+
+def test_changed_row_writes_only_that_row(client):
+    connect(client).save_data(MOVIES, ACTORS)
+    movies = list(MOVIES)
+    movies[4] = movie(5, rating=9.1)
+
+    report = connect(client).save_data(movies, ACTORS)
+
+    assert report == {
+        "api_calls": 2, "cells_written": len(MOVIES_HEADERS)
+    }
+    assert worksheet(client, MOVIES_WORKSHEET).values()[5][4] == 9.1
+
+
+def test_shrinking_dataset_blanks_leftover_rows(client):
+    connect(client).save_data(MOVIES, ACTORS)
+
+    report = connect(client).save_data(MOVIES[:7], ACTORS[:1])
+
+    movies = worksheet(client, MOVIES_WORKSHEET).values()
+    assert len(movies) == 8
+    assert movies[7][:2] == [7, "Movie 7"]
+    assert len(worksheet(client, ACTORS_WORKSHEET).values()) == 2
+    assert report == {
+        "api_calls": 2,
+        "cells_written": 3 * len(MOVIES_HEADERS) + len(ACTORS_HEADERS),
+    }
+
+
+def test_grid_grows_in_the_same_write(client):
+    worksheet(client, MOVIES_WORKSHEET).row_count = 5
+    handler = connect(client)
+    del calls(client)[:]
+
+    report = handler.save_movies_data(MOVIES)
+
+    assert calls(client) == ["values_batch_get", "batch_update"]
+    assert report["api_calls"] == 2
+    assert worksheet(client, MOVIES_WORKSHEET).row_count == 1 + len(MOVIES)
+    assert len(worksheet(client, MOVIES_WORKSHEET).values()) == 11
+
+
+def test_payload_limit_splits_the_write(client):
+    report = connect(client, max_payload_bytes=2000).save_movies_data(MOVIES)
+
+    assert report["api_calls"] > 2
+    assert len(worksheet(client, MOVIES_WORKSHEET).values()) == 11
+
+
+def test_update_rows_writes_without_reading(client):
+    handler = connect(client)
+    del calls(client)[:]
+
+    handler.update_rows(
+        MOVIES_WORKSHEET,
+        [(3, ["2", "Movie 2"]), (2, ["1", "Movie 1"]), (6, ["5"])],
+        len(MOVIES_HEADERS),
+    )
+
+    assert calls(client) == ["batch_update"]
+    values = worksheet(client, MOVIES_WORKSHEET).values()
+    assert [row[:2] for row in values[1:3]] == [
+        ["1", "Movie 1"], ["2", "Movie 2"]
+    ]
+    assert values[5] == ["5"]
+
+
+def test_rewrite_mode_clears_and_appends(client):
+    connect(client).save_data(MOVIES, ACTORS)
+    handler = connect(client, sync_mode="rewrite")
+    del calls(client)[:]
+
+    report = handler.save_data(MOVIES[:3], ACTORS)
+
+    movies = worksheet(client, MOVIES_WORKSHEET).values()
+    assert movies[0] == MOVIES_HEADERS
+    assert len(movies) == 4
+    assert report["cells_written"] == (
+        4 * len(MOVIES_HEADERS) + 3 * len(ACTORS_HEADERS)
+    )
+    assert "values_batch_get" not in calls(client)
+    assert report["api_calls"] == len(calls(client))
+
+
+def test_unknown_sync_mode(client):
+    with pytest.raises(ValueError):
+        connect(client, sync_mode="append")
@@ -0,0 +1,135 @@
+"""
+Spider loggers: one handler and one listener per log file however often
+they are set up, sampled per-page lines and the shape of the JSON lines.
+"""
+import itertools
+import json
+import logging
+from datetime import datetime
+
+import pytest
+
+import logger as spider_logger
+from logger import PageSampler, setup_logger, shutdown_loggers
+
+logger_names = (f"test-logger-{index}" for index in itertools.count())
+
+
+@pytest.fixture
+def name():
+    name = next(logger_names)
+    yield name
+    shutdown_loggers()
+    for handler in list(logging.getLogger(name).handlers):
+        logging.getLogger(name).removeHandler(handler)
+
+
+def read_lines(path) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_setup_logger_is_idempotent(name, tmp_path):
+    path = tmp_path / "spider.log"
+    logger = setup_logger(name, str(path))
+    listeners = dict(spider_logger.listeners)
+    for _ in range(2):
+        setup_logger(name, str(path))
+    setup_logger(name, str(path), level=logging.DEBUG)
+
+    assert len(logger.handlers) == 1
+    assert logger.handlers[0].level == logging.DEBUG
+    assert spider_logger.listeners == listeners
+    assert logger.handlers[0].queue is listeners[str(path)].queue
+
+    logger.info("once")
+    shutdown_loggers()
+    assert [line["message"] for line in read_lines(path)] == ["once"]
+
+
+def test_setup_logger_after_shutdown(name, tmp_path):
+    path = tmp_path / "spider.log"
+    setup_logger(name, str(path)).info("first run")
+    shutdown_loggers()
+
+    # The handler of the stopped listener is replaced
+    logger = setup_logger(name, str(path))
+    assert len(logger.handlers) == 1
+    logger.info("second run")
+    shutdown_loggers()
+
+    assert [line["message"] for line in read_lines(path)] == [
+        "first run", "second run"
+    ]
+
+
+def test_json_line_shape(name, tmp_path):
+    path = tmp_path / "spider.log"
+    logger = setup_logger(name, str(path))
+    movie = {"title": "Pokój"}
+
+    logger.info("Parsed %s", movie, extra={
+        "position": 7, "url": "https://www.imdb.com/title/tt0111161/",
+        "stage": "parse/title",
+    })
+    movie["title"] = "Changed before the listener writes the line"
+    try:
+        raise ValueError("no cast")
+    except ValueError:
+        logger.exception("Error processing cast")
+    shutdown_loggers()
+
+    parsed, error = read_lines(path)
+    assert parsed == {
+        "time": parsed["time"],
+        "level": "INFO",
+        "logger": name,
+        "message": "Parsed {'title': 'Pokój'}",
+        "position": 7,
+        "url": "https://www.imdb.com/title/tt0111161/",
+        "stage": "parse/title",
+    }
+    assert datetime.fromisoformat(parsed["time"])
+    assert len(parsed["time"].split(".")[1]) == 3  # Milliseconds
+    assert error["level"] == "ERROR"
+    assert error["message"] == "Error processing cast"
+    assert error["exception"].startswith("Traceback")
+    assert error["exception"].endswith("ValueError: no cast")
+
+
+class Clock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def record(stage="parse/title", level=logging.INFO):
+    return logging.makeLogRecord({
+        "levelno": level, "levelname": logging.getLevelName(level),
+        "msg": "page", "stage": stage,
+    })
+
+
+def test_page_sampler(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(spider_logger.time, "monotonic", clock)
+    sampler = PageSampler(rate=3, every=2)
+
+    records = [record() for _ in range(8)]
+    kept = [r for r in records if sampler.filter(r)]
+    # 3 in full, then one in two, standing for 2 lines each
+    assert kept == records[:3] + [records[4], records[6]]
+    assert [getattr(r, "sampled", None) for r in kept] == [
+        None, None, None, 2, 2
+    ]
+
+    # Lines without a stage and warnings are always kept, and not counted
+    assert sampler.filter(record(stage=None))
+    assert sampler.filter(record(level=logging.WARNING))
+    assert sampler.count == 8
+
+    clock.now += 1
+    assert all(sampler.filter(record()) for _ in range(3))
+    assert not sampler.filter(record())
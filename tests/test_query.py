@@ -0,0 +1,252 @@
+"""
+Queries over the movie index give what a scan of the JSON lines files
+gives, after the index is built and after every incremental update.
+"""
+import json
+import os
+import shutil
+
+import pytest
+
+from movies.query import MovieIndex, update_index
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+QUERIES = [
+    {},
+    {"actor": "Al Pacino"},
+    {"actor": "al pacino", "year_from": 1975},
+    {"actor": "nm0000134"},
+    {"actor": "Tom Mason"},
+    {"actor": "Nobody"},
+    {"actor": "nm9999999"},
+    {"director": "nm0634240", "rating_from": 8.7},
+    {"director": "Christopher Nolan", "year_to": 2008},
+    {"director": "Francis Ford Coppola", "actor": "Robert Duvall"},
+    {"title": "the godf"},
+    {"title": "THE", "actor": "Michael Caine"},
+    {"title": "Origen"},
+    {"year_from": 1990, "year_to": 2010},
+    {"year_to": 1979},
+    {"rating_from": 8.5, "rating_to": 9.0},
+    {"rating_to": 8.4, "year_from": 1990},
+]
+
+PREFIXES = ["", "al", "ROBERT", "michael c", "m", "zz"]
+
+
+@pytest.fixture
+def paths(tmp_path):
+    for name in ("movies.jsonl", "people.jsonl"):
+        shutil.copy(os.path.join(FIXTURES, name), tmp_path / name)
+    return {
+        "path": str(tmp_path / "index.bin"),
+        "movies_path": str(tmp_path / "movies.jsonl"),
+        "people_path": str(tmp_path / "people.jsonl"),
+    }
+
+
+def append(path, text):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+
+
+def movie_line(position, title, year, rating, directors, cast):
+    return json.dumps({
+        "Position in rating": position,
+        "Title": title,
+        "Original title": title,
+        "Year": year,
+        "Rating": rating,
+        "Director(s)": directors,
+        "Cast": cast,
+        "IMDb ID": f"tt{position:07d}",
+    }) + "\n"
+
+
+def scan(path) -> list:
+    """
+    Returns the records of the complete lines of a JSON lines file.
+    """
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().split("\n")[:-1]
+    return [json.loads(line) for line in lines]
+
+
+def scan_movies(paths) -> tuple:
+    """
+    Returns the movies by position, the later line of a position
+    winning, and the people by key, from the JSON lines files.
+    """
+    movies = {
+        record["Position in rating"]: record
+        for record in scan(paths["movies_path"])
+    }
+    people = dict(scan(paths["people_path"]))
+    return movies, people
+
+
+def scan_keys(people, person) -> set:
+    if person.startswith("nm"):
+        return {int(person[2:])} & people.keys()
+    return {key for key, name in people.items()
+            if name.casefold() == person.casefold()}
+
+
+def scan_find(movies, people, actor=None, director=None, title=None,
+              year_from=None, year_to=None, rating_from=None,
+              rating_to=None) -> list:
+    matches = []
+    for position, record in sorted(movies.items()):
+        year, rating = record["Year"], record["Rating"]
+        if actor is not None and \
+                not scan_keys(people, actor) & set(record["Cast"]):
+            continue
+        if director is not None and \
+                not scan_keys(people, director) & set(record["Director(s)"]):
+            continue
+        if title is not None and not any(
+                record[key].casefold().startswith(title.casefold())
+                for key in ("Title", "Original title")
+        ):
+            continue
+        if (
+                (year_from is not None and year < year_from) or
+                (year_to is not None and year > year_to) or
+                (rating_from is not None and rating < rating_from) or
+                (rating_to is not None and rating > rating_to)
+        ):
+            continue
+        matches.append(position)
+    return matches
+
+
+def scan_people(movies, people, prefix, limit=20) -> list:
+    named = sorted(
+        (name.casefold(), key) for key, name in people.items()
+        if name.casefold().startswith(prefix.casefold())
+    )
+    return [
+        {
+            "key": key,
+            "name": people[key],
+            "director": sum(key in record["Director(s)"]
+                            for record in movies.values()),
+            "cast": sum(key in record["Cast"] for record in movies.values()),
+        }
+        for _, key in named[:limit]
+    ]
+
+
+def assert_same_as_scan(paths):
+    movies, people = scan_movies(paths)
+    index = MovieIndex(paths["path"])
+    try:
+        assert len(index) == len(movies)
+        for query in QUERIES:
+            assert index.find(**query) == scan_find(movies, people, **query)
+        for prefix in PREFIXES:
+            assert index.people(prefix) == scan_people(movies, people, prefix)
+        assert index.people("", limit=3) == \
+            scan_people(movies, people, "", limit=3)
+        for position, record in movies.items():
+            assert index.record(position, named=False) == record
+            assert index.record(position)["Cast"] == [
+                people[key] for key in record["Cast"]
+            ]
+    finally:
+        index.close()
+
+
+def test_built_index_same_as_scan(paths):
+    result = update_index(**paths)
+
+    assert result == {
+        "movies": 9, "people": 27, "lines": 36, "rebuilt": True
+    }
+    assert_same_as_scan(paths)
+
+
+def test_appended_lines(paths):
+    update_index(**paths)
+    append(paths["people_path"], '[1, "New Person"]\n')
+    append(paths["movies_path"], movie_line(
+        100, "The Godfather Part III", 1990, 7.6, [338], [199, 1],
+    ))
+
+    result = update_index(**paths)
+
+    assert result == {
+        "movies": 10, "people": 28, "lines": 2, "rebuilt": False
+    }
+    assert_same_as_scan(paths)
+    assert update_index(**paths)["lines"] == 0
+
+
+def test_replaced_position(paths):
+    update_index(**paths)
+    # The Godfather again, with a new rating and without Marlon Brando
+    append(paths["movies_path"], movie_line(
+        2, "The Godfather", 1972, 9.1, [338], [199, 1001],
+    ))
+
+    result = update_index(**paths)
+
+    assert (result["movies"], result["rebuilt"]) == (9, False)
+    assert_same_as_scan(paths)
+    index = MovieIndex(paths["path"])
+    assert index.find(actor="Marlon Brando") == [57]
+    assert index.find(rating_from=9.2) == []
+    index.close()
+
+
+def test_trailing_partial_line(paths):
+    update_index(**paths)
+    line = movie_line(
+        250, "Gran Torino", 2008, 8.1, [142], [142],
+    )
+    append(paths["people_path"], '[142, "Clint Eastwood"]\n')
+    append(paths["movies_path"], line[:30])
+
+    result = update_index(**paths)
+
+    # The cut line is left for the next update
+    assert (result["movies"], result["lines"]) == (9, 1)
+    assert_same_as_scan(paths)
+
+    append(paths["movies_path"], line[30:])
+    result = update_index(**paths)
+
+    assert result == {
+        "movies": 10, "people": 28, "lines": 1, "rebuilt": False
+    }
+    assert_same_as_scan(paths)
+
+
+def test_rewritten_file_rebuilds(paths):
+    update_index(**paths)
+    with open(paths["movies_path"], encoding="utf-8") as f:
+        text = f.read()
+    # As long as before, so only the CRC tells the file was rewritten
+    rewritten = text.replace('"Rating": 8.8', '"Rating": 8.9')
+    assert len(rewritten) == len(text) and rewritten != text
+    with open(paths["movies_path"], "w", encoding="utf-8") as f:
+        f.write(rewritten)
+
+    result = update_index(**paths)
+
+    assert (result["rebuilt"], result["lines"]) == (True, 36)
+    assert_same_as_scan(paths)
+
+
+def test_shorter_file_rebuilds(paths):
+    update_index(**paths)
+    with open(paths["movies_path"], encoding="utf-8") as f:
+        lines = f.readlines()
+    with open(paths["movies_path"], "w", encoding="utf-8") as f:
+        f.writelines(lines[:4])
+
+    result = update_index(**paths)
+
+    assert (result["movies"], result["rebuilt"]) == (4, True)
+    assert_same_as_scan(paths)
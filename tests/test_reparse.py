@@ -0,0 +1,139 @@
+"""
+The output files are rebuilt from a small archive of synthetic chart,
+movie and cast pages, from the spider's last run and the latest page of
+each movie.
+"""
+import json
+
+import pytest
+
+from benchmarks.fixtures import (
+    chart_page,
+    credits_page,
+    generate_movies,
+    title_page,
+)
+from movies import reparse, settings
+from movies.archive import PageArchive
+
+CHART_URL = "https://www.imdb.com/chart/top/"
+MOVIES = generate_movies(5, seed=1)
+
+
+def movie_url(movie):
+    return f"https://www.imdb.com/title/{movie['id']}/"
+
+
+def credits_url(movie):
+    # As linked from the movie's page
+    return movie_url(movie) + "fullcredits/?ref_=tt_cl_sm"
+
+
+def archive_page(archive, url, html, page_type, run):
+    archive.append(
+        {
+            "url": url,
+            "request_url": url,
+            "status": 200,
+            "encoding": "utf-8",
+            "flags": [],
+            "spider": "top250",
+            "run": run,
+            "fetched_at": run,
+            "meta": {"page_type": page_type},
+        },
+        html.encode("utf-8"),
+    )
+
+
+@pytest.fixture
+def archive_dir(tmp_path):
+    """
+    Archives a run charting the first movies in another order, then a
+    run charting all of them, missing the cast page of the last one. The
+    second movie's page is archived again after that run with a new
+    rating.
+    """
+    directory = str(tmp_path / "archive")
+    archive = PageArchive(directory)
+    archive_page(archive, CHART_URL, chart_page(MOVIES[2::-1]), "chart", 1.0)
+    archive_page(archive, CHART_URL, chart_page(MOVIES), "chart", 2.0)
+    for movie in MOVIES:
+        archive_page(archive, movie_url(movie), title_page(movie), "title",
+                     2.0)
+        if movie is not MOVIES[-1]:
+            archive_page(archive, credits_url(movie),
+                         credits_page(movie), "fullcredits", 2.0)
+    archive_page(archive, movie_url(MOVIES[1]),
+                 title_page({**MOVIES[1], "rating": 7.1}), "title", 3.0)
+    archive.close()
+    return directory
+
+
+@pytest.fixture
+def outputs(tmp_path, monkeypatch):
+    paths = {
+        name: str(tmp_path / f"{name.lower()}")
+        for name in ("MOVIES_JSON_PATH", "ACTORS_JSON_PATH",
+                     "MOVIES_JSONL_PATH", "PEOPLE_JSONL_PATH")
+    }
+    for name, path in paths.items():
+        monkeypatch.setattr(reparse, name, path)
+    return paths
+
+
+def read_jsonl(path) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_reparse_last_run(archive_dir, outputs):
+    assert reparse.reparse(archive_dir, workers=1) == {
+        "movies": 4, "missing": 1
+    }
+
+    with open(outputs["MOVIES_JSON_PATH"], encoding="utf-8") as f:
+        movies = json.load(f)
+    expected = [
+        {
+            "Position in rating": movie["position"],
+            "Title": movie["title"],
+            "Original title": movie["original_title"],
+            "Year": movie["year"],
+            "Rating": 7.1 if movie is MOVIES[1] else movie["rating"],
+            "Director(s)": [name for _, name in movie["directors"]],
+            "Cast": [name for _, name in movie["cast"]],
+        }
+        for movie in MOVIES[:-1]
+    ]
+    assert movies == expected
+
+    records = read_jsonl(outputs["MOVIES_JSONL_PATH"])
+    assert [record["IMDb ID"] for record in records] == [
+        movie["id"] for movie in MOVIES[:-1]
+    ]
+    assert records[0]["Cast"] == [
+        int(nm[2:]) for nm, _ in MOVIES[0]["cast"]
+    ]
+    people = {
+        int(nm[2:]): name
+        for movie in MOVIES[:-1]
+        for nm, name in movie["directors"] + movie["cast"]
+    }
+    assert dict(read_jsonl(outputs["PEOPLE_JSONL_PATH"])) == people
+
+    with open(outputs["ACTORS_JSON_PATH"], encoding="utf-8") as f:
+        actors = json.load(f)
+    assert {actor["Actor"] for actor in actors} <= set(people.values())
+
+
+def test_reparse_without_chart_of_the_spider(archive_dir, outputs):
+    assert reparse.reparse(archive_dir, spider="chart", workers=1) == {
+        "movies": 0, "missing": 0
+    }
+
+
+def test_archive_disabled_by_default():
+    assert not settings.PAGE_ARCHIVE_DIR
+    with pytest.raises(SystemExit, match="No page archive"):
+        reparse.main([])
@@ -0,0 +1,86 @@
+"""
+A crawl interrupted mid-run resumes from its checkpoint without losing
+or duplicating movies in the final movies JSON file.
+"""
+import json
+from types import SimpleNamespace
+
+from movies.checkpoint import CheckpointStore
+from movies.items import MoviesItem
+from movies.people import PersonTable
+from movies.pipelines import MoviesPipeline
+
+
+def movie_item(position, people):
+    director = people.add(f"nm{position:07d}", f"Director {position}")
+    actor = people.add("nm9999999", "Recurring Actor")
+    return MoviesItem(
+        position=position,
+        title=f"Movie {position}",
+        original_title=f"Movie {position}",
+        year=1990 + position,
+        rating=8.0,
+        directors=[director],
+        cast=[actor],
+        url=f"https://www.imdb.com/title/tt{position:07d}/",
+    )
+
+
+def start(tmp_path):
+    """
+    Opens the pipeline of a crawl as the spider would, with the crawl's
+    checkpoint.
+    """
+    spider = SimpleNamespace(
+        people=PersonTable(),
+        checkpoint=CheckpointStore(str(tmp_path / "checkpoint.sqlite")),
+    )
+    pipeline = MoviesPipeline(
+        jsonl_path=str(tmp_path / "movies.jsonl"),
+        json_path=str(tmp_path / "movies.json"),
+        people_path=str(tmp_path / "people.jsonl"),
+        fsync_every=3,
+    )
+    pipeline.open_spider(spider)
+    return pipeline, spider
+
+
+def test_resume_after_interruption(tmp_path):
+    pipeline, spider = start(tmp_path)
+    for position in range(1, 8):
+        pipeline.process_item(movie_item(position, spider.people), spider)
+    # Killed mid-write: movie 7 was written but not synced and
+    # checkpointed, and a line is cut short
+    pipeline.file.write('{"Position in rating": 8, "Ti')
+    for f in (pipeline.file, pipeline.people_file):
+        f.close()
+    spider.checkpoint.close()
+
+    pipeline, spider = start(tmp_path)
+    completed = spider.checkpoint.completed_urls()
+    assert len(completed) == 6
+    for position in range(1, 11):
+        item = movie_item(position, spider.people)
+        if item["url"] not in completed:
+            pipeline.process_item(item, spider)
+    pipeline.close_spider(spider)
+
+    with open(tmp_path / "movies.json", encoding="utf-8") as f:
+        movies = json.load(f)
+    assert [movie["Position in rating"] for movie in movies] == \
+        list(range(1, 11))
+    assert movies[6] == {
+        "Position in rating": 7,
+        "Title": "Movie 7",
+        "Original title": "Movie 7",
+        "Year": 1997,
+        "Rating": 8.0,
+        "Director(s)": ["Director 7"],
+        "Cast": ["Recurring Actor"],
+    }
+    with open(tmp_path / "movies.jsonl", encoding="utf-8") as f:
+        assert len(f.readlines()) == 10
+    with open(tmp_path / "people.jsonl", encoding="utf-8") as f:
+        assert len(f.readlines()) == 11
+    assert len(spider.checkpoint) == 10
+    spider.checkpoint.close()
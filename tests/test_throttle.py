@@ -0,0 +1,241 @@
+"""
+The AIMD throttle of a page type through successes, backoffs and
+recovery, the gate spacing rendered requests on a fake clock, and the
+middleware backing off on 429 and 503 responses.
+"""
+from types import SimpleNamespace
+
+import pytest
+from scrapy import Request, Spider
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+from selenium.common import TimeoutException
+from twisted.internet.task import Clock
+
+from movies.middlewares import PageTypeThrottleMiddleware
+from movies.throttle import AIMDThrottle, ThrottleGate
+
+URL = "https://www.imdb.com/title/tt0111161/"
+
+
+def test_slow_start_until_first_backoff():
+    throttle = AIMDThrottle(start_concurrency=2, max_concurrency=6)
+
+    for slots in (3, 4, 5, 6, 6):
+        throttle.success(0.1, 0)
+        assert throttle.slots == slots
+    assert throttle.peak == 6
+
+    assert throttle.backoff(0)
+    assert (throttle.concurrency, throttle.delay) == (3.0, 0.25)
+    assert not throttle.slow_start
+
+
+def test_backoff_once_per_epoch():
+    throttle = AIMDThrottle(start_concurrency=8)
+
+    assert throttle.backoff(0)
+    # Requests sent before the backoff report the congestion it answered
+    assert not throttle.backoff(0)
+    assert throttle.backoff(1)
+    assert (throttle.slots, throttle.delay, throttle.epoch) == (2, 0.5, 2)
+    assert throttle.backoffs == 2
+    for epoch in range(2, 10):
+        throttle.backoff(epoch)
+    assert throttle.slots == 1
+
+
+def test_delay_bounded_and_retry_after():
+    throttle = AIMDThrottle(max_delay=10)
+
+    throttle.backoff(0, retry_after=4)
+    assert throttle.delay == 4
+    throttle.backoff(1)
+    assert throttle.delay == 8
+    throttle.backoff(2, retry_after=120)
+    assert throttle.delay == 10
+
+
+def test_recovery_after_backoff():
+    throttle = AIMDThrottle(start_concurrency=8, increase=1)
+    throttle.backoff(0)
+    throttle.backoff(1)
+    assert (throttle.concurrency, throttle.delay) == (2.0, 0.5)
+
+    # The delay steps back to the least before the concurrency grows
+    throttle.success(None, 2)
+    throttle.success(None, 2)
+    assert (throttle.concurrency, throttle.delay) == (2.0, 0)
+
+    # Then by `increase` per window of `concurrency` responses
+    throttle.success(None, 2)
+    throttle.success(None, 2)
+    assert throttle.concurrency == pytest.approx(2.5 + 1 / 2.5)
+    assert throttle.slots == 2
+
+
+def test_slow_response_backs_off():
+    throttle = AIMDThrottle(start_concurrency=4, latency_factor=3)
+    for _ in range(5):
+        throttle.success(0.2, 0)
+    assert throttle.backoffs == 0
+
+    throttle.success(0.7, 0)
+
+    assert throttle.backoffs == 1
+    assert throttle.slots == 4  # Halved from 9
+
+
+def test_gate_admits_slots_at_a_time():
+    clock = Clock()
+    throttle = AIMDThrottle(start_concurrency=2)
+    gate = ThrottleGate(throttle, clock)
+
+    admitted = []
+    for index in range(3):
+        gate.acquire().addCallback(lambda _, index=index:
+                                   admitted.append(index))
+    assert admitted == [0, 1]
+
+    gate.release()
+    assert admitted == [0, 1, 2]
+    assert gate.in_flight == 2
+
+
+def test_gate_spaces_requests_by_the_delay():
+    clock = Clock()
+    throttle = AIMDThrottle(start_concurrency=8)
+    throttle.backoff(0)  # 4 slots, 0.25 s apart
+    gate = ThrottleGate(throttle, clock)
+
+    admitted = []
+    for index in range(3):
+        gate.acquire().addCallback(lambda _, index=index:
+                                   admitted.append(index))
+    assert admitted == [0]
+
+    clock.advance(0.125)
+    assert admitted == [0]
+    clock.advance(0.125)
+    assert admitted == [0, 1]
+    clock.advance(0.25)
+    assert admitted == [0, 1, 2]
+
+    gate.acquire()
+    assert len(clock.getDelayedCalls()) == 1
+    gate.close()
+    assert not clock.getDelayedCalls()
+
+
+@pytest.fixture
+def spider():
+    crawler = get_crawler(Spider)
+    return crawler._create_spider("test")
+
+
+@pytest.fixture
+def middleware():
+    crawler = get_crawler(Spider, settings_dict={
+        "PAGE_THROTTLE_BACKOFF_STATUSES": [429, 503],
+        "PAGE_THROTTLE_START_CONCURRENCY": 4,
+    })
+    crawler.engine = SimpleNamespace(downloader=SimpleNamespace(
+        slots={}, per_slot_settings={},
+    ))
+    return PageTypeThrottleMiddleware.from_crawler(crawler)
+
+
+def http_request(middleware, spider):
+    request = Request(URL, meta={"page_type": "title", "render": False,
+                                 "download_latency": 0.1})
+    assert middleware.process_request(request, spider) is None
+    return request
+
+
+def downloaded(middleware, spider, request, status, headers=None):
+    response = HtmlResponse(URL, status=status, headers=headers)
+    middleware.response_downloaded(response, request, spider)
+    middleware.request_left_downloader(request, spider)
+
+
+def test_http_requests_back_off_and_recover(middleware, spider):
+    downloader = middleware.crawler.engine.downloader
+    request = http_request(middleware, spider)
+    assert request.meta["download_slot"] == "title@www.imdb.com"
+    assert request.meta["max_retry_times"] == 8
+    assert downloader.per_slot_settings["title@www.imdb.com"] == {
+        "concurrency": 4, "delay": 0
+    }
+    slot = SimpleNamespace(concurrency=4, delay=0)
+    downloader.slots["title@www.imdb.com"] = slot
+    before = [http_request(middleware, spider) for _ in range(2)]
+
+    downloaded(middleware, spider, request, 429, {"Retry-After": "2"})
+    assert (slot.concurrency, slot.delay) == (2, 2)
+    # The 503 of a request sent before the backoff adds nothing
+    downloaded(middleware, spider, before[0], 503)
+    assert (slot.concurrency, slot.delay) == (2, 2)
+    downloaded(middleware, spider, http_request(middleware, spider), 503)
+    assert (slot.concurrency, slot.delay) == (1, 4)
+
+    # A download failing without a response backs off too
+    failed = http_request(middleware, spider)
+    middleware.request_left_downloader(failed, spider)
+    assert (slot.concurrency, slot.delay) == (1, 8)
+
+    # Successes take the delay off, then the concurrency grows again
+    downloaded(middleware, spider, before[1], 200)
+    assert slot.delay == 7.75
+    for _ in range(31):
+        downloaded(middleware, spider, http_request(middleware, spider), 200)
+    assert (slot.concurrency, slot.delay) == (1, 0)
+    for _ in range(5):
+        downloaded(middleware, spider, http_request(middleware, spider), 200)
+    assert slot.concurrency == 1
+    downloaded(middleware, spider, http_request(middleware, spider), 200)
+    assert slot.concurrency == 2
+
+    middleware.spider_closed(spider)
+    stats = middleware.crawler.stats
+    assert stats.get_value("throttle/title/http/backoffs") == 3
+    assert stats.get_value("throttle/title/http/peak") == 4
+    assert stats.get_value("throttle/title/http/concurrency") == 2
+
+
+def rendered_request(middleware, spider, admitted):
+    request = Request(URL, meta={"page_type": "title"})
+    middleware.process_request(request, spider).addCallback(
+        lambda _: admitted.append(request)
+    )
+    return request
+
+
+def test_rendered_requests_wait_for_the_gate(middleware, spider):
+    clock = Clock()
+    middleware.gates["title/rendered"] = ThrottleGate(
+        middleware.throttle("title/rendered"), clock
+    )
+    admitted = []
+    requests = [rendered_request(middleware, spider, admitted)
+                for _ in range(5)]
+    assert admitted == requests[:4]
+
+    # A render that timed out frees its place and backs off
+    middleware.process_exception(requests[0], TimeoutException(), spider)
+    assert admitted == requests
+    throttle = middleware.throttles["title/rendered"]
+    assert (throttle.slots, throttle.delay) == (2, 0.25)
+
+    late = rendered_request(middleware, spider, admitted)
+    response = HtmlResponse(URL, body=b"<html></html>")
+    for request in requests[1:3]:
+        middleware.process_response(request, response, spider)
+    assert late not in admitted  # Two in flight, two slots
+    assert throttle.delay == 0
+    assert "throttle_token" not in requests[1].meta
+
+    # Timed out before the backoff, which already answered it
+    requests[3].meta["render_timeouts"] = 1
+    middleware.process_response(requests[3], response, spider)
+    assert throttle.backoffs == 1
+    assert admitted[-1] is late
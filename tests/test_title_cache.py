@@ -0,0 +1,153 @@
+"""
+Title cache freshness per field, eviction of the least recently used
+titles, and movies built from the cache instead of their pages.
+"""
+import pytest
+
+from movies import settings, title_cache
+from movies.spiders.top250 import Top250Spider
+from movies.title_cache import DAY, TitleCache
+
+SHAWSHANK = {
+    "title": "The Shawshank Redemption",
+    "original_title": "The Shawshank Redemption",
+    "year": 1994,
+    "rating": 9.3,
+    "directors": [[1045, "Frank Darabont"]],
+    "cast": [[151, "Tim Robbins"], [-1, "Uncredited Extra"]],
+}
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(title_cache.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = TitleCache(str(tmp_path / "title_cache.sqlite"))
+    yield cache
+    cache.connection.close()
+
+
+def test_fields_expire_after_their_ttl(cache, clock):
+    cache.put("tt0111161", SHAWSHANK)
+    clock.now += 2 * DAY
+
+    assert cache.get("tt0111161", ["rating"]) is None
+    assert cache.get("tt0111161", ["title", "rating"]) is None
+    assert cache.get("tt0111161", ["title", "cast"]) == {
+        "title": SHAWSHANK["title"], "cast": SHAWSHANK["cast"],
+    }
+    assert cache.get("tt0068646", ["title"]) is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "stale": 2}
+
+    clock.now += 90 * DAY
+    assert cache.get("tt0111161", ["title"]) is None
+    assert cache.get("tt0111161", ["year"]) == {"year": 1994}
+
+
+def test_ttls_overridden(tmp_path, clock):
+    cache = TitleCache(
+        str(tmp_path / "title_cache.sqlite"), ttls={"rating": 60}
+    )
+    cache.put("tt0111161", {"rating": 9.3})
+
+    clock.now += 30
+    assert cache.get("tt0111161", ["rating"]) == {"rating": 9.3}
+    clock.now += 31
+    assert cache.get("tt0111161", ["rating"]) is None
+    cache.close()
+
+
+def test_least_recently_used_evicted_at_close(tmp_path, clock):
+    path = str(tmp_path / "title_cache.sqlite")
+    cache = TitleCache(path, max_entries=2)
+    for imdb_id in ("tt0000001", "tt0000002", "tt0000003"):
+        clock.now += 1
+        cache.put(imdb_id, {"title": imdb_id})
+    clock.now += 1
+    cache.get("tt0000001", ["title"])  # Now the most recently used
+    assert len(cache) == 3
+
+    cache.close()
+
+    cache = TitleCache(path, max_entries=2)
+    assert len(cache) == 2
+    assert cache.get("tt0000002", ["title"]) is None
+    assert cache.get("tt0000001", ["title"]) == {"title": "tt0000001"}
+    assert cache.get("tt0000003", ["title"]) == {"title": "tt0000003"}
+    (fields,) = cache.connection.execute(
+        "SELECT COUNT(*) FROM fields"
+    ).fetchone()
+    assert fields == 2
+    cache.close()
+
+
+@pytest.fixture
+def spider(tmp_path, monkeypatch, cache):
+    monkeypatch.chdir(tmp_path)
+    spider = Top250Spider()
+    spider.title_cache = cache
+    return spider
+
+
+def chart_entry(rating):
+    return {
+        "position": 1,
+        "id": "tt0111161",
+        "url": "https://www.imdb.com/title/tt0111161/",
+        "title": "The Shawshank Redemption",
+        "rating": rating,
+    }
+
+
+def test_cached_movie_from_fresh_entry(spider, cache, clock):
+    cache.put("tt0111161", SHAWSHANK)
+    clock.now += 2 * DAY  # The cached rating is stale, the chart's is not
+
+    item = spider.cached_movie(chart_entry(9.2), 1)
+
+    assert dict(item) == {
+        "position": 1,
+        "title": "The Shawshank Redemption",
+        "original_title": "The Shawshank Redemption",
+        "year": 1994,
+        "rating": 9.2,
+        "directors": [1045],
+        "cast": [151, -1],
+        "url": "https://www.imdb.com/title/tt0111161/",
+    }
+    assert spider.people.names_of(item["cast"]) == [
+        "Tim Robbins", "Uncredited Extra"
+    ]
+    assert spider.cache_skipped == {"title": 1, "fullcredits": 1}
+
+
+def test_cached_movie_needs_every_field_fresh(spider, cache, clock):
+    cache.put("tt0111161", SHAWSHANK)
+
+    assert spider.cached_movie(chart_entry(None), 1)["rating"] == 9.3
+    clock.now += 2 * DAY
+    # Without a rating on the chart the cached one must be fresh
+    assert spider.cached_movie(chart_entry(None), 1) is None
+    clock.now += 90 * DAY
+    assert spider.cached_movie(chart_entry(9.2), 1) is None
+    assert spider.cache_skipped == {"title": 1, "fullcredits": 1}
+
+
+def test_disabled_by_default(spider):
+    assert not settings.TITLE_CACHE_PATH
+    spider.title_cache = None
+
+    assert spider.cached_movie(chart_entry(9.3), 1) is None
@@ -0,0 +1,276 @@
+"""
+The SQLite work queue of sharded crawls, with a fake clock expiring
+leases, and a coordinator and a worker spider sharing one.
+"""
+import pytest
+from scrapy.exceptions import DontCloseSpider
+from scrapy.http import Response
+from scrapy.utils.test import get_crawler
+
+from movies import work_queue
+from movies.items import MoviesItem
+from movies.pipelines import WorkResultsPipeline
+from movies.spiders.top250 import Top250Spider
+from movies.work_queue import SQLiteWorkQueue, open_work_queue
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(work_queue.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    queue = SQLiteWorkQueue(
+        str(tmp_path / "work_queue.sqlite"), lease_seconds=60,
+        max_attempts=2,
+    )
+    yield queue
+    queue.close()
+
+
+def url(position):
+    return f"https://www.imdb.com/title/tt{position:07d}/"
+
+
+def jobs(*positions):
+    return [{"url": url(position), "position": position}
+            for position in positions]
+
+
+def positions(leased):
+    return [job["position"] for job in leased]
+
+
+def result(position):
+    return {"url": url(position), "record": {"Position in rating": position}}
+
+
+def attempts(queue, position):
+    return queue.connection.execute(
+        "SELECT attempts FROM jobs WHERE url = ?", (url(position),)
+    ).fetchone()[0]
+
+
+def test_jobs_leased_once_in_position_order(queue):
+    queue.publish(jobs(3, 1, 2, 5, 4))
+    queue.publish(jobs(1))  # Known already
+
+    assert positions(queue.lease("w1", 2)) == [1, 2]
+    assert positions(queue.lease("w2", 10)) == [3, 4, 5]
+    assert queue.lease("w1", 2) == []
+    assert queue.counts() == {
+        "pending": 0, "leased": 5, "done": 0, "merged": 0, "failed": 0
+    }
+
+
+def test_expired_lease_leased_again(queue, clock):
+    queue.publish(jobs(1, 2))
+    queue.lease("w1", 2)
+
+    clock.now += 45
+    queue.renew("w1")
+    clock.now += 45
+    assert queue.lease("w2", 2) == []  # Renewed 45 s ago
+
+    clock.now += 16
+    assert queue.counts()["pending"] == 2
+    assert positions(queue.lease("w2", 2)) == [1, 2]
+    assert attempts(queue, 1) == 2
+
+
+def test_job_failed_after_max_attempts(queue, clock):
+    queue.publish(jobs(1))
+    for _ in range(2):
+        assert positions(queue.lease("w1", 1)) == [1]
+        clock.now += 61
+
+    assert queue.lease("w1", 1) == []
+    assert queue.counts() == {
+        "pending": 0, "leased": 0, "done": 0, "merged": 0, "failed": 1
+    }
+
+
+def test_release(queue):
+    queue.publish(jobs(1, 2, 3))
+    queue.lease("w1", 2)
+    queue.lease("w2", 1)
+
+    # Unattempted jobs get their attempt back
+    assert queue.release("w1") == 2
+    assert (attempts(queue, 1), attempts(queue, 3)) == (0, 1)
+    assert queue.counts()["pending"] == 2
+
+    # Failed jobs keep it, and fail once out of attempts
+    queue.lease("w1", 1)
+    assert queue.release("w1", failed=True) == 1
+    assert queue.counts()["pending"] == 2
+    queue.lease("w1", 1)
+    assert queue.release("w1", failed=True) == 1
+    assert queue.counts() == {
+        "pending": 1, "leased": 1, "done": 0, "merged": 0, "failed": 1
+    }
+    assert queue.release("w1") == 0
+
+
+def test_complete_after_lease_expired(queue, clock):
+    queue.publish(jobs(1, 2))
+    queue.lease("w1", 2)
+    clock.now += 61
+    assert positions(queue.lease("w2", 1)) == [1]
+
+    # The late results of w1 are kept, the first one of a job wins
+    queue.complete("w1", url(1), result(1))
+    queue.complete("w1", url(2), result(2))
+    queue.complete("w2", url(1), {**result(1), "worker": "w2"})
+
+    assert queue.counts()["done"] == 2
+    assert queue.take_results(10) == [result(1), result(2)]
+    assert queue.counts()["merged"] == 2
+
+
+def test_failed_job_completed_late(queue, clock):
+    queue.publish(jobs(1))
+    for _ in range(2):
+        queue.lease("w1", 1)
+        clock.now += 61
+    assert queue.counts()["failed"] == 1
+
+    queue.complete("w1", url(1), result(1))
+
+    assert queue.take_results(10) == [result(1)]
+
+
+def test_requeue_results(queue):
+    queue.publish(jobs(1, 2, 3))
+    queue.lease("w1", 3)
+    for position in (3, 1, 2):
+        queue.complete("w1", url(position), result(position))
+
+    assert queue.take_results(2) == [result(1), result(2)]
+    assert queue.take_results(2) == [result(3)]
+    assert queue.take_results(2) == []
+
+    # The coordinator checkpointed only the first result before stopping
+    queue.requeue_results({url(1)})
+    assert queue.counts()["done"] == 2
+    assert queue.take_results(10) == [result(2), result(3)]
+
+
+def test_unsupported_url(tmp_path):
+    with pytest.raises(ValueError):
+        open_work_queue(f"file://{tmp_path}/queue", "top250")
+
+
+class Engine:
+    """
+    Collects the requests a spider schedules outside of its callbacks.
+    """
+
+    def __init__(self):
+        self.requests = []
+
+    def crawl(self, request):
+        self.requests.append(request)
+
+
+def sharded_spider(tmp_path, role, **kwargs):
+    crawler = get_crawler(Top250Spider, settings_dict={
+        "WORK_QUEUE_URL": f"sqlite:///{tmp_path / 'work_queue.sqlite'}",
+        "WORK_QUEUE_BATCH_SIZE": 2,
+        "WORK_QUEUE_POLL_INTERVAL": 3600,
+    })
+    crawler.engine = Engine()
+    return crawler._create_spider(role=role, **kwargs)
+
+
+@pytest.fixture
+def coordinator(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    spider = sharded_spider(tmp_path, "coordinator")
+    yield spider
+    spider.close("finished")
+
+
+@pytest.fixture
+def worker(tmp_path, coordinator):
+    spider = sharded_spider(tmp_path, "worker", worker_id="w1")
+    yield spider
+    spider.close("finished")
+
+
+def scrape(worker, request):
+    """
+    Builds the item the worker scrapes from a movie request, with an
+    actor credited without an IMDb ID, and completes its job through the
+    pipeline.
+    """
+    position = request.meta["position"]
+    item = MoviesItem(
+        position=position,
+        title=f"Movie {position}",
+        original_title=f"Movie {position}",
+        year=2000,
+        rating=8.0,
+        directors=[worker.people.add(f"nm{position:07d}", "Director")],
+        cast=[worker.people.add(None, f"Extra {position}")],
+        url=request.url,
+    )
+    WorkResultsPipeline().process_item(item, worker)
+
+
+def test_coordinator_collects_worker_results(coordinator, worker):
+    coordinator.publish(jobs(1, 2, 3), set(), last=True)
+
+    requests = list(worker.start_requests())
+    assert [request.meta["position"] for request in requests] == [1, 2]
+    assert all(request.dont_filter for request in requests)
+
+    # Half of the batch completed: the next batch is leased
+    scrape(worker, requests[0])
+    (request,) = worker.crawler.engine.requests
+    assert request.meta["position"] == 3
+    scrape(worker, request)
+
+    # Job 2 yielded no movie: failed once, leased again when idle
+    with pytest.raises(DontCloseSpider):
+        worker.spider_idle(worker)
+    (_, request) = worker.crawler.engine.requests
+    assert request.meta["position"] == 2
+
+    with pytest.raises(DontCloseSpider):
+        coordinator.spider_idle(coordinator)
+    (results_request,) = coordinator.crawler.engine.requests
+    items = list(results_request.callback(
+        Response(results_request.url, request=results_request)
+    ))
+    assert [item["position"] for item in items] == [1, 3]
+    assert [coordinator.people.names_of(item["cast"]) for item in items] == [
+        ["Extra 1"], ["Extra 3"]
+    ]
+    assert items[0]["cast"] != items[1]["cast"]
+
+    with pytest.raises(DontCloseSpider):
+        coordinator.spider_idle(coordinator)  # Job 2 still leased
+    scrape(worker, request)
+    worker.spider_idle(worker)  # Drained: the worker may close
+
+    with pytest.raises(DontCloseSpider):
+        coordinator.spider_idle(coordinator)
+    results_request = coordinator.crawler.engine.requests[-1]
+    (item,) = results_request.callback(
+        Response(results_request.url, request=results_request)
+    )
+    assert item["position"] == 2
+    assert item["url"] == url(2)
+    coordinator.spider_idle(coordinator)  # Every result collected